@@ -0,0 +1,8 @@
+from django.apps import AppConfig
+
+
+class OnlineshopConfig(AppConfig):
+    name = 'Onlineshop'
+
+    def ready(self):
+        from . import checks  # noqa: F401
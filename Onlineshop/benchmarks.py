@@ -0,0 +1,69 @@
+import math
+import os
+import statistics
+import tempfile
+import time
+from contextlib import contextmanager
+
+from django.db import OperationalError, connection
+
+
+@contextmanager
+def isolated_database(verbosity=0, on_disk=False):
+    """
+    Run a benchmark against a throwaway test database instead of the real one.
+
+    `on_disk` puts a SQLite test database in a temporary file instead of
+    memory, so concurrent threads wait on each other's locks instead of
+    failing at once, the way they would on a deployed database.
+    """
+    settings_dict = connection.settings_dict
+    saved = settings_dict['TEST'].get('NAME'), dict(settings_dict['OPTIONS'])
+    if on_disk and connection.vendor == 'sqlite':
+        settings_dict['TEST']['NAME'] = os.path.join(tempfile.mkdtemp(), 'bench.sqlite3')
+        settings_dict['OPTIONS'].update(transaction_mode='IMMEDIATE', timeout=60,
+                                        init_command='PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL;')
+    old_name = connection.creation.create_test_db(verbosity=verbosity, autoclobber=True, serialize=False)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=verbosity)
+        settings_dict['TEST']['NAME'], settings_dict['OPTIONS'] = saved
+
+
+def percentile(samples, q):
+    """Nearest-rank `q` percentile (0-100) of already sorted samples."""
+    return samples[min(len(samples) - 1, max(0, math.ceil(len(samples) * q / 100) - 1))]
+
+
+def measure(func, repeat=20, warmup=2):
+    """Call `func` repeatedly and return latency stats in milliseconds."""
+    for _ in range(warmup):
+        func()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        'p50_ms': round(statistics.median(samples), 3),
+        'p95_ms': round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 3),
+        'min_ms': round(samples[0], 3),
+    }
+
+
+def wait_for_locks(execute, sql, params, many, context):
+    """
+    `connection.execute_wrapper()` for threads sharing the in-memory test
+    database, which reports lock contention at once instead of waiting like a
+    real database would: retry the statement for a while.
+    """
+    for _ in range(500):
+        try:
+            return execute(sql, params, many, context)
+        except OperationalError as e:
+            if 'locked' not in str(e):
+                raise
+            time.sleep(0.002)
+    return execute(sql, params, many, context)
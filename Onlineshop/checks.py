@@ -0,0 +1,39 @@
+from django.conf import settings
+from django.core.checks import Error, Tags, Warning, register
+
+# backends whose entries no other process can see
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def is_process_local(alias):
+    return settings.CACHES.get(alias, {}).get('BACKEND') in PROCESS_LOCAL_CACHES
+
+
+@register(Tags.caches, Tags.database)
+def check_pin_cache(app_configs, **kwargs):
+    alias = getattr(settings, 'DATABASE_PIN_CACHE_ALIAS', 'default')
+    if getattr(settings, 'DATABASE_REPLICAS', []) and is_process_local(alias):
+        return [Error(
+            f"DATABASE_PIN_CACHE_ALIAS {alias!r} is a per-process cache, so a client pinned to the "
+            "primary after a write is only pinned in the worker that served the write.",
+            hint="Point DATABASE_PIN_CACHE_ALIAS at a shared cache (Redis, Memcached) or unset DATABASE_REPLICAS.",
+            id='Onlineshop.E001',
+        )]
+    return []
+
+
+@register(Tags.caches)
+def check_throttle_cache(app_configs, **kwargs):
+    alias = getattr(settings, 'THROTTLE_CACHE_ALIAS', 'default')
+    enabled = getattr(settings, 'THROTTLE_ENABLED', True) and getattr(settings, 'THROTTLES', {})
+    if enabled and is_process_local(alias):
+        return [Warning(
+            f"THROTTLE_CACHE_ALIAS {alias!r} is a per-process cache, so every worker process counts "
+            "its own requests and each rate limit is multiplied by the number of workers.",
+            hint="Point THROTTLE_CACHE_ALIAS at a shared cache (Redis, Memcached).",
+            id='Onlineshop.W001',
+        )]
+    return []
@@ -0,0 +1,266 @@
+import atexit
+import glob
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from rest_framework.renderers import JSONRenderer
+
+from .querybudget import route_name
+
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_timings = ContextVar('request_timings', default=None)
+
+
+@contextmanager
+def timed(phase):
+    """Add the time spent in the block to the current request's `phase`."""
+    timings = _timings.get()
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[phase] = timings.get(phase, 0.0) + time.perf_counter() - start
+
+
+def time_queries(execute, sql, params, many, context):
+    timings = _timings.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings['db'] = timings.get('db', 0.0) + time.perf_counter() - start
+
+
+def install(connection, **kwargs):
+    if time_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, time_queries)
+
+
+class TimedJSONRenderer(JSONRenderer):
+    """JSONRenderer that books its work as the request's `serialize` time."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with timed('serialize'):
+            return super().render(data, accepted_media_type, renderer_context)
+
+
+class Registry:
+    """
+    Request counters and per-phase latency histograms of this process.
+
+    Histogram buckets are kept non-cumulative, `[count per bucket..., +Inf, sum]`.
+    """
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.requests = {}
+        self.histograms = {}
+
+    def observe(self, route, method, status, timings):
+        key = (route, method, status)
+        with self.lock:
+            self.requests[key] = self.requests.get(key, 0) + 1
+            for phase, seconds in timings.items():
+                histogram = self.histograms.get((route, phase))
+                if histogram is None:
+                    histogram = self.histograms[(route, phase)] = [0] * (len(self.buckets) + 2)
+                histogram[bisect_left(self.buckets, seconds)] += 1
+                histogram[-1] += seconds
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'buckets': list(self.buckets),
+                'requests': [[*key, count] for key, count in self.requests.items()],
+                'histograms': [[*key, list(histogram)] for key, histogram in self.histograms.items()],
+            }
+
+
+def merge(snapshots):
+    requests, histograms, buckets = {}, {}, list(BUCKETS)
+    for snapshot in snapshots:
+        if snapshot['buckets'] != buckets:
+            continue  # written with other bucket bounds, can't be added up
+        for *key, count in snapshot['requests']:
+            requests[tuple(key)] = requests.get(tuple(key), 0) + count
+        for route, phase, histogram in snapshot['histograms']:
+            total = histograms.setdefault((route, phase), [0] * len(histogram))
+            for i, value in enumerate(histogram):
+                total[i] += value
+    return requests, histograms
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def render_prometheus(requests, histograms):
+    lines = [
+        '# HELP onlineshop_requests_total Requests served, by route, method and status.',
+        '# TYPE onlineshop_requests_total counter',
+    ]
+    for (route, method, status), count in sorted(requests.items()):
+        lines.append(f'onlineshop_requests_total{{route="{_label(route)}",method="{method}",status="{status}"}} {count}')
+    lines += [
+        '# HELP onlineshop_request_phase_seconds Time spent per request, in total and in db, zarinpal and serialize.',
+        '# TYPE onlineshop_request_phase_seconds histogram',
+    ]
+    for (route, phase), histogram in sorted(histograms.items()):
+        labels = f'route="{_label(route)}",phase="{phase}"'
+        cumulative = 0
+        for bound, count in zip((*BUCKETS, '+Inf'), histogram):
+            cumulative += count
+            lines.append(f'onlineshop_request_phase_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f'onlineshop_request_phase_seconds_sum{{{labels}}} {histogram[-1]:.6f}')
+        lines.append(f'onlineshop_request_phase_seconds_count{{{labels}}} {cumulative}')
+    return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+def metrics_dir():
+    return getattr(settings, 'METRICS_DIR', None)
+
+
+def write_snapshot():
+    """Write this process's numbers to METRICS_DIR for the others to read."""
+    directory = metrics_dir()
+    if not directory:
+        return
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f'metrics-{os.getpid()}.json')
+    with open(path + '.tmp', 'w') as f:
+        json.dump(registry.snapshot(), f)
+    os.replace(path + '.tmp', path)
+
+
+def collect():
+    """This process's live numbers plus the last ones written by every other process."""
+    snapshots = [registry.snapshot()]
+    directory = metrics_dir()
+    if directory:
+        own = os.path.join(directory, f'metrics-{os.getpid()}.json')
+        for path in glob.glob(os.path.join(directory, 'metrics-*.json')):
+            if path == own:
+                continue
+            try:
+                with open(path) as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                continue  # being replaced right now
+    return merge(snapshots)
+
+
+class _Writer(threading.Thread):
+    def __init__(self, interval):
+        super().__init__(name='metrics-writer', daemon=True)
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            write_snapshot()
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def _ensure_writer():
+    global _writer
+    if _writer is not None or not metrics_dir():
+        return
+    with _writer_lock:
+        if _writer is None:
+            _writer = _Writer(getattr(settings, 'METRICS_WRITE_INTERVAL', 5))
+            _writer.start()
+            atexit.register(write_snapshot)
+
+
+def _after_fork():
+    # a forked worker reports its own requests, not its parent's again, and
+    # doesn't inherit the parent's writer thread
+    global _writer
+    registry.reset()
+    _writer = None
+
+
+os.register_at_fork(after_in_child=_after_fork)
+
+
+class TimingMiddleware:
+    """
+    Time each request and its db, zarinpal and serialize phases.
+
+    The timings go out as a `Server-Timing` header and into `registry`,
+    labelled with the url name. With METRICS_DIR set every process writes its
+    numbers there every METRICS_WRITE_INTERVAL seconds, and /api/_metrics
+    adds them all up.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'METRICS_ENABLED', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+        connection_created.connect(install, dispatch_uid='metrics')
+        for connection in connections.all(initialized_only=True):
+            install(connection)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        timings = {}
+        token = _timings.set(timings)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _timings.reset(token)
+        return self.finish(request, response, timings, start)
+
+    async def __acall__(self, request):
+        timings = {}
+        token = _timings.set(timings)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _timings.reset(token)
+        return self.finish(request, response, timings, start)
+
+    def finish(self, request, response, timings, start):
+        timings['total'] = time.perf_counter() - start
+        response.headers['Server-Timing'] = ', '.join(
+            ['%s;dur=%.1f' % (phase, seconds * 1000) for phase, seconds in timings.items()]
+        )
+        registry.observe(route_name(request), request.method, response.status_code, timings)
+        _ensure_writer()
+        return response
+
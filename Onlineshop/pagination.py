@@ -0,0 +1,146 @@
+import base64
+import json
+from collections import OrderedDict
+from datetime import datetime
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q
+from rest_framework import pagination
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(pagination.BasePagination):
+    """
+    Cursor pagination over a `(field, id)` key.
+
+    Every page is fetched with `WHERE (field, id) > (last_field, last_id)
+    ORDER BY field, id LIMIT n`, so page 100 costs the same as page 1 as long
+    as there is an index on `(field, id)`. No COUNT(*) is ever run.
+    """
+    page_size = 20
+    max_page_size = 100
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    ordering_query_param = 'ordering'
+
+    # ordering name accepted in ?ordering= -> model field it sorts on
+    ordering_fields = {}
+    default_ordering = None
+
+    def get_page_size(self, request):
+        page_size = request.query_params.get(self.page_size_query_param)
+        if page_size is None:
+            return self.page_size
+        try:
+            page_size = int(page_size)
+        except ValueError:
+            raise ValidationError({self.page_size_query_param: 'Must be an integer.'})
+        return max(1, min(page_size, self.max_page_size))
+
+    def get_ordering(self, request, queryset, view):
+        ordering = request.query_params.get(self.ordering_query_param, self.default_ordering)
+        if ordering.lstrip('-') not in self.ordering_fields:
+            raise ValidationError({
+                self.ordering_query_param: 'Choose one of: %s.' % ', '.join(
+                    sorted(o for name in self.ordering_fields for o in (name, '-' + name))
+                )
+            })
+        return ordering
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.descending = self.ordering.startswith('-')
+        self.field = self.ordering_fields[self.ordering.lstrip('-')]
+
+        if queryset._fields is not None:
+            # a .values() queryset still needs the cursor key on every row
+            queryset = queryset.values(*dict.fromkeys(queryset._fields + (self.field, 'id')))
+
+        position = self.decode_cursor(request, self.get_key_field(queryset))
+        if position is not None:
+            queryset = queryset.filter(self.get_position_filter(*position))
+
+        prefix = '-' if self.descending else ''
+        queryset = queryset.order_by(prefix + self.field, prefix + 'id')
+
+        results = list(queryset[:self.page_size + 1])
+        self.has_next = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        return self.page
+
+    def get_key_field(self, queryset):
+        """The model field (or annotation's output field) the page is ordered on."""
+        annotation = queryset.query.annotations.get(self.field)
+        if annotation is not None:
+            return annotation.output_field
+        return queryset.model._meta.get_field(self.field)
+
+    def get_position_filter(self, value, pk):
+        lookup = 'lt' if self.descending else 'gt'
+        # the redundant `field <= value` bound is what lets the database seek
+        # into the (field, id) index instead of scanning it from the start
+        return Q(**{f'{self.field}__{lookup}e': value}) & (
+            Q(**{f'{self.field}__{lookup}': value})
+            | Q(**{f'id__{lookup}': pk})
+        )
+
+    def get_row_value(self, row, name):
+        if isinstance(row, dict):
+            return row[name]
+        return getattr(row, name)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        last = self.page[-1]
+        cursor = self.encode_cursor(self.get_row_value(last, self.field), self.get_row_value(last, 'id'))
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_first_link(self):
+        if self.cursor_query_param not in self.request.query_params:
+            return None
+        return remove_query_param(self.request.build_absolute_uri(), self.cursor_query_param)
+
+    def encode_cursor(self, value, pk):
+        # the ordering travels with the position, a cursor is only valid for the ordering it came from
+        if isinstance(value, (datetime, Decimal)):
+            value = value.isoformat() if isinstance(value, datetime) else str(value)
+        payload = json.dumps([self.ordering, value, pk], separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(payload).decode().rstrip('=')
+
+    def decode_cursor(self, request, key_field):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            payload = base64.urlsafe_b64decode(encoded + '=' * (-len(encoded) % 4))
+            ordering, value, pk = json.loads(payload)
+            if ordering != self.ordering or value is None:
+                raise ValueError('cursor of another ordering')
+            return key_field.to_python(value), int(pk)
+        except (TypeError, ValueError, ArithmeticError, DjangoValidationError):
+            raise NotFound('Invalid cursor')
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('first', self.get_first_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'first': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
@@ -0,0 +1,123 @@
+import logging
+import re
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+logger = logging.getLogger(__name__)
+
+_stats = ContextVar('query_stats', default=None)
+
+# `IN (%s, %s, ...)` lists of any length are one shape
+_IN_LIST = re.compile(r'%s(?:, %s)+')
+
+
+class QueryStats:
+    def __init__(self):
+        self.count = 0
+        self.time = 0.0
+        self.shapes = Counter()
+
+    def repeated(self, threshold=None):
+        """SQL run at least `threshold` times, the signature of an N+1 loop."""
+        if threshold is None:
+            threshold = getattr(settings, 'QUERY_BUDGET_REPEAT_THRESHOLD', 5)
+        return [(sql, n) for sql, n in self.shapes.most_common() if n >= threshold]
+
+
+def record_queries(execute, sql, params, many, context):
+    stats = _stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.count += 1
+        stats.time += time.perf_counter() - start
+        stats.shapes[_IN_LIST.sub('%s', sql)] += 1
+
+
+def install(connection, **kwargs):
+    if record_queries not in connection.execute_wrappers:
+        # outermost, so wrappers that retry a query don't count it twice
+        connection.execute_wrappers.insert(0, record_queries)
+
+
+def route_name(request):
+    """The url name timings, query budgets and throttles are keyed on."""
+    match = getattr(request, 'resolver_match', None)
+    # unmatched paths would give every scanner's probe its own series
+    return match.view_name if match else 'unmatched'
+
+
+def query_budget(method, route):
+    budgets = getattr(settings, 'QUERY_BUDGETS', {})
+    for key in (f'{method} {route}', route):
+        if key in budgets:
+            return budgets[key]
+    return getattr(settings, 'QUERY_BUDGET_DEFAULT', None)
+
+
+class QueryBudgetMiddleware:
+    """
+    Count each request's queries and their time, and log the ones over budget.
+
+    Budgets are QUERY_BUDGETS['METHOD url name'] or QUERY_BUDGETS[url name],
+    falling back to QUERY_BUDGET_DEFAULT. SQL repeated
+    QUERY_BUDGET_REPEAT_THRESHOLD times in one request is logged as a likely
+    N+1. The stats are left on `response.query_stats`. Only active with
+    QUERY_BUDGET_ENABLED (defaults to DEBUG).
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'QUERY_BUDGET_ENABLED', settings.DEBUG):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        # every connection opened from now on, plus the ones already open here
+        connection_created.connect(install, dispatch_uid='querybudget')
+        for connection in connections.all(initialized_only=True):
+            install(connection)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats = QueryStats()
+        token = _stats.set(stats)
+        try:
+            response = self.get_response(request)
+        finally:
+            _stats.reset(token)
+        return self.report(request, response, stats)
+
+    async def __acall__(self, request):
+        # sync_to_async copies the context, so database work in threads lands here too
+        stats = QueryStats()
+        token = _stats.set(stats)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _stats.reset(token)
+        return self.report(request, response, stats)
+
+    def report(self, request, response, stats):
+        route = route_name(request)
+        budget = query_budget(request.method, route)
+        if budget is not None and stats.count > budget:
+            logger.warning('%s %s ran %d queries (budget %d) in %.1fms',
+                           request.method, route, stats.count, budget, stats.time * 1000)
+        for sql, n in stats.repeated():
+            logger.warning('%s %s ran the same query %d times, likely an N+1: %s', request.method, route, n, sql)
+        response.query_stats = stats
+        return response
@@ -0,0 +1,146 @@
+import random
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connections
+
+PIN_COOKIE = 'pin_primary'
+
+_state = ContextVar('db_routing', default=None)
+
+
+class RoutingState:
+    def __init__(self):
+        self.replica_reads = False
+        self.wrote = False
+
+
+def replicas():
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+class PrimaryReplicaRouter:
+    """
+    Writes go to the primary, and so do reads unless the view serving the
+    request opted in with `allow_replica_reads()`. Once a request has
+    written, or inside a transaction, it reads from the primary again.
+    """
+
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is None or not state.replica_reads or state.wrote or not replicas():
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas())
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+def pin_key(user_id):
+    return f'db:pin:{user_id}'
+
+
+def pin_cache():
+    return caches[getattr(settings, 'DATABASE_PIN_CACHE_ALIAS', 'default')]
+
+
+def is_pinned(request):
+    """Whether the client wrote recently enough that a replica may not have its writes yet."""
+    if PIN_COOKIE in request.COOKIES:
+        return True
+    user = getattr(request, 'user', None)
+    return bool(user is not None and user.is_authenticated and pin_cache().get(pin_key(user.pk)))
+
+
+def allow_replica_reads(request):
+    """Let the rest of this request read from a replica, unless the client is pinned to the primary."""
+    state = _state.get()
+    if state is not None and replicas() and not is_pinned(request):
+        state.replica_reads = True
+
+
+def replica_reads(view):
+    """Decorator for function API views (inside @api_view) that may read from a replica."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        allow_replica_reads(request)
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+class ReplicaReadMixin:
+    """ViewSet mixin: the `replica_actions` may read from a replica."""
+
+    replica_actions = ('list', 'retrieve')
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        # after authentication, so a pinned user is recognized
+        if self.action in self.replica_actions:
+            allow_replica_reads(request)
+
+
+class DatabaseRoutingMiddleware:
+    """
+    Track each request for PrimaryReplicaRouter and pin clients that wrote.
+
+    A pinned client reads from the primary for DATABASE_PIN_SECONDS: signed-in
+    users through the cache, everyone through a cookie.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not replicas():
+            return self.get_response(request)
+        state = RoutingState()
+        token = _state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self.pin(request, response, state)
+
+    async def __acall__(self, request):
+        if not replicas():
+            return await self.get_response(request)
+        state = RoutingState()
+        token = _state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self.pin(request, response, state)
+
+    def pin(self, request, response, state):
+        if state.wrote:
+            seconds = getattr(settings, 'DATABASE_PIN_SECONDS', 5)
+            user = getattr(request, 'user', None)
+            if user is not None and user.is_authenticated:
+                pin_cache().set(pin_key(user.pk), True, seconds)
+            response.set_cookie(PIN_COOKIE, '1', max_age=seconds, httponly=True, samesite='Lax')
+        return response
@@ -39,27 +39,39 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'Onlineshop',
     'users',
     'products',
     'orders',
     'rest_framework',
     'drf_spectacular',
     'cart',
+    'reports',
+    'jobs',
+    'loadtest',
 ]
 
 REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
-    'DEFAULT_AUTHENTICATION_CLASSES': ['rest_framework_simplejwt.authentication.JWTAuthentication']
+    'DEFAULT_AUTHENTICATION_CLASSES': ['users.authentication.CachedJWTAuthentication'],
+    'DEFAULT_RENDERER_CLASSES': [
+        'Onlineshop.metrics.TimedJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_THROTTLE_CLASSES': ['Onlineshop.throttling.RouteThrottle'],
 }
 
 AUTH_USER_MODEL = 'users.User'
 
 MIDDLEWARE = [
+    'Onlineshop.metrics.TimingMiddleware',
+    'Onlineshop.querybudget.QueryBudgetMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'Onlineshop.routers.DatabaseRoutingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -90,9 +102,25 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    },
+    # read-only copy of default, used once listed in DATABASE_REPLICAS. Locally
+    # it is the same file, which is enough to exercise the routing.
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ.get('DATABASE_REPLICA_NAME', BASE_DIR / 'db.sqlite3'),
+        'TEST': {'MIRROR': 'default'},
+    },
 }
 
+DATABASE_ROUTERS = ['Onlineshop.routers.PrimaryReplicaRouter']
+# aliases that views marked for replica reads (catalog, order history,
+# reports) may read from, e.g. DATABASE_REPLICAS=replica
+DATABASE_REPLICAS = [alias for alias in os.environ.get('DATABASE_REPLICAS', '').split(',') if alias]
+DATABASE_PIN_SECONDS = 5  # how long a client that wrote keeps reading from the primary
+# where signed-in users' pins live: a cache every worker shares, checked as
+# Onlineshop.E001 (silence it to try replicas in a single local process)
+DATABASE_PIN_CACHE_ALIAS = 'default'
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -138,13 +166,104 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Request metrics: Server-Timing headers and /api/_metrics (staff only)
+METRICS_ENABLED = True
+METRICS_DIR = os.environ.get('METRICS_DIR')  # shared directory so every worker process's numbers are reported
+METRICS_WRITE_INTERVAL = 5  # seconds between writes to METRICS_DIR
+
+# Query budgets: QueryBudgetMiddleware logs requests running more queries
+# than their budget ('METHOD url name' or 'url name'), and SQL repeated
+# within one request
+QUERY_BUDGET_ENABLED = DEBUG
+QUERY_BUDGET_DEFAULT = None
+QUERY_BUDGET_REPEAT_THRESHOLD = 5
+QUERY_BUDGETS = {
+    'cart': 6,
+    'POST cart': 7,  # a user's first add also creates the cart
+    'cart-item': 2,
+    'PATCH cart-item': 3,
+    'cart-batch': 10,
+    'checkout': 9,
+    'checkout-async': 10,
+    'payment-callback': 30,  # verification and fulfilment included when JOBS_EAGER
+    'payment-callback-async': 30,  # the same job, verified on the event loop when JOBS_EAGER
+    'order-list': 2,
+    'POST order-list': 5,
+    'order-detail': 2,
+    'product-list': 3,
+    'product-detail': 2,
+    'product-bulk-import': 10,
+    'protected': 1,
+    'register': 3,
+    'token_obtain_pair': 1,
+    'update-profile': 2,
+    'user-info-list': 2,
+    'user-info-detail': 2,
+    'user-bulk-import': 8,
+    'report-revenue': 1,
+    'report-top-products': 1,
+    'report-order-status': 1,
+}
+
+# Users
+PASSWORD_HASH_WORKERS = None  # threads hashing passwords, None for one per core, 0 to hash inline
+PASSWORD_HASH_MAX_PENDING = None  # hashes running or queued before sign-ins get a 503, None for 4 per worker
+USER_CACHE_SIZE = 10000  # users CachedJWTAuthentication keeps per process
+USER_CACHE_TIMEOUT = 60  # seconds, well under ACCESS_TOKEN_LIFETIME
+USER_CACHE_ALIAS = None  # a CACHES alias to share cached users between processes
+
+# Rate limiting, counted in CACHES[THROTTLE_CACHE_ALIAS]: use a shared cache (Redis, Memcached)
+# so all worker processes see the same counts
+THROTTLE_ENABLED = not DEBUG  # off in development
+THROTTLE_CACHE_ALIAS = 'default'
+THROTTLES = {  # by 'METHOD url name' or url name; rate as 'N/s|m|h|d', per user (IP if anonymous) or per 'ip'
+    'token_obtain_pair': {'algorithm': 'token_bucket', 'rate': '10/m', 'by': 'ip'},
+    'register': {'algorithm': 'sliding_window', 'rate': '10/h', 'by': 'ip'},
+    'cart': {'algorithm': 'sliding_window', 'rate': '120/m'},
+    'cart-item': {'algorithm': 'sliding_window', 'rate': '120/m'},
+    'cart-batch': {'algorithm': 'sliding_window', 'rate': '30/m'},
+    # one bucket for both checkout views
+    'checkout': {'algorithm': 'token_bucket', 'rate': '5/m', 'scope': 'checkout'},
+    'checkout-async': {'algorithm': 'token_bucket', 'rate': '5/m', 'scope': 'checkout'},
+}
+
+# Product catalog
+PRODUCT_SEARCH_MAX_RESULTS = 1000  # matches listed per ?search= query ordered by relevance, after the other filters
+CATALOG_VERSION_CACHE_TIMEOUT = 5  # seconds a process may serve a cached catalog version
+POPULARITY_FLUSH_INTERVAL = 5  # seconds between counter flushes, None to flush only at exit
+POPULARITY_HALF_LIFE = 7 * 24 * 3600  # seconds after which a sale or cart add counts half as much
+POPULARITY_WEIGHTS = {'cart_add': 1, 'unit_sold': 5}
+
+# Cart
+CART_BACKEND = 'database'  # 'cache' keeps live carts in CACHES and writes them back in the background
+CART_CACHE_ALIAS = 'default'
+CART_CACHE_TIMEOUT = 60 * 60 * 24 * 7
+CART_FLUSH_INTERVAL = 5  # seconds between write-behind flushes, None to flush only at checkout/exit
+
+# Background jobs (python manage.py runworker)
+JOBS_EAGER = False  # True runs jobs inline at enqueue time, no worker needed; False needs runworker, or payments stay pending
+JOBS_MAX_ATTEMPTS = 5
+JOBS_RETRY_BACKOFF = 5  # seconds before the first retry, doubled per attempt
+JOBS_RETRY_MAX_DELAY = 3600
+JOBS_LEASE_TIMEOUT = 300  # seconds before a job of a vanished worker is run again
+
 # ZarinPal Payment Settings
 ZARINPAL_MERCHANT_ID = '5ba078bd-644a-4142-aa63-531e1cedefea'  # Test Merchant ID
-ZARINPAL_PAYMENT_REQUEST_URL = "https://sandbox.zarinpal.com/pg/v4/payment/request.json" # Test PaymentRequest URL
-ZARINPAL_PAYMENT_VERIFICATION_URL = "https://sandbox.zarinpal.com/pg/v4/payment/verify.json"  # Test PaymentVerification URL
-ZARINPAL_STARTPAY_URL = "https://sandbox.zarinpal.com/pg/StartPay/"
+ZARINPAL_BASE_URL = os.environ.get('ZARINPAL_BASE_URL', "https://sandbox.zarinpal.com")  # a fake gateway's for load tests
+ZARINPAL_PAYMENT_REQUEST_URL = f"{ZARINPAL_BASE_URL}/pg/v4/payment/request.json" # Test PaymentRequest URL
+ZARINPAL_PAYMENT_VERIFICATION_URL = f"{ZARINPAL_BASE_URL}/pg/v4/payment/verify.json"  # Test PaymentVerification URL
+ZARINPAL_STARTPAY_URL = f"{ZARINPAL_BASE_URL}/pg/StartPay/"
 ZARINPAL_CALLBACK_URL = "http://127.0.0.1:8000/api/orders/payment/callback/"
 ZARINPAL_CURRENCY = "IRT"
+ZARINPAL_CONNECT_TIMEOUT = 3.05
+ZARINPAL_READ_TIMEOUT = 10
+ZARINPAL_VERIFY_RETRIES = 2  # extra attempts for verification, which is idempotent
+ZARINPAL_RETRY_BACKOFF = 0.2  # seconds, doubled per attempt, full jitter
+ZARINPAL_BREAKER_THRESHOLD = 5  # consecutive failures before checkouts fail fast
+ZARINPAL_BREAKER_RESET_TIMEOUT = 30  # seconds before a trial call is let through
+ZARINPAL_POOL_SIZE = 10
+ZARINPAL_ASYNC_POOL_SIZE = 200  # connections the async views may hold open to the gateway
+PAYMENT_CLAIM_TIMEOUT = 60  # seconds before a callback stuck mid-way may be picked up again
 
 
 
@@ -0,0 +1,18 @@
+from .querybudget import query_budget, route_name
+
+
+class QueryBudgetMixin:
+    """TestCase mixin checking responses against QUERY_BUDGETS (see Onlineshop.querybudget)."""
+
+    def assertWithinBudget(self, response, budget=None):
+        stats = getattr(response, 'query_stats', None)
+        if stats is None:
+            self.fail('Response has no query stats, is QueryBudgetMiddleware enabled?')
+        request = getattr(response, 'wsgi_request', None) or response.asgi_request
+        route = route_name(request)
+        if budget is None:
+            budget = query_budget(request.method, route)
+        if budget is None:
+            self.fail(f'No query budget for {route!r}, add it to QUERY_BUDGETS')
+        self.assertLessEqual(stats.count, budget, f'{route} ran {stats.count} queries, budget is {budget}')
+        self.assertEqual(stats.repeated(), [], f'{route} repeats queries, likely an N+1')
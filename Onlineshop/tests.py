@@ -0,0 +1,254 @@
+import json
+import os
+import shutil
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connections
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from products.models import Product
+from .checks import check_pin_cache, check_throttle_cache
+from .metrics import Registry, collect, registry, write_snapshot
+from .querybudget import QueryBudgetMiddleware
+from .routers import PIN_COOKIE
+from .throttling import SlidingWindow, TokenBucket, reset_limiters
+
+
+@override_settings(QUERY_BUDGET_ENABLED=True, QUERY_BUDGET_DEFAULT=3, QUERY_BUDGET_REPEAT_THRESHOLD=5)
+class QueryBudgetMiddlewareTests(TestCase):
+    def view(self, request):
+        for pk in range(6):
+            Product.objects.filter(pk=pk).first()
+        return HttpResponse()
+
+    def test_logs_over_budget_and_repeated_queries(self):
+        with self.assertLogs('Onlineshop.querybudget', 'WARNING') as logs:
+            response = QueryBudgetMiddleware(self.view)(RequestFactory().get('/somewhere/'))
+        self.assertEqual(response.query_stats.count, 6)
+        self.assertIn('GET unmatched ran 6 queries (budget 3)', logs.output[0])
+        self.assertIn('same query 6 times, likely an N+1', logs.output[1])
+
+    @override_settings(QUERY_BUDGET_DEFAULT=10)
+    def test_quiet_within_budget(self):
+        with self.assertNoLogs('Onlineshop.querybudget', 'WARNING'):
+            response = QueryBudgetMiddleware(lambda request: HttpResponse())(RequestFactory().get('/'))
+        self.assertEqual(response.query_stats.count, 0)
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        registry.reset()
+        User = get_user_model()
+        self.staff = User.objects.create_user(username='staff', email='staff@example.com', is_staff=True)
+        self.buyer = User.objects.create_user(username='buyer', email='buyer@example.com')
+        Product.objects.create(name='Lamp', price=10, stock=5)
+
+    def test_server_timing_header(self):
+        response = self.client.get(reverse('product-list'))
+        phases = dict(entry.split(';dur=') for entry in response['Server-Timing'].split(', '))
+        self.assertEqual(set(phases), {'db', 'serialize', 'total'})
+        self.assertGreaterEqual(float(phases['total']), float(phases['db']))
+
+    def test_prometheus_endpoint_is_staff_only(self):
+        api = APIClient()
+        self.client.get(reverse('product-list'))
+        self.client.get('/no/such/page/')
+
+        self.assertEqual(api.get(reverse('metrics')).status_code, 401)
+        api.force_authenticate(self.buyer)
+        self.assertEqual(api.get(reverse('metrics')).status_code, 403)
+        api.force_authenticate(self.staff)
+        response = api.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        body = response.content.decode()
+        self.assertIn('onlineshop_requests_total{route="product-list",method="GET",status="200"} 1', body)
+        self.assertIn('onlineshop_requests_total{route="unmatched",method="GET",status="404"} 1', body)
+        self.assertIn('onlineshop_request_phase_seconds_count{route="product-list",phase="db"} 1', body)
+        self.assertIn('onlineshop_request_phase_seconds_bucket{route="product-list",phase="total",le="+Inf"} 1', body)
+
+    def test_other_processes_are_added_up(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        other = Registry()
+        other.observe('cart', 'GET', 200, {'total': 0.003, 'db': 0.001})
+        with open(os.path.join(directory, 'metrics-99999.json'), 'w') as f:
+            json.dump(other.snapshot(), f)
+        registry.observe('cart', 'GET', 200, {'total': 0.2})
+
+        with override_settings(METRICS_DIR=directory):
+            write_snapshot()  # this process's own file is not counted twice
+            requests, histograms = collect()
+        self.assertEqual(requests[('cart', 'GET', 200)], 2)
+        self.assertEqual(sum(histograms[('cart', 'total')][:-1]), 2)
+        self.assertAlmostEqual(histograms[('cart', 'total')][-1], 0.203)
+        self.assertEqual(sum(histograms[('cart', 'db')][:-1]), 1)
+
+
+@override_settings(DATABASE_REPLICAS=['replica'], DATABASE_PIN_SECONDS=60, POPULARITY_FLUSH_INTERVAL=None)
+class ReplicaRoutingTests(TransactionTestCase):
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(username='buyer', email='buyer@example.com')
+        self.product = Product.objects.create(name='Lamp', price=10, stock=5)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def queries(self, method, url, **kwargs):
+        with CaptureQueriesContext(connections['default']) as primary, \
+                CaptureQueriesContext(connections['replica']) as replica:
+            response = getattr(self.client, method)(url, **kwargs)
+        return response, len(primary), len(replica)
+
+    def test_catalog_and_history_read_from_replica(self):
+        response, primary, replica = self.queries('get', reverse('product-list'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'][0]['name'], 'Lamp')
+        self.assertEqual(primary, 0)
+        self.assertGreater(replica, 0)
+
+        _, primary, replica = self.queries('get', reverse('order-list'))
+        self.assertEqual(primary, 0)
+        self.assertGreater(replica, 0)
+
+    def test_cart_reads_stay_on_primary(self):
+        _, primary, replica = self.queries('get', reverse('cart'))
+        self.assertGreater(primary, 0)
+        self.assertEqual(replica, 0)
+
+    def test_writer_is_pinned_to_primary(self):
+        response, _, _ = self.queries('post', reverse('cart'), data={'product_id': self.product.pk, 'quantity': 1})
+        self.assertEqual(response.status_code, 201)
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+        # pinned by user, even for a client that dropped the cookie
+        self.client.cookies.clear()
+        _, primary, replica = self.queries('get', reverse('order-list'))
+        self.assertGreater(primary, 0)
+        self.assertEqual(replica, 0)
+
+        cache.clear()
+        _, primary, replica = self.queries('get', reverse('order-list'))
+        self.assertEqual(primary, 0)
+        self.assertGreater(replica, 0)
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_no_replicas_means_no_routing(self):
+        response, _, _ = self.queries('post', reverse('cart'), data={'product_id': self.product.pk})
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+        _, _, replica = self.queries('get', reverse('product-list'))
+        self.assertEqual(replica, 0)
+
+
+SHARED_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'shared': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://localhost:6379'},
+}
+
+
+@override_settings(CACHES=SHARED_CACHES)
+class SharedCacheCheckTests(SimpleTestCase):
+    def test_replicas_need_a_shared_pin_cache(self):
+        self.assertEqual(check_pin_cache(None), [])
+        with override_settings(DATABASE_REPLICAS=['replica']):
+            self.assertEqual([error.id for error in check_pin_cache(None)], ['Onlineshop.E001'])
+            with override_settings(DATABASE_PIN_CACHE_ALIAS='shared'):
+                self.assertEqual(check_pin_cache(None), [])
+
+
+    def test_throttling_warns_about_a_per_process_cache(self):
+        with override_settings(THROTTLE_ENABLED=True):
+            self.assertEqual([warning.id for warning in check_throttle_cache(None)], ['Onlineshop.W001'])
+            with override_settings(THROTTLE_CACHE_ALIAS='shared'):
+                self.assertEqual(check_throttle_cache(None), [])
+        with override_settings(THROTTLE_ENABLED=False):
+            self.assertEqual(check_throttle_cache(None), [])
+
+
+class LimiterTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_token_bucket_bursts_then_holds_to_rate(self):
+        bucket = TokenBucket(3, 60)
+        now = 1_000_000.0
+        self.assertEqual([bucket.consume('k', now) for _ in range(3)], [0, 0, 0])
+        self.assertAlmostEqual(bucket.consume('k', now), 20)
+        self.assertAlmostEqual(bucket.consume('k', now + 15), 5)
+        self.assertEqual(bucket.consume('k', now + 20), 0)
+        self.assertGreater(bucket.consume('k', now + 20), 0)
+        # idle for long enough to refill: a full burst again
+        self.assertEqual([bucket.consume('k', now + 600) for _ in range(3)], [0, 0, 0])
+        self.assertGreater(bucket.consume('k', now + 600), 0)
+
+    def test_token_bucket_burst_after_partial_idle(self):
+        bucket = TokenBucket(3, 60)
+        now = 1_000_000.0
+        self.assertEqual([bucket.consume('k', now) for _ in range(3)], [0, 0, 0])
+        # 100s later the bucket is full again, but idle time beyond that is no extra tokens
+        self.assertEqual([bucket.consume('k', now + 100) for _ in range(3)], [0, 0, 0])
+        self.assertAlmostEqual(bucket.consume('k', now + 100), 20)
+
+    def test_sliding_window_weighs_previous_window(self):
+        window = SlidingWindow(4, 60)
+        start = 60 * 1000
+        self.assertEqual([window.consume('k', start + 10) for _ in range(4)], [0, 0, 0, 0])
+        # in the next window, once a quarter of it has gone by
+        self.assertAlmostEqual(window.consume('k', start + 10), 65)
+        # half way into the next window half of the previous four still count
+        self.assertEqual([window.consume('k', start + 90) for _ in range(2)], [0, 0])
+        self.assertAlmostEqual(window.consume('k', start + 90), 15)
+        self.assertEqual(window.consume('k', start + 105), 0)
+
+    def test_refused_key_is_refused_locally(self):
+        bucket = TokenBucket(1, 60)
+        self.assertEqual(bucket.hit('k'), 0)
+        self.assertGreater(bucket.hit('k'), 0)
+        cache.clear()
+        self.assertGreater(bucket.hit('k'), 0)
+        self.assertEqual(bucket.hit('other'), 0)
+
+
+@override_settings(THROTTLE_ENABLED=True, THROTTLES={
+    'token_obtain_pair': {'algorithm': 'token_bucket', 'rate': '2/m', 'by': 'ip'},
+    'checkout': {'rate': '2/m', 'scope': 'checkout'},
+    'checkout-async': {'rate': '2/m', 'scope': 'checkout'},
+})
+class ThrottleTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        reset_limiters()
+        self.user = get_user_model().objects.create_user(username='ali', email='ali@example.com', password='pass1234')
+
+    def test_token_endpoint_is_limited_per_ip(self):
+        credentials = {'username': 'ali', 'password': 'pass1234'}
+        for _ in range(2):
+            self.assertEqual(self.client.post(reverse('token_obtain_pair'), credentials).status_code, 200)
+        response = self.client.post(reverse('token_obtain_pair'), credentials)
+        self.assertEqual(response.status_code, 429)
+        self.assertIn(response['Retry-After'], ('29', '30'))
+        response = self.client.post(reverse('token_obtain_pair'), credentials, REMOTE_ADDR='10.0.0.2')
+        self.assertEqual(response.status_code, 200)
+
+    def test_checkout_views_share_a_limit_per_user(self):
+        api = APIClient()
+        api.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}')
+        self.assertEqual(api.post(reverse('checkout')).status_code, 400)
+        self.assertEqual(api.post(reverse('checkout-async')).status_code, 400)
+        response = api.post(reverse('checkout-async'))
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+        self.assertEqual(api.post(reverse('checkout')).status_code, 429)
+
+        other = get_user_model().objects.create_user(username='reza', email='reza@example.com')
+        api.force_authenticate(other)
+        self.assertEqual(api.post(reverse('checkout')).status_code, 400)
@@ -0,0 +1,212 @@
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.throttling import BaseThrottle
+
+from .querybudget import route_name
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+MAX_LOCAL_KEYS = 10000
+
+
+def parse_rate(rate):
+    """'10/m' -> (10, 60), in DRF's rate format."""
+    num, period = rate.split('/')
+    return int(num), PERIODS[period[0]]
+
+
+class Limiter:
+    """
+    A rate limit of `num` requests per `period` seconds, counted in the cache
+    under `alias` so every process sees the same counts.
+
+    A request under the limit costs one atomic `incr` once the key exists.
+    Extra round trips: a key's first request adds `add` after the failed
+    `incr` (and sliding windows a `get` of the previous window, once per
+    client and window); a refusal gives its count back with a `decr`, after
+    which the same process refuses that key by itself until it may retry,
+    so a client hammering a limit costs the cache next to nothing.
+    """
+
+    def __init__(self, num, period, alias='default'):
+        self.num = num
+        self.period = period
+        self.alias = alias
+        self.refused = {}  # key -> time until which this process refuses it
+        self.lock = threading.Lock()
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def hit(self, key):
+        """Count a request for `key`: 0 if it may go ahead, else the seconds to wait."""
+        now = time.time()
+        until = self.refused.get(key)
+        if until is not None:
+            if now < until:
+                return until - now
+            self.refused.pop(key, None)
+        wait = self.consume(key, now)
+        if wait:
+            if len(self.refused) >= MAX_LOCAL_KEYS:
+                with self.lock:
+                    self.refused = {k: t for k, t in list(self.refused.items()) if t > now}
+            self.refused[key] = now + wait
+        return wait
+
+    def consume(self, key, now):
+        raise NotImplementedError
+
+    def incr(self, key, delta, initial, timeout):
+        try:
+            return self.cache.incr(key, delta)
+        except ValueError:
+            if self.cache.add(key, initial, timeout):
+                return initial
+            return self.cache.incr(key, delta)
+
+
+class TokenBucket(Limiter):
+    """
+    A bucket of `num` tokens refilled at `num` per `period`, so clients may
+    burst up to `num` requests and are then held to the rate.
+
+    Kept as GCRA: the key holds the bucket's theoretical arrival time in
+    milliseconds, which every request pushes one token's worth further with
+    `incr`. A client whose arrival time has fallen behind now (an idle
+    bucket, partly or fully refilled) restarts it from now, which costs one
+    extra write; otherwise its idle time would count as tokens on top of the
+    burst.
+    """
+
+    def __init__(self, num, period, alias='default'):
+        super().__init__(num, period, alias)
+        self.interval = max(1, period * 1000 // num)
+        self.burst = self.interval * num
+        # incr doesn't extend a key's life, so a busy client's bucket only
+        # expires (and refills early) hourly
+        self.timeout = max(2 * period, 3600)
+
+    def consume(self, key, now):
+        now = int(now * 1000)
+        tat = self.incr(key, self.interval, now + self.interval, self.timeout)
+        if tat - self.interval < now:
+            self.cache.set(key, now + self.interval, self.timeout)
+            return 0
+        if tat - now > self.burst:
+            self.cache.decr(key, self.interval)
+            return (tat - now - self.burst) / 1000
+        return 0
+
+
+class SlidingWindow(Limiter):
+    """
+    At most `num` requests in any `period` seconds, estimated from the counts
+    of the current and previous fixed windows, the previous one weighted by
+    how much of it still overlaps the sliding window.
+
+    The previous window's count no longer changes, so each process reads it
+    once per client and window.
+    """
+
+    def __init__(self, num, period, alias='default'):
+        super().__init__(num, period, alias)
+        self.previous_counts = {}  # key -> (window, count of the window before it)
+
+    def previous(self, key, window):
+        cached = self.previous_counts.get(key)
+        if cached is not None and cached[0] == window:
+            return cached[1]
+        count = self.cache.get(f'{key}:{window - 1}', 0)
+        if len(self.previous_counts) >= MAX_LOCAL_KEYS:
+            with self.lock:
+                self.previous_counts = {k: v for k, v in list(self.previous_counts.items()) if v[0] == window}
+        self.previous_counts[key] = (window, count)
+        return count
+
+    def consume(self, key, now):
+        window, elapsed = divmod(now / self.period, 1)
+        window = int(window)
+        count = self.incr(f'{key}:{window}', 1, 1, 2 * self.period)
+        previous = self.previous(key, window)
+        if previous * (1 - elapsed) + count <= self.num:
+            return 0
+
+        self.cache.decr(f'{key}:{window}')
+        count -= 1
+        if count < self.num and previous:
+            # once enough of the previous window has slid out
+            return (1 - (self.num - count - 1) / previous - elapsed) * self.period
+        # in the next window, once enough of this one has slid out
+        return (1 - elapsed + max(0, 1 - (self.num - 1) / count)) * self.period
+
+
+ALGORITHMS = {'token_bucket': TokenBucket, 'sliding_window': SlidingWindow}
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(algorithm, rate):
+    alias = getattr(settings, 'THROTTLE_CACHE_ALIAS', 'default')
+    key = (algorithm, rate, alias)
+    limiter = _limiters.get(key)
+    if limiter is None:
+        with _limiters_lock:
+            limiter = _limiters.get(key)
+            if limiter is None:
+                limiter = _limiters[key] = ALGORITHMS[algorithm](*parse_rate(rate), alias=alias)
+    return limiter
+
+
+def reset_limiters():
+    with _limiters_lock:
+        _limiters.clear()
+
+
+def throttle_config(method, route):
+    throttles = getattr(settings, 'THROTTLES', {})
+    for key in (f'{method} {route}', route):
+        if key in throttles:
+            return key, throttles[key]
+    return None, None
+
+
+def client_ident(request, by='user'):
+    user = getattr(request, 'user', None)
+    if by == 'user' and user is not None and user.is_authenticated:
+        return f'user:{user.pk}'
+    # BaseThrottle's, which honours REST_FRAMEWORK['NUM_PROXIES']
+    return f'ip:{BaseThrottle().get_ident(request)}'
+
+
+def throttle_wait(request):
+    """
+    Count `request` against its route's limit in THROTTLES: 0 if it may go
+    ahead, else the seconds until it may.
+    """
+    if not getattr(settings, 'THROTTLE_ENABLED', True):
+        return 0
+    key, config = throttle_config(request.method, route_name(request))
+    if config is None:
+        return 0
+    limiter = get_limiter(config.get('algorithm', 'sliding_window'), config['rate'])
+    scope = config.get('scope', key).replace(' ', ':')
+    return limiter.hit(f"throttle:{scope}:{client_ident(request, config.get('by', 'user'))}")
+
+
+class RouteThrottle(BaseThrottle):
+    """
+    Rate limits by url name from THROTTLES, shared by all processes through
+    CACHES[THROTTLE_CACHE_ALIAS]. Routes without an entry aren't limited.
+    """
+
+    def allow_request(self, request, view):
+        self.wait_seconds = throttle_wait(request)
+        return not self.wait_seconds
+
+    def wait(self):
+        return self.wait_seconds
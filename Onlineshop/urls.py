@@ -21,7 +21,9 @@ from django.conf.urls.static import static
 from rest_framework.routers import DefaultRouter
 from products.views import ProductViewSet
 from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView, SpectacularRedocView
-from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
+from rest_framework_simplejwt.views import TokenRefreshView
+from users.views import TokenObtainPairView
+from .views import metrics
 
 
 router = DefaultRouter()
@@ -38,9 +40,12 @@ urlpatterns = [
     path('api/users/', include('users.urls')),
     path('api/orders/', include('orders.urls')),
     path('api/cart/', include('cart.urls')),
+    path('api/reports/', include('reports.urls')),
 
     path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+
+    path('api/_metrics', metrics, name='metrics'),
 ]
 
 urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
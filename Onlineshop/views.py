@@ -0,0 +1,14 @@
+from django.http import HttpResponse
+from rest_framework.decorators import api_view, permission_classes, renderer_classes
+from rest_framework.permissions import IsAdminUser
+from rest_framework.renderers import JSONRenderer
+
+from .metrics import collect, render_prometheus
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+@renderer_classes([JSONRenderer])
+def metrics(request):
+    """Request counts and latency histograms of all worker processes, in Prometheus text format."""
+    return HttpResponse(render_prometheus(*collect()), content_type='text/plain; version=0.0.4; charset=utf-8')
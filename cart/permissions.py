@@ -1,5 +1,14 @@
 from rest_framework import permissions
+from .store import cache_backend_enabled
+
+
+class HasCart(permissions.BasePermission):
+    """Signed-in users always, guests too when carts live in the cache."""
+
+    def has_permission(self, request, view):
+        return request.user.is_authenticated or cache_backend_enabled()
+
 
 class IsCartOwner(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
-        return request.user.is_staff or request.user.is_superuser or obj.cart.user == request.user
\ No newline at end of file
+        return request.user.is_staff or request.user.is_superuser or obj.cart.user_id == request.user.pk
\ No newline at end of file
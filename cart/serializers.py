@@ -1,7 +1,8 @@
 from rest_framework import serializers
 from .models import Cart, CartItem
 from products.models import Product
-from products.serializers import ProductSerializer
+from products.pricing import line_total, price_cart
+from products.serializers import ProductSerializer, parse_fields_param
 
 class CartItemSerializer(serializers.ModelSerializer):
     product = ProductSerializer(read_only=True)
@@ -14,18 +15,60 @@ class CartItemSerializer(serializers.ModelSerializer):
         model = CartItem
         fields = ['id', 'product', 'product_id', 'quantity', 'total_price']
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if request is not None:
+            fields = parse_fields_param(request.query_params.get('product_fields'), param='product_fields')
+            if fields is not None:
+                self.fields['product'] = ProductSerializer(read_only=True, fields=fields)
+
     def get_total_price(self, obj):
-        return obj.product.price * obj.quantity
+        if hasattr(obj, 'line_total'):
+            return obj.line_total
+        # not priced through products.pricing.price_lines(), e.g. a freshly saved item
+        return line_total(obj.product.price, obj.product.discount, obj.quantity)
 
 
 class CartSerializer(serializers.ModelSerializer):
-    items = CartItemSerializer(many=True, read_only=True)
-    total_price = serializers.SerializerMethodField()
-
     class Meta:
         model = Cart
-        fields = ['id', 'user', 'items', 'created_at']
+        fields = ['id', 'user', 'created_at']
         read_only_fields = ['user', 'created_at']
 
-    def get_total_price(self, obj):
-        return sum([item.product.price * item.quantity for item in obj.items.all()])
\ No newline at end of file
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        items, quote = price_cart(instance.items.all())
+        data['items'] = CartItemSerializer(items, many=True, context=self.context).data
+        data.update(quote.as_dict())
+        return data
+
+
+class CartAddSerializer(serializers.Serializer):
+    product_id = serializers.IntegerField(min_value=1)
+    quantity = serializers.IntegerField(min_value=1, default=1)
+
+
+class CartOperationSerializer(serializers.Serializer):
+    op = serializers.ChoiceField(choices=['add', 'set', 'remove'], default='add')
+    product_id = serializers.IntegerField(min_value=1)
+    quantity = serializers.IntegerField(min_value=0, default=1)
+
+    def validate(self, attrs):
+        if attrs['op'] == 'add' and attrs['quantity'] < 1:
+            raise serializers.ValidationError({'quantity': 'Ensure this value is greater than or equal to 1.'})
+        return attrs
+
+
+class CartBatchSerializer(serializers.Serializer):
+    operations = CartOperationSerializer(many=True, allow_empty=False, max_length=100)
+
+
+class CartQuantitySerializer(serializers.Serializer):
+    quantity = serializers.IntegerField(min_value=1, required=False)
+    delta = serializers.IntegerField(required=False)
+
+    def validate(self, attrs):
+        if ('quantity' in attrs) == ('delta' in attrs):
+            raise serializers.ValidationError('Send either quantity or delta.')
+        return attrs
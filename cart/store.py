@@ -0,0 +1,235 @@
+import atexit
+import logging
+import threading
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import IntegrityError, transaction
+
+from products.models import Product
+from .models import Cart, CartItem
+
+logger = logging.getLogger(__name__)
+
+# the token survives login() rotating the session key, so the guest cart can be found afterwards
+GUEST_SESSION_KEY = 'guest_cart'
+
+
+def cache_backend_enabled():
+    return getattr(settings, 'CART_BACKEND', 'database') == 'cache'
+
+
+class CacheCartStore:
+    """
+    Live cart kept in Django's cache as `{product_id: quantity}`.
+
+    Keyed per user, or per session for guests. User carts are written back to
+    Cart/CartItem in batches by `flush_dirty_carts()`; guest carts only live in
+    the cache until they are merged into a user cart on login.
+    """
+    key_prefix = 'cart:'
+
+    def __init__(self, key, loader=None):
+        self.key = self.key_prefix + key
+        self.loader = loader
+
+    @classmethod
+    def for_user(cls, user_id):
+        # read through to the database when the cache has no (or an evicted) entry
+        def load():
+            return dict(CartItem.objects.filter(cart__user_id=user_id).values_list('product_id', 'quantity'))
+        return cls(f'user:{user_id}', loader=load)
+
+    @classmethod
+    def for_guest(cls, token):
+        return cls(f'guest:{token}')
+
+    @property
+    def cache(self):
+        return caches[getattr(settings, 'CART_CACHE_ALIAS', 'default')]
+
+    def get(self):
+        lines = self.cache.get(self.key)
+        if lines is None:
+            lines = self.loader() if self.loader else {}
+            if self.loader:
+                self.set(lines)
+        return lines
+
+    def set(self, lines):
+        self.cache.set(self.key, lines, getattr(settings, 'CART_CACHE_TIMEOUT', 60 * 60 * 24 * 7))
+
+    def add(self, product_id, quantity):
+        lines = self.get()
+        lines[product_id] = lines.get(product_id, 0) + quantity
+        self.set(lines)
+        return lines[product_id]
+
+    def remove(self, product_id):
+        lines = self.get()
+        if lines.pop(product_id, None) is None:
+            return False
+        self.set(lines)
+        return True
+
+    def clear(self):
+        self.cache.delete(self.key)
+
+
+_dirty = set()
+_dirty_lock = threading.Lock()
+_flusher = None
+
+
+def mark_dirty(user_id):
+    with _dirty_lock:
+        _dirty.add(user_id)
+    _ensure_flusher()
+
+
+def flush_user_carts(user_ids):
+    """Write the cached carts of `user_ids` to Cart/CartItem in one transaction."""
+    user_ids = list(user_ids)
+    if not user_ids:
+        return
+    wanted = {user_id: CacheCartStore.for_user(user_id).get() for user_id in user_ids}
+
+    with transaction.atomic():
+        carts = {cart.user_id: cart for cart in Cart.objects.filter(user_id__in=user_ids)}
+        missing = [Cart(user_id=user_id) for user_id in user_ids if user_id not in carts]
+        if missing:
+            # a checkout's flush can race the background flusher to create the
+            # same cart: skip the conflict and read back whichever row won
+            Cart.objects.bulk_create(missing, ignore_conflicts=True)
+            carts = {cart.user_id: cart for cart in Cart.objects.filter(user_id__in=user_ids)}
+
+        # products deleted since they were added are silently dropped
+        product_ids = {product_id for lines in wanted.values() for product_id in lines}
+        live_products = set(Product.objects.filter(pk__in=product_ids).values_list('pk', flat=True))
+
+        existing = {}
+        for item in CartItem.objects.filter(cart__in=carts.values()):
+            existing[(item.cart_id, item.product_id)] = item
+
+        to_create, to_update, keep = [], [], set()
+        for user_id, lines in wanted.items():
+            cart = carts[user_id]
+            for product_id, quantity in lines.items():
+                if product_id not in live_products or quantity < 1:
+                    continue
+                key = (cart.pk, product_id)
+                keep.add(key)
+                item = existing.get(key)
+                if item is None:
+                    to_create.append(CartItem(cart=cart, product_id=product_id, quantity=quantity))
+                elif item.quantity != quantity:
+                    item.quantity = quantity
+                    to_update.append(item)
+
+        CartItem.objects.bulk_create(to_create)
+        CartItem.objects.bulk_update(to_update, ['quantity'])
+        stale = [item.pk for key, item in existing.items() if key not in keep]
+        if stale:
+            CartItem.objects.filter(pk__in=stale).delete()
+
+
+def flush_user_cart(user_id):
+    with _dirty_lock:
+        _dirty.discard(user_id)
+    flush_user_carts([user_id])
+
+
+def flush_dirty_carts(batch_size=200):
+    with _dirty_lock:
+        pending = list(_dirty)
+        _dirty.clear()
+    for start in range(0, len(pending), batch_size):
+        batch = pending[start:start + batch_size]
+        try:
+            flush_user_carts(batch)
+        except IntegrityError:
+            # some cart the database won't take: write the rest one by one
+            for user_id in batch:
+                _flush_alone(user_id)
+        except Exception:
+            logger.exception("Flushing %d carts failed, will retry", len(batch))
+            with _dirty_lock:
+                _dirty.update(batch)
+
+
+def _flush_alone(user_id):
+    try:
+        flush_user_carts([user_id])
+    except IntegrityError:
+        # retrying can't help; the cached cart stays as it is until its next edit
+        logger.exception("Dropped unwritable cart of user %s", user_id)
+    except Exception:
+        logger.exception("Flushing cart of user %s failed, will retry", user_id)
+        with _dirty_lock:
+            _dirty.add(user_id)
+
+
+def merge_guest_cart(token, user_id):
+    """Fold a guest's cached cart into the user's cart (quantities add up)."""
+    guest = CacheCartStore.for_guest(token)
+    guest_lines = guest.get()
+    if not guest_lines:
+        return False
+    store = CacheCartStore.for_user(user_id)
+    lines = store.get()
+    for product_id, quantity in guest_lines.items():
+        lines[product_id] = lines.get(product_id, 0) + quantity
+    store.set(lines)
+    guest.clear()
+    mark_dirty(user_id)
+    return True
+
+
+def get_request_store(request):
+    """
+    The cache store for this request: the user's cart, or the guest cart whose
+    token lives in the session. A guest cart is merged into the user's cart the
+    first time the same session shows up authenticated.
+    """
+    session = request.session
+    if request.user.is_authenticated:
+        token = session.pop(GUEST_SESSION_KEY, None)
+        if token:
+            merge_guest_cart(token, request.user.pk)
+        return CacheCartStore.for_user(request.user.pk)
+    if GUEST_SESSION_KEY not in session:
+        session[GUEST_SESSION_KEY] = uuid.uuid4().hex
+    return CacheCartStore.for_guest(session[GUEST_SESSION_KEY])
+
+
+def clear_user_cart(user_id):
+    if cache_backend_enabled():
+        with _dirty_lock:
+            _dirty.discard(user_id)
+        CacheCartStore.for_user(user_id).clear()
+
+
+class _Flusher(threading.Thread):
+    def __init__(self, interval):
+        super().__init__(name='cart-flusher', daemon=True)
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        from django.db import connection
+        while not self.stopped.wait(self.interval):
+            flush_dirty_carts()
+            connection.close()
+
+
+def _ensure_flusher():
+    global _flusher
+    interval = getattr(settings, 'CART_FLUSH_INTERVAL', 5)
+    if interval is None or _flusher is not None:
+        return
+    with _dirty_lock:
+        if _flusher is None:
+            _flusher = _Flusher(interval)
+            _flusher.start()
+            atexit.register(flush_dirty_carts)
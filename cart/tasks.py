@@ -0,0 +1,12 @@
+from jobs.queue import task
+from .models import Cart
+from .store import clear_user_cart
+
+
+@task
+def clear_paid_cart(cart_id, user_id):
+    """Empty the cart an order was paid from, in the database and the cart cache."""
+    if cart_id:
+        # the items go with the cart, on_delete=CASCADE
+        Cart.objects.filter(pk=cart_id).delete()
+    clear_user_cart(user_id)
@@ -1,3 +1,288 @@
-from django.test import TestCase
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import IntegrityError
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework.test import APIRequestFactory, APITestCase, force_authenticate
+
+from Onlineshop.testing import QueryBudgetMixin
+from products.models import Product
+from .models import Cart, CartItem
+from .serializers import CartSerializer
+from .views import CartViewSet
+from . import store
+from .store import CacheCartStore, flush_dirty_carts
+
+
+class CartReadTests(QueryBudgetMixin, APITestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='buyer', email='buyer@example.com', password='pass')
+        self.cart = Cart.objects.create(user=self.user)
+        self.client.force_authenticate(self.user)
+
+    def fill(self, count):
+        products = Product.objects.bulk_create(
+            Product(name=f'P{i}', price=Decimal('19.99'), discount=Decimal('12.5'), stock=100)
+            for i in range(count)
+        )
+        CartItem.objects.bulk_create(CartItem(cart=self.cart, product=product, quantity=3) for product in products)
+
+    def test_totals_apply_discount(self):
+        lamp = Product.objects.create(name='Lamp', price=10, discount=5, stock=5)
+        CartItem.objects.create(cart=self.cart, product=lamp, quantity=1)
+        self.fill(1)
+
+        response = self.client.get(reverse('cart'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            sorted(Decimal(str(item['total_price'])) for item in response.data['items']),
+            [Decimal('9.50'), Decimal('52.47')],
+        )
+        self.assertEqual(Decimal(str(response.data['total_price'])), Decimal('61.97'))
+        self.assertEqual(Decimal(str(CartSerializer(self.cart).data['total_price'])), Decimal('61.97'))
+        self.assertWithinBudget(response)
+
+    def test_single_line_is_priced_like_the_cart(self):
+        self.fill(1)
+        # retrieve isn't routed, but the browsable API and generic views reach it through get_queryset()
+        request = APIRequestFactory().get('/')
+        force_authenticate(request, self.user)
+        response = CartViewSet.as_view({'get': 'retrieve'})(request, pk=CartItem.objects.get().pk)
+        self.assertEqual(response.status_code, 200)
+        # Decimal from products.pricing, not SQL arithmetic (float on SQLite)
+        self.assertIsInstance(response.data['total_price'], Decimal)
+        self.assertEqual(response.data['total_price'], Decimal('52.47'))
+
+    def test_added_item_total_needs_no_extra_query(self):
+        lamp = Product.objects.create(name='Lamp', price=10, discount=5, stock=5)
+        response = self.client.post(reverse('cart'), {'product_id': lamp.pk, 'quantity': 2})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Decimal(str(response.data['item']['total_price'])), Decimal('19.00'))
+        self.assertWithinBudget(response)
+
+    def test_first_add_creates_cart_within_budget(self):
+        self.cart.delete()
+        lamp = Product.objects.create(name='Lamp', price=10, discount=5, stock=5)
+        response = self.client.post(reverse('cart'), {'product_id': lamp.pk, 'quantity': 2})
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(Cart.objects.filter(user=self.user).exists())
+        self.assertWithinBudget(response)
+
+    def test_query_count_does_not_grow_with_cart_size(self):
+        for size in (1, 50, 500):
+            CartItem.objects.filter(cart=self.cart).delete()
+            self.fill(size)
+            # cart lookup, items joined with products, priced in Python
+            with self.assertNumQueries(2):
+                response = self.client.get(reverse('cart'))
+            self.assertEqual(len(response.data['items']), size)
+
+    def test_product_fields_narrow_nested_product(self):
+        self.fill(1)
+        response = self.client.get(reverse('cart'), {'product_fields': 'id,name'})
+        self.assertEqual(set(response.data['items'][0]['product']), {'id', 'name'})
+
+
+class CartBatchTests(QueryBudgetMixin, APITestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='buyer', email='buyer@example.com', password='pass')
+        self.cart = Cart.objects.create(user=self.user)
+        self.lamp = Product.objects.create(name='Lamp', price=10, discount=5, stock=5)
+        self.desk = Product.objects.create(name='Desk', price=Decimal('19.99'), discount=Decimal('12.5'), stock=100)
+        self.chair = Product.objects.create(name='Chair', price=30, stock=10)
+        self.client.force_authenticate(self.user)
+
+    def lines(self):
+        return dict(CartItem.objects.filter(cart=self.cart).values_list('product_id', 'quantity'))
+
+    def test_batch_adds_sets_and_removes_in_one_request(self):
+        CartItem.objects.create(cart=self.cart, product=self.lamp, quantity=1)
+        CartItem.objects.create(cart=self.cart, product=self.chair, quantity=2)
+        response = self.client.post(reverse('cart-batch'), {'operations': [
+            {'product_id': self.lamp.pk, 'quantity': 2},
+            {'op': 'add', 'product_id': self.desk.pk, 'quantity': 3},
+            {'op': 'set', 'product_id': self.desk.pk, 'quantity': 1},
+            {'op': 'remove', 'product_id': self.chair.pk},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertWithinBudget(response)
+        self.assertEqual(self.lines(), {self.lamp.pk: 3, self.desk.pk: 1})
+        self.assertEqual(response.data['total_price'], Decimal('45.99'))
+        self.assertEqual(len(response.data['items']), 2)
+
+    def test_query_count_does_not_grow_with_batch_size(self):
+        products = Product.objects.bulk_create(Product(name=f'P{i}', price=1, stock=10) for i in range(30))
+        operations = [{'product_id': product.pk, 'quantity': 1} for product in products]
+        with self.assertNumQueries(7):
+            response = self.client.post(reverse('cart-batch'), {'operations': operations}, format='json')
+        self.assertEqual(len(response.data['items']), 30)
+        operations = [{'op': 'set', 'product_id': product.pk, 'quantity': 2} for product in products[:15]]
+        operations += [{'op': 'remove', 'product_id': product.pk} for product in products[15:]]
+        # one bulk UPDATE and one DELETE instead of the INSERT
+        with self.assertNumQueries(8):
+            response = self.client.post(reverse('cart-batch'), {'operations': operations}, format='json')
+        self.assertEqual([item['quantity'] for item in response.data['items']], [2] * 15)
+
+    def test_batch_is_all_or_nothing(self):
+        CartItem.objects.create(cart=self.cart, product=self.lamp, quantity=4)
+        response = self.client.post(reverse('cart-batch'), {'operations': [
+            {'product_id': self.desk.pk, 'quantity': 1},
+            {'product_id': self.lamp.pk, 'quantity': 2},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['shortfalls'][0]['product_id'], self.lamp.pk)
+
+        response = self.client.post(reverse('cart-batch'), {'operations': [
+            {'product_id': self.desk.pk, 'quantity': 1},
+            {'product_id': 999999, 'quantity': 1},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.data['product_ids'], [999999])
+        self.assertEqual(self.lines(), {self.lamp.pk: 4})
+
+        response = self.client.post(reverse('cart-batch'), {'operations': [{'op': 'add', 'product_id': 1, 'quantity': 0}]},
+                                    format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_patch_sets_or_shifts_quantity_in_place(self):
+        item = CartItem.objects.create(cart=self.cart, product=self.lamp, quantity=1)
+        url = reverse('cart-item', args=[item.pk])
+        response = self.client.patch(url, {'quantity': 4}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['item']['total_price'], Decimal('38.00'))
+        self.assertWithinBudget(response)
+
+        self.assertEqual(self.client.patch(url, {'delta': -1}, format='json').data['item']['quantity'], 3)
+        self.assertEqual(self.client.patch(url, {'delta': 3}, format='json').status_code, 400)
+        self.assertEqual(self.client.patch(url, {'delta': -3}, format='json').status_code, 400)
+        self.assertEqual(self.client.patch(url, {'quantity': 2, 'delta': 1}, format='json').status_code, 400)
+        self.assertEqual(self.lines(), {self.lamp.pk: 3})
+
+        other = get_user_model().objects.create_user(username='other', email='other@example.com')
+        self.client.force_authenticate(other)
+        self.assertEqual(self.client.patch(url, {'quantity': 1}, format='json').status_code, 404)
+
+
+@override_settings(CART_BACKEND='cache', CART_FLUSH_INTERVAL=None)
+class CacheCartTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(username='buyer', email='buyer@example.com', password='pass')
+        self.lamp = Product.objects.create(name='Lamp', price=10, discount=5, stock=5)
+        self.desk = Product.objects.create(name='Desk', price=Decimal('19.99'), discount=Decimal('12.5'), stock=100)
+
+    def test_guest_cart_lives_in_session(self):
+        response = self.client.post(reverse('cart'), {'product_id': self.lamp.pk, 'quantity': 2})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['item']['total_price'], Decimal('19.00'))
+
+        response = self.client.get(reverse('cart'))
+        self.assertEqual([item['quantity'] for item in response.data['items']], [2])
+        self.assertEqual(response.data['total_price'], Decimal('19.00'))
+        self.assertFalse(CartItem.objects.exists())
+
+    def test_stock_is_checked_against_cached_quantity(self):
+        self.client.post(reverse('cart'), {'product_id': self.lamp.pk, 'quantity': 4})
+        response = self.client.post(reverse('cart'), {'product_id': self.lamp.pk, 'quantity': 2})
+        self.assertEqual(response.status_code, 400)
+
+    def test_add_validates_quantity(self):
+        for quantity in (-3, 0, 'abc'):
+            response = self.client.post(reverse('cart'), {'product_id': self.lamp.pk, 'quantity': quantity})
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('quantity', response.data)
+        self.assertEqual(self.client.get(reverse('cart')).data['items'], [])
+
+    def test_flush_tolerates_a_cart_created_concurrently(self):
+        Cart.objects.filter(user=self.user).delete()
+        CacheCartStore.for_user(self.user.pk).set({self.lamp.pk: 3})
+        lookup = Cart.objects.filter
+        calls = []
+
+        def filter(*args, **kwargs):
+            carts = list(lookup(*args, **kwargs))
+            if not calls:
+                # another flush creates the cart right after this one looked for it
+                Cart.objects.create(user=self.user)
+            calls.append(carts)
+            return carts
+
+        with mock.patch.object(Cart.objects, 'filter', side_effect=filter):
+            store.flush_user_carts([self.user.pk])
+        self.assertEqual(calls[0], [])
+        self.assertEqual(list(CartItem.objects.values_list('cart__user', 'quantity')), [(self.user.pk, 3)])
+
+    def test_unwritable_cart_does_not_block_its_batch(self):
+        other = get_user_model().objects.create_user(username='other', email='other@example.com')
+        CacheCartStore.for_user(self.user.pk).set({self.lamp.pk: 1})
+        CacheCartStore.for_user(other.pk).set({self.desk.pk: 2})
+        store.mark_dirty(self.user.pk)
+        store.mark_dirty(other.pk)
+        flush_user_carts = store.flush_user_carts
+
+        def flush(user_ids):
+            user_ids = list(user_ids)
+            if other.pk in user_ids:
+                raise IntegrityError('CHECK constraint failed')
+            flush_user_carts(user_ids)
+
+        with mock.patch('cart.store.flush_user_carts', side_effect=flush), self.assertLogs('cart.store', 'ERROR'):
+            flush_dirty_carts()
+        self.assertEqual(list(CartItem.objects.values_list('cart__user', 'quantity')), [(self.user.pk, 1)])
+        self.assertFalse(store._dirty)
+
+    def test_guest_cart_merges_on_login_and_flushes(self):
+        self.client.post(reverse('cart'), {'product_id': self.lamp.pk, 'quantity': 1})
+        CacheCartStore.for_user(self.user.pk).set({self.lamp.pk: 2})
+
+        self.client.force_authenticate(self.user)
+        self.client.post(reverse('cart'), {'product_id': self.desk.pk, 'quantity': 3})
+        response = self.client.get(reverse('cart'))
+        self.assertEqual(
+            {item['product']['id']: item['quantity'] for item in response.data['items']},
+            {self.lamp.pk: 3, self.desk.pk: 3},
+        )
+        self.assertEqual(response.data['total_price'], Decimal('80.97'))
+
+        flush_dirty_carts()
+        self.assertEqual(
+            dict(CartItem.objects.filter(cart__user=self.user).values_list('product_id', 'quantity')),
+            {self.lamp.pk: 3, self.desk.pk: 3},
+        )
+
+        self.client.delete(reverse('cart-item', args=[self.lamp.pk]))
+        flush_dirty_carts()
+        self.assertEqual(
+            list(CartItem.objects.filter(cart__user=self.user).values_list('product_id', flat=True)),
+            [self.desk.pk],
+        )
+
+    def test_evicted_cart_reads_through_to_database(self):
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, product=self.desk, quantity=2)
+        self.client.force_authenticate(self.user)
+        response = self.client.get(reverse('cart'))
+        self.assertEqual([item['quantity'] for item in response.data['items']], [2])
+
+    def test_batch_and_patch_edit_cached_cart(self):
+        response = self.client.post(reverse('cart-batch'), {'operations': [
+            {'product_id': self.lamp.pk, 'quantity': 2},
+            {'product_id': self.desk.pk, 'quantity': 1},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['total_price'], Decimal('36.49'))
+
+        response = self.client.patch(reverse('cart-item', args=[self.lamp.pk]), {'delta': 2}, format='json')
+        self.assertEqual(response.data['item']['quantity'], 4)
+        response = self.client.post(reverse('cart-batch'), {'operations': [
+            {'op': 'remove', 'product_id': self.desk.pk},
+            {'product_id': self.lamp.pk, 'quantity': 2},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(reverse('cart'))
+        self.assertEqual({item['product']['id']: item['quantity'] for item in response.data['items']},
+                         {self.lamp.pk: 4, self.desk.pk: 1})
+        self.assertFalse(CartItem.objects.exists())
@@ -7,10 +7,16 @@ cart_list = CartViewSet.as_view({
 })
 
 cart_detail = CartViewSet.as_view({
+    'patch': 'partial_update',
     'delete': 'destroy',
 })
 
+cart_batch = CartViewSet.as_view({
+    'post': 'batch',
+})
+
 urlpatterns = [
     path('', cart_list, name='cart'),
     path('<int:pk>/', cart_detail, name='cart-item'),
+    path('batch/', cart_batch, name='cart-batch'),
 ]
@@ -1,70 +1,95 @@
+from django.db import transaction
+from django.db.models import F
 from rest_framework import viewsets, status
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
 from .models import Cart, CartItem
-from .serializers import CartItemSerializer
+from .serializers import CartAddSerializer, CartBatchSerializer, CartItemSerializer, CartQuantitySerializer
 from products.models import Product
-from .permissions import IsCartOwner
+from products.popularity import record_cart_adds
+from products.pricing import price_cart, price_lines
+from products.stock import find_shortfalls
+from .permissions import HasCart, IsCartOwner
+from .store import cache_backend_enabled, get_request_store, mark_dirty
+
+
+def apply_operations(lines, operations):
+    """Apply batch operations, in order, to a copy of a `{product_id: quantity}` map."""
+    lines = dict(lines)
+    for operation in operations:
+        product_id, quantity = operation['product_id'], operation['quantity']
+        if operation['op'] == 'add':
+            lines[product_id] = lines.get(product_id, 0) + quantity
+        elif operation['op'] == 'set' and quantity:
+            lines[product_id] = quantity
+        else:
+            lines.pop(product_id, None)
+    return lines
+
+
+def count_cart_adds(product_ids):
+    # counted once the add is committed, in the background popularity buffer
+    product_ids = list(product_ids)
+    if product_ids:
+        transaction.on_commit(lambda: record_cart_adds(product_ids))
+
 
 class CartViewSet(viewsets.ModelViewSet):
     serializer_class = CartItemSerializer
-    permission_classes = [IsAuthenticated, IsCartOwner]
+    permission_classes = [HasCart, IsCartOwner]
 
     def get_queryset(self):
         if self.request.user.is_staff or self.request.user.is_superuser:
-            return CartItem.objects.all()
+            return CartItem.objects.select_related('cart', 'product')
         cart, _ = Cart.objects.get_or_create(user=self.request.user)
-        return CartItem.objects.filter(cart=cart)
+        # lines are priced in Python by products.pricing, never by SQL arithmetic
+        return CartItem.objects.filter(cart=cart).select_related('cart', 'product')
 
     def perform_create(self, serializer):
         cart, _ = Cart.objects.get_or_create(user=self.request.user)
         serializer.save(cart=cart)
 
     def list(self, request, *args, **kwargs):
+        if cache_backend_enabled():
+            return self.cached_list(request)
         cart, _ = Cart.objects.get_or_create(user=request.user)
-        items = CartItem.objects.filter(cart=cart)
-        serializer = CartItemSerializer(items, many=True)
-
-        total_price = sum([item.product.price * item.quantity for item in items])
+        return self.cart_response(*price_cart(CartItem.objects.filter(cart=cart)))
 
-        return Response({
-            "items": serializer.data,
-            "total_price": total_price
-        })
+    def cart_response(self, items, quote):
+        return Response({"items": self.get_serializer(items, many=True).data, **quote.as_dict()})
 
     def create(self, request, *args, **kwargs):
+        serializer = CartAddSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        product_id, quantity = serializer.validated_data['product_id'], serializer.validated_data['quantity']
+        if cache_backend_enabled():
+            return self.cached_create(request, product_id, quantity)
         cart, _ = Cart.objects.get_or_create(user=request.user)
-        product_id = request.data.get("product_id")
-        quantity = int(request.data.get("quantity", 1))
 
         try:
             product = Product.objects.get(id=product_id)
         except Product.DoesNotExist:
             return Response({"message": "Product not found"}, status=status.HTTP_404_NOT_FOUND)
 
-        if product.stock < quantity:
+        cart_item = CartItem.objects.filter(cart=cart, product=product).first()
+        new_quantity = quantity + (cart_item.quantity if cart_item else 0)
+        if find_shortfalls([(product, new_quantity)]):
             return Response(
                 {"message": f"Insufficient stock for {product.name}. Available: {product.stock}"},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        cart_item, created = CartItem.objects.get_or_create(cart=cart, product=product)
-        if not created:
-            new_quantity = cart_item.quantity + quantity
-            if new_quantity > product.stock:
-                return Response(
-                    {"message": f"Insufficient stock for {product.name}. Available: {product.stock}"},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            cart_item.quantity = new_quantity
-        else:
-            cart_item.quantity = quantity
+        if cart_item is None:
+            cart_item = CartItem(cart=cart, product=product)
+        cart_item.quantity = new_quantity
         cart_item.save()
+        count_cart_adds([product.pk])
 
-        serializer = CartItemSerializer(cart_item)
+        serializer = self.get_serializer(cart_item)
         return Response({"message": "Product added to cart successfully", "item": serializer.data}, status=status.HTTP_201_CREATED)
 
     def destroy(self, request, pk=None, *args, **kwargs):
+        if cache_backend_enabled():
+            return self.cached_destroy(request, pk)
         try:
             cart, _ = Cart.objects.get_or_create(user=request.user)
         except Cart.DoesNotExist:
@@ -75,3 +100,174 @@ class CartViewSet(viewsets.ModelViewSet):
             return Response({"message": "Product removed from cart successfully"}, status=status.HTTP_200_OK)
         except CartItem.DoesNotExist:
             return Response({"message": "Product not found in cart"}, status=status.HTTP_404_NOT_FOUND)
+
+    def partial_update(self, request, pk=None, *args, **kwargs):
+        serializer = CartQuantitySerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        if cache_backend_enabled():
+            return self.cached_partial_update(request, pk, serializer.validated_data)
+        quantity, delta = serializer.validated_data.get('quantity'), serializer.validated_data.get('delta')
+
+        # one guarded UPDATE: concurrent edits of the same line add up instead of overwriting each other
+        items = CartItem.objects.filter(pk=pk, cart__user=request.user)
+        if delta is not None:
+            updated = items.filter(quantity__gte=1 - delta, product__stock__gte=F('quantity') + delta).update(
+                quantity=F('quantity') + delta)
+        else:
+            updated = items.filter(product__stock__gte=quantity).update(quantity=quantity)
+        if not updated:
+            item = items.select_related('product').first()
+            if item is None:
+                return Response({"message": "Product not found in cart"}, status=status.HTTP_404_NOT_FOUND)
+            if delta is not None and item.quantity + delta < 1:
+                return Response({"message": "Quantity must stay at least 1, remove the item instead"},
+                                status=status.HTTP_400_BAD_REQUEST)
+            return Response(
+                {"message": f"Insufficient stock for {item.product.name}. Available: {item.product.stock}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        item = items.select_related('product').get()
+        return Response({"message": "Cart updated successfully", "item": self.get_serializer(item).data})
+
+    def batch(self, request, *args, **kwargs):
+        """
+        Add, set or remove many lines at once: `{"operations": [{"op", "product_id", "quantity"}, ...]}`.
+
+        All products are fetched and stock-checked together, and nothing is
+        changed unless every operation can be applied. Returns the new cart.
+        """
+        serializer = CartBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        operations = serializer.validated_data['operations']
+        if cache_backend_enabled():
+            return self.cached_batch(request, operations)
+
+        with transaction.atomic():
+            cart, _ = Cart.objects.get_or_create(user=request.user)
+            existing = {item.product_id: item for item in CartItem.objects.filter(cart=cart).select_for_update()}
+            lines = apply_operations({product_id: item.quantity for product_id, item in existing.items()}, operations)
+            error = self.check_batch(lines, operations)
+            if error is not None:
+                return error
+
+            to_create, to_update = [], []
+            for product_id, quantity in lines.items():
+                item = existing.get(product_id)
+                if item is None:
+                    to_create.append(CartItem(cart=cart, product_id=product_id, quantity=quantity))
+                elif item.quantity != quantity:
+                    item.quantity = quantity
+                    to_update.append(item)
+            removed = [item.pk for product_id, item in existing.items() if product_id not in lines]
+
+            CartItem.objects.bulk_create(to_create)
+            if to_update:
+                CartItem.objects.bulk_update(to_update, ['quantity'])
+            if removed:
+                CartItem.objects.filter(pk__in=removed).delete()
+            count_cart_adds(operation['product_id'] for operation in operations if operation['op'] == 'add')
+
+        return self.cart_response(*price_cart(CartItem.objects.filter(cart=cart)))
+
+    def check_batch(self, lines, operations):
+        """The error response for a batch naming unknown products or more than is in stock, if any."""
+        touched = {operation['product_id'] for operation in operations if operation['product_id'] in lines}
+        products = Product.objects.in_bulk(list(touched))
+        missing = sorted(touched - set(products))
+        if missing:
+            return Response({"message": "Product not found", "product_ids": missing},
+                            status=status.HTTP_404_NOT_FOUND)
+        shortfalls = find_shortfalls((products[product_id], lines[product_id]) for product_id in sorted(touched))
+        if shortfalls:
+            return Response({"message": "Insufficient stock", "shortfalls": shortfalls},
+                            status=status.HTTP_400_BAD_REQUEST)
+        return None
+
+    # CART_BACKEND = 'cache': the live cart is a {product_id: quantity} map in
+    # the cache, lines are identified by product id, and user carts are written
+    # back to Cart/CartItem in the background (see cart.store).
+
+    def cached_items(self, lines):
+        products = Product.objects.in_bulk(list(lines))
+        items = []
+        for product_id, quantity in lines.items():
+            product = products.get(product_id)
+            if product is None:
+                continue
+            items.append(CartItem(id=product_id, product=product, quantity=quantity))
+        return items
+
+    def cached_list(self, request):
+        items = self.cached_items(get_request_store(request).get())
+        return self.cart_response(items, price_lines(items))
+
+    def cached_create(self, request, product_id, quantity):
+        store = get_request_store(request)
+        try:
+            product = Product.objects.get(id=product_id)
+        except Product.DoesNotExist:
+            return Response({"message": "Product not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        new_quantity = store.get().get(product.pk, 0) + quantity
+        if find_shortfalls([(product, new_quantity)]):
+            return Response(
+                {"message": f"Insufficient stock for {product.name}. Available: {product.stock}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        store.add(product.pk, quantity)
+        if request.user.is_authenticated:
+            mark_dirty(request.user.pk)
+        count_cart_adds([product.pk])
+
+        item, = self.cached_items({product.pk: new_quantity})
+        serializer = self.get_serializer(item)
+        return Response({"message": "Product added to cart successfully", "item": serializer.data}, status=status.HTTP_201_CREATED)
+
+    def cached_partial_update(self, request, pk, data):
+        store = get_request_store(request)
+        lines = store.get()
+        product_id = int(pk)
+        if product_id not in lines:
+            return Response({"message": "Product not found in cart"}, status=status.HTTP_404_NOT_FOUND)
+        quantity = data['quantity'] if 'quantity' in data else lines[product_id] + data['delta']
+        if quantity < 1:
+            return Response({"message": "Quantity must stay at least 1, remove the item instead"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        items = self.cached_items({product_id: quantity})
+        if not items:
+            return Response({"message": "Product not found"}, status=status.HTTP_404_NOT_FOUND)
+        item, = items
+        if find_shortfalls([(item.product, quantity)]):
+            return Response(
+                {"message": f"Insufficient stock for {item.product.name}. Available: {item.product.stock}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        lines[product_id] = quantity
+        store.set(lines)
+        if request.user.is_authenticated:
+            mark_dirty(request.user.pk)
+        return Response({"message": "Cart updated successfully", "item": self.get_serializer(item).data})
+
+    def cached_batch(self, request, operations):
+        store = get_request_store(request)
+        lines = apply_operations(store.get(), operations)
+        error = self.check_batch(lines, operations)
+        if error is not None:
+            return error
+
+        store.set(lines)
+        if request.user.is_authenticated:
+            mark_dirty(request.user.pk)
+        count_cart_adds(operation['product_id'] for operation in operations if operation['op'] == 'add')
+        items = self.cached_items(lines)
+        return self.cart_response(items, price_lines(items))
+
+    def cached_destroy(self, request, pk):
+        if not get_request_store(request).remove(int(pk)):
+            return Response({"message": "Product not found in cart"}, status=status.HTTP_404_NOT_FOUND)
+        if request.user.is_authenticated:
+            mark_dirty(request.user.pk)
+        return Response({"message": "Product removed from cart successfully"}, status=status.HTTP_200_OK)
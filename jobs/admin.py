@@ -0,0 +1,13 @@
+from django.contrib import admin
+from .models import Job
+from .queue import retry_dead_jobs
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ("id", "task", "status", "attempts", "run_at", "locked_by", "created_at")
+    list_filter = ("status", "task")
+    actions = ["retry"]
+
+    @admin.action(description="Retry selected dead jobs")
+    def retry(self, request, queryset):
+        self.message_user(request, f"{retry_dead_jobs(queryset)} job(s) queued again.")
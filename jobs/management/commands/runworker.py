@@ -0,0 +1,22 @@
+import signal
+
+from django.core.management.base import BaseCommand
+
+from jobs.worker import Worker
+
+
+class Command(BaseCommand):
+    help = "Run background jobs from the database queue."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=4)
+        parser.add_argument('--poll-interval', type=float, default=1.0, help="Seconds an idle thread waits.")
+        parser.add_argument('--once', action='store_true', help="Run the jobs that are due, then exit.")
+
+    def handle(self, *args, **options):
+        worker = Worker(threads=options['threads'], poll_interval=options['poll_interval'])
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *_: worker.stop())
+        self.stdout.write(f"Worker {worker.name} running {options['threads']} thread(s)")
+        worker.run(once=options['once'])
+        self.stdout.write(self.style.SUCCESS(f"Processed {worker.processed} job(s), {worker.failed} failed"))
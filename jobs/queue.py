@@ -0,0 +1,122 @@
+import logging
+import random
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+TASKS = {}
+
+
+class Task:
+    def __init__(self, func, name=None, max_attempts=None):
+        self.func = func
+        self.name = name or f'{func.__module__}.{func.__qualname__}'
+        self.max_attempts = max_attempts or getattr(settings, 'JOBS_MAX_ATTEMPTS', 5)
+        self.__doc__ = func.__doc__
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def enqueue(self, delay=None, run_at=None, using='default', **payload):
+        """
+        Queue a run with JSON-serializable keyword arguments.
+
+        With JOBS_EAGER the task runs right away in this thread instead, and
+        its exceptions propagate to the caller.
+        """
+        if getattr(settings, 'JOBS_EAGER', False):
+            self.func(**payload)
+            return None
+        if run_at is None:
+            run_at = timezone.now() + timedelta(seconds=delay or 0)
+        return Job.objects.using(using).create(
+            task=self.name, payload=payload, run_at=run_at, max_attempts=self.max_attempts
+        )
+
+
+def task(func=None, *, name=None, max_attempts=None):
+    """Register a function as a job, `@task` or `@task(max_attempts=10)`."""
+    def register(func):
+        job_task = Task(func, name=name, max_attempts=max_attempts)
+        TASKS[job_task.name] = job_task
+        return job_task
+    return register(func) if func is not None else register
+
+
+def claim_jobs(worker_id, limit=1, using='default'):
+    """
+    Take up to `limit` due jobs for `worker_id`.
+
+    Uses SELECT ... FOR UPDATE SKIP LOCKED where the database has it. SQLite
+    has no row locks, so there every candidate is raced for with a
+    conditional UPDATE and only the worker whose update hit the row runs it.
+    """
+    now = timezone.now()
+    due = Job.objects.using(using).filter(status='queued', run_at__lte=now).order_by('run_at', 'id')
+    claim = {'status': 'running', 'locked_by': worker_id, 'locked_at': now, 'attempts': F('attempts') + 1}
+
+    if connections[using].features.has_select_for_update_skip_locked:
+        with transaction.atomic(using=using):
+            ids = list(due.select_for_update(skip_locked=True).values_list('id', flat=True)[:limit])
+            Job.objects.using(using).filter(pk__in=ids).update(**claim)
+    else:
+        ids = []
+        for pk in due.values_list('id', flat=True)[:limit * 4]:
+            if Job.objects.using(using).filter(pk=pk, status='queued').update(**claim):
+                ids.append(pk)
+                if len(ids) == limit:
+                    break
+    return list(Job.objects.using(using).filter(pk__in=ids).order_by('run_at', 'id'))
+
+
+def retry_delay(attempts):
+    base = getattr(settings, 'JOBS_RETRY_BACKOFF', 5)
+    cap = getattr(settings, 'JOBS_RETRY_MAX_DELAY', 3600)
+    # exponential with jitter, so a burst of failures doesn't retry in lockstep
+    return min(cap, base * 2 ** (attempts - 1)) * random.uniform(0.5, 1.5)
+
+
+def run_job(job, using='default'):
+    """Run a claimed job; on failure schedule a retry or dead-letter it."""
+    mine = Job.objects.using(using).filter(pk=job.pk, status='running', locked_by=job.locked_by)
+    job_task = TASKS.get(job.task)
+    try:
+        if job_task is None:
+            raise LookupError(f'Unknown task {job.task!r}')
+        job_task.func(**job.payload)
+    except Exception:
+        error = traceback.format_exc()
+        if job.attempts >= job.max_attempts:
+            logger.error('Job %s (%s) failed for good after %d attempts', job.pk, job.task, job.attempts)
+            mine.update(status='dead', last_error=error, locked_by='', locked_at=None)
+        else:
+            delay = retry_delay(job.attempts)
+            logger.warning('Job %s (%s) failed, retrying in %.0fs', job.pk, job.task, delay)
+            mine.update(status='queued', last_error=error, locked_by='', locked_at=None,
+                        run_at=timezone.now() + timedelta(seconds=delay))
+        return False
+    mine.delete()
+    return True
+
+
+def requeue_stale_jobs(using='default'):
+    """Give jobs of workers that died mid-run back to the queue (or the dead letters)."""
+    lease = getattr(settings, 'JOBS_LEASE_TIMEOUT', 300)
+    stale = Job.objects.using(using).filter(status='running', locked_at__lt=timezone.now() - timedelta(seconds=lease))
+    dead = stale.filter(attempts__gte=F('max_attempts')).update(
+        status='dead', last_error='Worker lease expired', locked_by='', locked_at=None
+    )
+    requeued = stale.update(status='queued', locked_by='', locked_at=None)
+    return requeued, dead
+
+
+def retry_dead_jobs(queryset):
+    return queryset.filter(status='dead').update(status='queued', attempts=0, run_at=timezone.now(), last_error='')
@@ -0,0 +1,77 @@
+from datetime import timedelta
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from .models import Job
+from .queue import claim_jobs, requeue_stale_jobs, run_job, task
+from .worker import Worker
+
+calls = []
+
+
+@task(name='jobs.tests.record', max_attempts=2)
+def record(value):
+    calls.append(value)
+
+
+@task(name='jobs.tests.explode', max_attempts=2)
+def explode():
+    raise ValueError('boom')
+
+
+class JobQueueTests(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    def test_jobs_run_once_in_due_order(self):
+        record.enqueue(value='later', delay=3600)
+        record.enqueue(value='first')
+        record.enqueue(value='second')
+
+        first, = claim_jobs('w1')
+        second, = claim_jobs('w2')
+        self.assertEqual(claim_jobs('w3'), [])  # the delayed one isn't due
+        self.assertEqual((first.attempts, first.locked_by), (1, 'w1'))
+        run_job(first)
+        run_job(second)
+
+        self.assertEqual(calls, ['first', 'second'])
+        self.assertEqual(list(Job.objects.values_list('payload', flat=True)), [{'value': 'later'}])
+
+    def test_failures_back_off_then_dead_letter(self):
+        explode.enqueue()
+        with self.assertLogs('jobs.queue', 'WARNING'):
+            run_job(claim_jobs('w')[0])
+        job = Job.objects.get()
+        self.assertEqual(job.status, 'queued')
+        self.assertGreater(job.run_at, timezone.now())
+        self.assertIn('ValueError: boom', job.last_error)
+
+        Job.objects.update(run_at=timezone.now())
+        with self.assertLogs('jobs.queue', 'ERROR'):
+            run_job(claim_jobs('w')[0])
+        self.assertEqual(Job.objects.get().status, 'dead')
+        self.assertEqual(claim_jobs('w'), [])
+
+    def test_stale_running_jobs_are_requeued(self):
+        record.enqueue(value='x')
+        claim_jobs('gone')
+        Job.objects.update(locked_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(requeue_stale_jobs(), (1, 0))
+        self.assertEqual(len(claim_jobs('w')), 1)
+
+    def test_worker_drains_queue(self):
+        for n in range(10):
+            record.enqueue(value=n)
+        worker = Worker(threads=1)
+        worker.loop('test/0', once=True)
+        self.assertEqual(sorted(calls), list(range(10)))
+        self.assertEqual((worker.processed, worker.failed), (10, 0))
+        self.assertFalse(Job.objects.exists())
+
+    @override_settings(JOBS_EAGER=True)
+    def test_eager_mode_runs_inline(self):
+        self.assertIsNone(record.enqueue(value='now'))
+        self.assertEqual(calls, ['now'])
+        self.assertFalse(Job.objects.exists())
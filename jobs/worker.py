@@ -0,0 +1,61 @@
+import logging
+import os
+import socket
+import threading
+
+from django.db import connection
+
+from .queue import claim_jobs, requeue_stale_jobs, run_job
+
+logger = logging.getLogger(__name__)
+
+
+class Worker:
+    """
+    `threads` threads each claiming and running one job at a time.
+
+    Idle threads poll every `poll_interval` seconds. `stop()` lets running
+    jobs finish; `run(once=True)` drains the due jobs and returns.
+    """
+
+    def __init__(self, threads=4, poll_interval=1.0, name=None):
+        self.threads = threads
+        self.poll_interval = poll_interval
+        self.name = name or f'{socket.gethostname()}:{os.getpid()}'
+        self.stopped = threading.Event()
+        self.processed = 0
+        self.failed = 0
+        self.lock = threading.Lock()
+
+    def stop(self):
+        self.stopped.set()
+
+    def run(self, once=False):
+        requeue_stale_jobs()
+        workers = [
+            threading.Thread(target=self.loop, args=(f'{self.name}/{n}', once), name=f'job-worker-{n}')
+            for n in range(self.threads)
+        ]
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+
+    def loop(self, worker_id, once):
+        try:
+            while not self.stopped.is_set():
+                jobs = claim_jobs(worker_id)
+                if not jobs:
+                    if once:
+                        return
+                    self.stopped.wait(self.poll_interval)
+                    if worker_id.endswith('/0'):
+                        requeue_stale_jobs()
+                    continue
+                for job in jobs:
+                    ok = run_job(job)
+                    with self.lock:
+                        self.processed += 1
+                        self.failed += not ok
+        finally:
+            connection.close()
@@ -0,0 +1,108 @@
+import json
+import subprocess
+import threading
+from contextlib import contextmanager, nullcontext
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from Onlineshop.benchmarks import isolated_database
+from jobs.worker import Worker
+from loadtest.runner import run_load, serve
+from loadtest.seed import SKU_PREFIX, USERNAME_PREFIX, seed_shop
+from orders.fakegateway import FakeZarinpal
+from orders.gateway import reset_gateway
+from products.models import Product
+
+
+class Command(BaseCommand):
+    help = ("Replay shopping journeys (browse, add to cart, view cart, checkout, callback, order history) "
+            "from concurrent clients and report throughput and p50/p95/p99 per scenario as JSON. "
+            "By default seeds a throwaway database and serves it locally with a fake gateway; "
+            "with --url it targets a running server that uses this database, filled by seedshop.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', help="Base url of a running server, e.g. http://127.0.0.1:8000. Start it "
+                                          "with ZARINPAL_BASE_URL pointing at --gateway-port and a runworker.")
+        parser.add_argument('--gateway-port', type=int,
+                            help="With --url, serve a fake gateway on this port for the run.")
+        parser.add_argument('--clients', type=int, default=8, help="Concurrent clients.")
+        parser.add_argument('--journeys', type=int, default=10, help="Journeys per client.")
+        parser.add_argument('--duration', type=float, help="Run for this many seconds instead of --journeys.")
+        parser.add_argument('--checkout-ratio', type=float, default=0.5, help="Share of journeys that check out.")
+        parser.add_argument('--users', type=int, default=200, help="Accounts the clients act for.")
+        parser.add_argument('--products', type=int, default=500, help="Catalog size of the seeded database.")
+        parser.add_argument('--latency', type=float, default=0.05, help="Seconds the fake gateway takes per call.")
+        parser.add_argument('--workers', type=int, default=2, help="Job worker threads of the local server.")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help="Also write the report to this file.")
+
+    def handle(self, *args, **options):
+        if options['url']:
+            report = self.run_remote(options)
+        else:
+            report = self.run_local(options)
+        report = {'config': self.config(options), **report}
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+        self.stdout.write(output)
+
+    def run_local(self, options):
+        with isolated_database(on_disk=True), FakeZarinpal(latency=options['latency']) as gateway:
+            with override_settings(DEBUG=False, ALLOWED_HOSTS=['127.0.0.1'], QUERY_BUDGET_ENABLED=False,
+                                   ZARINPAL_PAYMENT_REQUEST_URL=gateway.request_url,
+                                   ZARINPAL_PAYMENT_VERIFICATION_URL=gateway.verify_url,
+                                   ZARINPAL_STARTPAY_URL=gateway.startpay_url):
+                reset_gateway()
+                seed_shop(users=options['users'], products=options['products'], seed=options['seed'])
+                try:
+                    with serve() as base_url, self.job_worker(options['workers']):
+                        return self.load(base_url, options)
+                finally:
+                    reset_gateway()
+
+    def run_remote(self, options):
+        gateway = nullcontext()
+        if options['gateway_port']:
+            gateway = FakeZarinpal(port=options['gateway_port'], latency=options['latency'])
+        with gateway:
+            return self.load(options['url'], options)
+
+    def load(self, base_url, options):
+        users = list(get_user_model().objects.filter(username__startswith=USERNAME_PREFIX, user_info__isnull=False)
+                     .order_by('id')[:options['users']])
+        product_ids = list(Product.objects.filter(sku__startswith=SKU_PREFIX, stock__gt=0)
+                           .order_by('id').values_list('id', flat=True))
+        if not users or not product_ids:
+            raise CommandError("No seeded users or products, run `manage.py seedshop` first.")
+        tokens = [f'Bearer {RefreshToken.for_user(user).access_token}' for user in users]
+        return run_load(base_url, tokens, product_ids, clients=options['clients'], journeys=options['journeys'],
+                        duration=options['duration'], checkout_ratio=options['checkout_ratio'], seed=options['seed'])
+
+    @contextmanager
+    def job_worker(self, threads):
+        worker = Worker(threads=threads, poll_interval=0.1, name='benchshop')
+        thread = threading.Thread(target=worker.run, name='benchshop-worker', daemon=True)
+        if threads:
+            thread.start()
+        try:
+            yield worker
+        finally:
+            worker.stop()
+            if threads:
+                thread.join()
+
+    def config(self, options):
+        try:
+            revision = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                      text=True, timeout=5).stdout.strip() or None
+        except OSError:
+            revision = None
+        keys = ('url', 'clients', 'journeys', 'duration', 'checkout_ratio', 'users', 'products', 'latency',
+                'workers', 'seed')
+        return dict({key: options[key] for key in keys}, started_at=timezone.now().isoformat(), revision=revision)
@@ -0,0 +1,92 @@
+import json
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+from django.urls import resolve, reverse
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from Onlineshop.benchmarks import isolated_database, measure
+from Onlineshop.throttling import ALGORITHMS, reset_limiters
+from users.views import protected_view
+
+
+class CountingCache:
+    """Wraps a cache to count round trips."""
+
+    def __init__(self, cache):
+        self.wrapped = cache
+        self.calls = 0
+
+    def __getattr__(self, name):
+        method = getattr(self.wrapped, name)
+
+        def counted(*args, **kwargs):
+            self.calls += 1
+            return method(*args, **kwargs)
+        return counted
+
+
+class Command(BaseCommand):
+    help = ("Measure rate limiter overhead per request: each algorithm's cost and cache round trips for "
+            "clients under their limit and over it, and a throttled DRF view against an unthrottled one. "
+            "Reports JSON.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cache-alias', default='default', help="CACHES alias to count in, e.g. a Redis one.")
+        parser.add_argument('--requests', type=int, default=20000, help="Limiter calls per scenario.")
+        parser.add_argument('--clients', type=int, default=200,
+                            help="Distinct clients under their limit; keep it under the cache's MAX_ENTRIES.")
+        parser.add_argument('--repeat', type=int, default=2000, help="View calls per variant.")
+
+    def handle(self, *args, **options):
+        report = {'limiters': {}, 'view': {}}
+        for algorithm, limiter_class in ALGORITHMS.items():
+            report['limiters'][algorithm] = {
+                'under_limit': self.bench_limiter(limiter_class, options, over=False),
+                'over_limit': self.bench_limiter(limiter_class, options, over=True),
+            }
+        with isolated_database():
+            report['view'] = self.bench_view(options)
+        self.stdout.write(json.dumps(report, indent=2))
+
+    def bench_limiter(self, limiter_class, options, over):
+        caches[options['cache_alias']].clear()
+        counting = CountingCache(caches[options['cache_alias']])
+        limiter_class = type(f'Counting{limiter_class.__name__}', (limiter_class,), {'cache': counting})
+        limiter = limiter_class(5 if over else 10 ** 9, 60, alias=options['cache_alias'])
+        keys = ['bench:hot'] if over else [f'bench:{n}' for n in range(options['clients'])]
+        for key in keys:
+            limiter.hit(key)  # first sight of a client isn't the steady state
+        counting.calls = 0
+        start = time.perf_counter()
+        for n in range(options['requests']):
+            limiter.hit(keys[n % len(keys)])
+        elapsed = time.perf_counter() - start
+        return {
+            'us_per_request': round(elapsed / options['requests'] * 1e6, 2),
+            'cache_calls_per_request': round(counting.calls / options['requests'], 3),
+        }
+
+    def bench_view(self, options):
+        user = get_user_model().objects.create_user(username='bench', email='bench@example.com')
+        factory = APIRequestFactory()
+        match = resolve(reverse('protected'))
+
+        def call():
+            request = factory.get(reverse('protected'))
+            request.resolver_match = match
+            force_authenticate(request, user)
+            protected_view(request)
+
+        result = {}
+        variants = {'unthrottled': {}}
+        for algorithm in ALGORITHMS:
+            variants[algorithm] = {'protected': {'algorithm': algorithm, 'rate': f'{10 ** 9}/m'}}
+        for label, throttles in variants.items():
+            reset_limiters()
+            with override_settings(THROTTLE_ENABLED=True, THROTTLES=throttles):
+                result[label] = measure(call, repeat=options['repeat'], warmup=50)
+        return result
@@ -0,0 +1,27 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+
+from loadtest.seed import seed_shop
+
+
+class Command(BaseCommand):
+    help = ("Fill the database with users, products, carts and order histories for load tests. "
+            "The same --seed gives the same data; running it again adds more.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--products', type=int, default=500)
+        parser.add_argument('--carts', type=float, default=0.3, help="Share of users with a filled cart.")
+        parser.add_argument('--orders-per-user', type=float, default=3, help="Average past orders per user.")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        created = seed_shop(users=options['users'], products=options['products'], carts=options['carts'],
+                            orders_per_user=options['orders_per_user'], seed=options['seed'],
+                            batch_size=options['batch_size'])
+        created['seconds'] = round(time.perf_counter() - start, 1)
+        self.stdout.write(json.dumps(created))
@@ -0,0 +1,163 @@
+import random
+import statistics
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from urllib.parse import urljoin
+
+import requests
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.servers.basehttp import ThreadedWSGIServer, WSGIRequestHandler
+from django.urls import reverse
+
+from Onlineshop.benchmarks import percentile
+from .seed import WORDS
+
+SCENARIOS = ('browse', 'add_to_cart', 'view_cart', 'checkout', 'callback', 'order_history')
+
+
+class Recorder:
+    """Latencies and statuses per scenario, shared by all client threads."""
+
+    def __init__(self, scenarios=SCENARIOS):
+        self.scenarios = scenarios
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+
+    def record(self, scenario, status, seconds):
+        with self.lock:
+            self.latencies[scenario].append(seconds * 1000)
+            self.statuses[scenario][status] += 1
+
+    def report(self, wall):
+        endpoints = {}
+        for scenario in self.scenarios:
+            samples = sorted(self.latencies[scenario])
+            if not samples:
+                continue
+            statuses = self.statuses[scenario]
+            endpoints[scenario] = {
+                'requests': len(samples),
+                'errors': sum(n for status, n in statuses.items() if status == 'error' or status >= 500),
+                'statuses': {str(status): n for status, n in sorted(statuses.items(), key=str)},
+                'throughput_rps': round(len(samples) / wall, 1),
+                'p50_ms': round(statistics.median(samples), 1),
+                'p95_ms': round(percentile(samples, 95), 1),
+                'p99_ms': round(percentile(samples, 99), 1),
+                'max_ms': round(samples[-1], 1),
+            }
+        total = sum(endpoint['requests'] for endpoint in endpoints.values())
+        return {
+            'wall_s': round(wall, 3),
+            'requests': total,
+            'errors': sum(endpoint['errors'] for endpoint in endpoints.values()),
+            'throughput_rps': round(total / wall, 1),
+            'endpoints': endpoints,
+        }
+
+
+class Shopper:
+    """
+    One concurrent client replaying shopping journeys for its accounts.
+
+    A journey browses the catalog, adds a few products to the cart, views
+    it, checks out and comes back through the gateway callback in
+    `checkout_ratio` of the journeys, and ends on the order history.
+    """
+
+    def __init__(self, base_url, tokens, product_ids, recorder, rng, checkout_ratio=0.5, timeout=60):
+        self.base_url = base_url
+        self.tokens = tokens
+        self.product_ids = product_ids
+        self.recorder = recorder
+        self.rng = rng
+        self.checkout_ratio = checkout_ratio
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def call(self, scenario, method, url, token, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = self.session.request(method, urljoin(self.base_url, url), timeout=self.timeout,
+                                            headers={'Authorization': token}, **kwargs)
+        except requests.RequestException:
+            self.recorder.record(scenario, 'error', time.perf_counter() - start)
+            return None
+        self.recorder.record(scenario, response.status_code, time.perf_counter() - start)
+        return response
+
+    def journey(self, token):
+        rng = self.rng
+        params = {'page_size': 20, 'ordering': rng.choice(('-created_at', 'price', '-price'))}
+        if rng.random() < 0.25:
+            params['search'] = rng.choice(WORDS)
+        response = self.call('browse', 'GET', reverse('product-list'), token, params=params)
+        if response is not None and response.ok and rng.random() < 0.5 and response.json().get('next'):
+            self.call('browse', 'GET', response.json()['next'], token)
+
+        for product_id in rng.sample(self.product_ids, rng.randint(1, 3)):
+            self.call('add_to_cart', 'POST', reverse('cart'), token, json={'product_id': product_id, 'quantity': 1})
+        self.call('view_cart', 'GET', reverse('cart'), token)
+
+        if rng.random() < self.checkout_ratio:
+            response = self.call('checkout', 'POST', reverse('checkout'), token)
+            if response is not None and response.status_code == 200:
+                authority = response.json()['payment_url'].rsplit('/', 1)[-1]
+                self.call('callback', 'GET', reverse('payment-callback'), token,
+                          params={'Status': 'OK', 'Authority': authority})
+
+        self.call('order_history', 'GET', reverse('order-list'), token, params={'page_size': 10})
+
+    def run(self, journeys=None, deadline=None):
+        done = 0
+        while (journeys is None or done < journeys) and (deadline is None or time.monotonic() < deadline):
+            self.journey(self.tokens[done % len(self.tokens)])
+            done += 1
+        self.session.close()
+        return done
+
+
+def run_load(base_url, tokens, product_ids, clients=8, journeys=10, duration=None, checkout_ratio=0.5, seed=0):
+    """
+    Replay journeys from `clients` threads, each with its own share of the
+    accounts (`tokens`, "Bearer ..." headers), so no two clients act for the
+    same user at once. Runs `journeys` per client, or for `duration` seconds.
+    """
+    recorder = Recorder()
+    shoppers = [
+        Shopper(base_url, tokens[n::clients], product_ids, recorder, random.Random(seed * 1000 + n), checkout_ratio)
+        for n in range(min(clients, len(tokens)))
+    ]
+    deadline = time.monotonic() + duration if duration else None
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(shoppers)) as pool:
+        done = sum(pool.map(lambda shopper: shopper.run(None if duration else journeys, deadline), shoppers))
+    report = recorder.report(time.perf_counter() - start)
+    report['journeys'] = done
+    return report
+
+
+class _QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class _Server(ThreadedWSGIServer):
+    request_queue_size = 1024
+
+
+@contextmanager
+def serve(host='127.0.0.1', port=0):
+    """Serve the project on a local threaded WSGI server; yields its base url."""
+    server = _Server((host, port), _QuietHandler, allow_reuse_address=False)
+    server.set_app(WSGIHandler())
+    thread = threading.Thread(target=server.serve_forever, name='benchshop-server', daemon=True)
+    thread.start()
+    try:
+        yield f'http://{host}:{server.server_address[1]}'
+    finally:
+        server.shutdown()
+        server.server_close()
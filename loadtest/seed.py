@@ -0,0 +1,133 @@
+import random
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.utils import timezone
+
+from cart.models import Cart, CartItem
+from orders.models import Order, OrderItem
+from products.catalog import bump_catalog_version
+from products.models import Product
+from products.pricing import line_total
+from products.search import get_search_backend
+from reports.rollups import rebuild_rollups
+from users.models import UserInfo
+
+USERNAME_PREFIX = 'shopper'
+SKU_PREFIX = 'SEED-'
+
+WORDS = (
+    'cotton', 'leather', 'steel', 'wireless', 'organic', 'classic', 'compact', 'premium', 'vintage', 'smart',
+    'shirt', 'lamp', 'kettle', 'backpack', 'speaker', 'jacket', 'blender', 'notebook', 'watch', 'mug',
+)
+CITIES = ('Tehran', 'Mashhad', 'Isfahan', 'Shiraz', 'Tabriz', 'Karaj', 'Qom', 'Ahvaz')
+ORDER_STATUSES = (('completed', 70), ('shipped', 20), ('pending', 10))
+
+
+def seed_products(count, rng, batch_size=2000, using='default'):
+    start = Product.objects.using(using).filter(sku__startswith=SKU_PREFIX).count()
+    for offset in range(0, count, batch_size):
+        Product.objects.using(using).bulk_create([
+            Product(
+                sku=f'{SKU_PREFIX}{start + n:07d}',
+                name=' '.join(rng.sample(WORDS, 2)).title() + f' {start + n}',
+                description=' '.join(rng.sample(WORDS, 6)),
+                price=Decimal(rng.randint(10, 5000) * 1000),
+                discount=Decimal(rng.choice((0, 0, 0, 5, 10, 25))),
+                # a few sold-out items, the rest with plenty in stock
+                stock=0 if rng.random() < 0.05 else rng.randint(10_000, 100_000),
+            )
+            for n in range(offset, min(offset + batch_size, count))
+        ])
+
+
+def seed_users(count, rng, products, carts=0.3, orders_per_user=3, days=365, batch_size=2000, using='default'):
+    """
+    Users with profiles, a share (`carts`) with a filled cart, and order
+    histories of about `orders_per_user` orders spread over `days` days.
+    """
+    User = get_user_model()
+    password = make_password(None)  # nobody logs in, benchshop mints tokens
+    start = User.objects.using(using).filter(username__startswith=USERNAME_PREFIX).count()
+    in_stock = [product for product in products if product.stock]
+    statuses, weights = zip(*ORDER_STATUSES)
+    now = timezone.now()
+    totals = {'users': 0, 'carts': 0, 'orders': 0}
+
+    for offset in range(0, count, batch_size):
+        names = [f'{USERNAME_PREFIX}{start + n:07d}' for n in range(offset, min(offset + batch_size, count))]
+        with transaction.atomic(using=using):
+            users = User.objects.using(using).bulk_create(
+                User(username=name, email=f'{name}@example.com', password=password) for name in names
+            )
+            UserInfo.objects.using(using).bulk_create(
+                UserInfo(user=user, full_name=user.username.title(), phone=f'0912{rng.randint(0, 9_999_999):07d}',
+                         address=f'{rng.randint(1, 200)} {rng.choice(WORDS).title()} St.',
+                         city=rng.choice(CITIES), postal_code=f'{rng.randint(0, 10 ** 10 - 1):010d}')
+                for user in users
+            )
+
+            cart_users = [user for user in users if rng.random() < carts]
+            cart_rows = Cart.objects.using(using).bulk_create(Cart(user=user) for user in cart_users)
+            CartItem.objects.using(using).bulk_create(
+                CartItem(cart=cart, product=product, quantity=rng.randint(1, 3))
+                for cart in cart_rows
+                for product in rng.sample(in_stock, min(len(in_stock), rng.randint(1, 5)))
+            )
+
+            orders, dates, lines = [], [], []
+            for user in users:
+                placed = min(int(rng.expovariate(1 / orders_per_user)), 50) if orders_per_user else 0
+                for _ in range(placed):
+                    picked = rng.sample(products, min(len(products), rng.randint(1, 4)))
+                    order_lines = [(product, rng.randint(1, 3)) for product in picked]
+                    line_totals = [line_total(product.price, product.discount, quantity)
+                                   for product, quantity in order_lines]
+                    status = rng.choices(statuses, weights)[0]
+                    created_at = now - timedelta(seconds=rng.randint(0, days * 86400))
+                    dates.append(created_at)
+                    orders.append(Order(
+                        user=user, status=status,
+                        completed_at=created_at + timedelta(minutes=rng.randint(1, 30)) if status != 'pending' else None,
+                        total_price=sum(line_totals, Decimal('0.00')),
+                    ))
+                    lines.append(list(zip(order_lines, line_totals)))
+            orders = Order.objects.using(using).bulk_create(orders)
+            # created_at is auto_now_add, so back-date the orders afterwards
+            for order, created_at in zip(orders, dates):
+                order.created_at = created_at
+            Order.objects.using(using).bulk_update(orders, ['created_at'], batch_size=batch_size)
+            OrderItem.objects.using(using).bulk_create(
+                OrderItem(order=order, product=product, quantity=quantity, price=product.price,
+                          discount=product.discount, line_total=total)
+                for order, order_lines in zip(orders, lines)
+                for (product, quantity), total in order_lines
+            )
+        totals['users'] += len(users)
+        totals['carts'] += len(cart_rows)
+        totals['orders'] += len(orders)
+    return totals
+
+
+def seed_shop(users=1000, products=500, carts=0.3, orders_per_user=3, seed=0, batch_size=2000, using='default'):
+    """
+    Fill the database with a shop's worth of data for load tests.
+
+    The same arguments give the same data. Bulk inserts skip signals, so the
+    search index, catalog version and report rollups are rebuilt at the end.
+    Returns the number of rows created per kind.
+    """
+    rng = random.Random(seed)
+    seed_products(products, rng, batch_size=batch_size, using=using)
+    catalog = list(Product.objects.using(using).filter(sku__startswith=SKU_PREFIX).order_by('id'))
+    totals = seed_users(users, rng, catalog, carts=carts, orders_per_user=orders_per_user,
+                        batch_size=batch_size, using=using)
+
+    get_search_backend(using).rebuild()
+    with transaction.atomic(using=using):
+        bump_catalog_version(using=using)
+    rebuild_rollups(using=using)
+    return dict(products=products, **totals)
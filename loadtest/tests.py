@@ -0,0 +1,64 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import LiveServerTestCase, TestCase, override_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from cart.models import Cart
+from orders.fakegateway import FakeZarinpal
+from orders.gateway import ZarinpalClient
+from orders.models import Order
+from products.models import Product
+from products.search import get_search_backend
+from reports.models import OrderStatusCount
+from users.models import UserInfo
+from .runner import SCENARIOS, run_load
+from .seed import seed_shop
+
+
+class SeedShopTests(TestCase):
+    def test_seeds_consistent_shop(self):
+        created = seed_shop(users=60, products=40, carts=0.5, orders_per_user=2, seed=7, batch_size=25)
+        User = get_user_model()
+
+        self.assertEqual(created['users'], 60)
+        self.assertEqual(UserInfo.objects.count(), User.objects.count())
+        self.assertEqual(Product.objects.count(), 40)
+        self.assertEqual(Cart.objects.count(), created['carts'])
+        self.assertTrue(10 < created['carts'] < 50)
+        self.assertEqual(Order.objects.count(), created['orders'])
+        self.assertFalse(Order.objects.filter(items__isnull=True).exists())
+        # histories spread over the past year instead of all at seeding time
+        self.assertGreater(Order.objects.dates('created_at', 'day').count(), 20)
+        self.assertEqual(dict(OrderStatusCount.objects.values_list('status', 'count')).get('completed', 0),
+                         Order.objects.filter(status='completed').count())
+        self.assertTrue(get_search_backend().search(Product.objects.first().name.split()[0], 10))
+
+        # running it again adds to the data instead of colliding with it
+        seed_shop(users=5, products=5, orders_per_user=0, seed=7)
+        self.assertEqual(User.objects.count(), 65)
+        self.assertEqual(Product.objects.count(), 45)
+
+
+# no background popularity flushes into the test database
+@override_settings(JOBS_EAGER=True, POPULARITY_FLUSH_INTERVAL=None)
+class LoadRunnerTests(LiveServerTestCase):
+    def test_journeys_cover_every_scenario(self):
+        seed_shop(users=3, products=10, orders_per_user=1)
+        tokens = [f'Bearer {RefreshToken.for_user(user).access_token}' for user in get_user_model().objects.all()]
+        product_ids = list(Product.objects.filter(stock__gt=0).values_list('id', flat=True))
+        completed = Order.objects.filter(status='completed').count()
+
+        with FakeZarinpal() as gateway:
+            client = ZarinpalClient(merchant_id='test', request_url=gateway.request_url, verify_url=gateway.verify_url)
+            with mock.patch('orders.gateway._client', client):
+                report = run_load(self.live_server_url, tokens, product_ids, clients=1, journeys=4, checkout_ratio=1)
+
+        self.assertEqual(report['journeys'], 4)
+        self.assertEqual(report['errors'], 0)
+        self.assertEqual(set(report['endpoints']), set(SCENARIOS))
+        self.assertEqual(report['endpoints']['callback']['statuses'], {'200': 4})
+        for endpoint in report['endpoints'].values():
+            self.assertLessEqual(endpoint['p50_ms'], endpoint['p95_ms'])
+            self.assertLessEqual(endpoint['p95_ms'], endpoint['p99_ms'])
+        self.assertEqual(Order.objects.filter(status='completed').count(), completed + 4)
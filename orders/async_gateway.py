@@ -0,0 +1,86 @@
+import asyncio
+
+import httpx
+from django.conf import settings
+
+from Onlineshop.metrics import timed
+from .gateway import GatewayUnavailable, ZarinpalClient, get_gateway
+
+
+class AsyncZarinpalClient(ZarinpalClient):
+    """
+    ZarinpalClient for async views, on an httpx.AsyncClient connection pool.
+
+    Same timeouts, retry rules and payloads; a call waiting on the gateway
+    holds no thread, so the pool is sized for hundreds of calls in flight.
+    """
+
+    def create_session(self, pool_size):
+        connect, read = self.timeout
+        return httpx.AsyncClient(
+            timeout=httpx.Timeout(read, connect=connect),
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+        )
+
+    async def request_payment(self, *args, **kwargs):
+        return await self._call(self.request_url, self.payment_payload(*args, **kwargs),
+                                retry_on=(httpx.ConnectTimeout, httpx.ConnectError), retry_statuses=())
+
+    async def verify_payment(self, amount, authority):
+        return await self._call(self.verify_url, self.verification_payload(amount, authority),
+                                retry_on=(httpx.TransportError,), retry_statuses=self.transient_statuses)
+
+    async def _call(self, url, payload, retry_on, retry_statuses):
+        if not self.breaker.allow():
+            raise GatewayUnavailable('Payment gateway is temporarily unavailable')
+
+        for attempt in range(self.retries + 1):
+            last = attempt == self.retries
+            try:
+                with timed('zarinpal'):
+                    response = await self.session.post(url, json=payload)
+            except retry_on as e:
+                if last:
+                    return self._fail(e)
+                await asyncio.sleep(self.retry_delay(attempt))
+                continue
+            except httpx.HTTPError as e:
+                return self._fail(e)
+
+            if response.status_code in self.transient_statuses:
+                if response.status_code in retry_statuses and not last:
+                    await asyncio.sleep(self.retry_delay(attempt))
+                    continue
+                return self._fail(f'HTTP {response.status_code}')
+            try:
+                data = response.json()
+            except ValueError as e:
+                return self._fail(e)
+            self.breaker.record_success()
+            return data
+
+    async def aclose(self):
+        await self.session.aclose()
+
+
+_clients = {}
+
+
+def get_async_gateway():
+    """
+    The client for the running event loop.
+
+    httpx pools are tied to the loop they were opened on; an ASGI server runs
+    one loop per process, so in practice this is one client per process. It
+    shares the sync client's circuit breaker, both see the same gateway.
+    """
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        for stale in [other for other in _clients if other.is_closed()]:
+            del _clients[stale]
+        client = _clients[loop] = AsyncZarinpalClient(
+            breaker=get_gateway().breaker,
+            pool_size=getattr(settings, 'ZARINPAL_ASYNC_POOL_SIZE', 200),
+        )
+    return client
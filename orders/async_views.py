@@ -0,0 +1,114 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+
+from products.pricing import whole_amount
+from . import views as sync_views
+from .async_gateway import get_async_gateway
+from .checkout import CheckoutError, payment_request, prepare_checkout, start_payment
+from .gateway import GatewayError, GatewayUnavailable, get_gateway
+from .payments import (ClaimLost, apply_verification, claim_callback, fulfil_order, process_payment_callback,
+                       release_session)
+from .views import GATEWAY_UNAVAILABLE
+
+# Async twins of views.checkout / views.payment_callback for ASGI deployments.
+# The gateway round-trip is awaited on the event loop instead of holding a
+# thread; database work, which needs transactions, runs in sync_to_async
+# blocks between the awaits.
+
+
+def respond(body, status=200):
+    return JsonResponse(body, status=status, encoder=DjangoJSONEncoder, safe=False)
+
+
+def check_request(view, request):
+    """
+    Authenticate, check permissions and throttle `request` with the sync DRF
+    `view`'s own classes, so both twins answer 401/403/429 alike.
+
+    Returns `(user, None)`, or `(None, response)` with the rendered refusal.
+    DRF sets `request.user` on the Django request too, which
+    DatabaseRoutingMiddleware needs to pin users that wrote.
+    """
+    api = view.cls(**view.initkwargs)
+    drf_request = api.initialize_request(request)
+    api.request, api.args, api.kwargs = drf_request, (), {}
+    api.headers = api.default_response_headers
+    try:
+        api.initial(drf_request)
+    except Exception as exc:
+        return None, api.finalize_response(drf_request, api.handle_exception(exc)).render()
+    return drf_request.user, None
+
+
+@csrf_exempt
+@require_POST
+async def checkout(request):
+    user, refused = await sync_to_async(check_request)(sync_views.checkout, request)
+    if refused is not None:
+        return refused
+    if not get_gateway().available:
+        return respond(GATEWAY_UNAVAILABLE, status=503)
+
+    try:
+        order, cart_id = await sync_to_async(prepare_checkout)(user)
+    except CheckoutError as e:
+        return respond(e.body, status=e.status)
+
+    try:
+        res_data = await get_async_gateway().request_payment(**payment_request(user, order))
+    except GatewayUnavailable:
+        return respond(GATEWAY_UNAVAILABLE, status=503)
+    except GatewayError:
+        res_data = {}
+
+    body, status = await sync_to_async(start_payment)(user, order, cart_id, res_data)
+    return respond(body, status=status)
+
+
+@require_GET
+async def payment_callback(request):
+    """
+    Hands verification to the job queue like the sync callback. Only with
+    JOBS_EAGER, where the sync view verifies inline on its thread, does this
+    one verify inline too, awaiting the gateway on the event loop instead.
+    """
+    _, refused = await sync_to_async(check_request)(sync_views.payment_callback, request)
+    if refused is not None:
+        return refused
+    authority = request.GET.get('Authority')
+    if request.GET.get('Status') != 'OK' or not authority:
+        return respond({'message': 'Payment failed'}, status=400)
+
+    if not getattr(settings, 'JOBS_EAGER', False):
+        try:
+            return respond(*await sync_to_async(process_payment_callback)(authority))
+        except Exception as e:
+            return respond({'message': f'Error processing order: {str(e)}'}, status=500)
+
+    session, outcome = await sync_to_async(claim_callback)(authority)
+    if outcome is not None:
+        return respond(*outcome)
+
+    try:
+        if not session.ref_id:
+            try:
+                res_data = await get_async_gateway().verify_payment(whole_amount(session.order.total_price), authority)
+            except GatewayUnavailable:
+                await sync_to_async(release_session)(session)
+                return respond(GATEWAY_UNAVAILABLE, status=503)
+            except GatewayError:
+                await sync_to_async(release_session)(session)
+                return respond({'message': 'Could not verify payment'}, status=502)
+            outcome = await sync_to_async(apply_verification)(session, res_data)
+        if outcome is None:
+            outcome = await sync_to_async(fulfil_order)(session)
+    except ClaimLost:
+        return respond({'message': 'Payment is being processed'}, status=202)
+    except Exception as e:
+        await sync_to_async(release_session)(session)
+        return respond({'message': f'Error processing order: {str(e)}'}, status=500)
+    return respond(*outcome)
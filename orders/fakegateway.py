@@ -0,0 +1,120 @@
+import json
+import random
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeZarinpalHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, like the real gateway
+
+    def do_POST(self):
+        gateway = self.server.gateway
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            payload = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            return self.reply(400, {'data': [], 'errors': {'code': -9, 'message': 'Invalid JSON'}})
+
+        gateway.calls.append((self.path, payload))
+        if gateway.latency:
+            time.sleep(gateway.latency + random.uniform(0, gateway.jitter))
+        if gateway.error_rate and random.random() < gateway.error_rate:
+            return self.reply(503, {'data': [], 'errors': {'code': -1, 'message': 'Service unavailable'}})
+
+        if self.path.endswith('/payment/request.json'):
+            authority = 'A' + uuid.uuid4().hex[:35].upper()
+            gateway.payments[authority] = int(payload.get('amount', 0))
+            return self.reply(200, {'data': {'code': 100, 'message': 'Success', 'authority': authority,
+                                             'fee_type': 'Merchant', 'fee': 0}, 'errors': []})
+        if self.path.endswith('/payment/verify.json'):
+            authority = payload.get('authority')
+            if gateway.payments.get(authority) != int(payload.get('amount', -1)):
+                return self.reply(200, {'data': [], 'errors': {'code': -50, 'message': 'Amount mismatch'}})
+            code = 101 if authority in gateway.verified else 100
+            gateway.verified.add(authority)
+            return self.reply(200, {'data': {'code': code, 'message': 'Verified', 'ref_id': random.randint(10 ** 6, 10 ** 7),
+                                             'card_pan': '502229******5995', 'fee_type': 'Merchant', 'fee': 0},
+                                    'errors': []})
+        return self.reply(404, {'data': [], 'errors': {'code': -404, 'message': 'Not found'}})
+
+    def reply(self, status, body):
+        body = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if self.server.gateway.verbose:
+            super().log_message(format, *args)
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024  # load runs open hundreds of connections at once
+
+    def handle_error(self, request, client_address):
+        # clients that gave up (read timeouts) are expected, not worth a traceback
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class FakeZarinpal:
+    """
+    A local stand-in for the Zarinpal v4 API, for tests and load runs.
+
+    `latency` (+ up to `jitter`) seconds are added to every call and
+    `error_rate` of them fail with a 503. Use as a context manager, or call
+    `start()`/`stop()`; `port=0` picks a free port.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0, jitter=0, error_rate=0, verbose=False):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.verbose = verbose
+        self.payments = {}
+        self.verified = set()
+        self.calls = []
+        self.server = _Server((host, port), FakeZarinpalHandler)
+        self.server.gateway = self
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    @property
+    def request_url(self):
+        return self.base_url + '/pg/v4/payment/request.json'
+
+    @property
+    def verify_url(self):
+        return self.base_url + '/pg/v4/payment/verify.json'
+
+    @property
+    def startpay_url(self):
+        return self.base_url + '/pg/StartPay/'
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, name='fake-zarinpal', daemon=True)
+        self.thread.start()
+        return self
+
+    def serve_forever(self):
+        self.server.serve_forever()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
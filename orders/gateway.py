@@ -0,0 +1,201 @@
+import logging
+import random
+import threading
+import time
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+from Onlineshop.metrics import timed
+
+logger = logging.getLogger(__name__)
+
+
+class GatewayError(Exception):
+    """The payment gateway could not be reached or answered with garbage."""
+
+
+class GatewayUnavailable(GatewayError):
+    """The circuit breaker is open, the gateway was not called at all."""
+
+
+class CircuitBreaker:
+    """
+    Fail fast while a dependency keeps failing.
+
+    After `threshold` consecutive failures the breaker opens and every call is
+    refused for `reset_timeout` seconds. Then a single trial call is let
+    through (half-open): success closes the breaker, failure opens it again.
+    """
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half-open'
+
+    def __init__(self, threshold=5, reset_timeout=30, clock=time.monotonic):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+        self.lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return self.CLOSED
+        if self.clock() - self.opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def allow(self):
+        with self.lock:
+            state = self.state
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self.trial_running:
+                self.trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_running = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            self.trial_running = False
+            if self.opened_at is not None or self.failures >= self.threshold:
+                self.opened_at = self.clock()
+
+
+class ZarinpalClient:
+    """
+    Zarinpal v4 client sharing one keep-alive connection pool per process.
+
+    Every call is bounded by connect/read timeouts. Verification is idempotent
+    on Zarinpal's side (a repeat answers code 101), so it is retried with
+    jittered exponential backoff; a payment request is only retried when the
+    connection was never established, since a retry after the request was sent
+    could open a second payment.
+    """
+    transient_statuses = {500, 502, 503, 504}
+
+    def __init__(self, merchant_id=None, request_url=None, verify_url=None, timeout=None,
+                 retries=None, backoff=None, breaker=None, pool_size=None):
+        self.merchant_id = merchant_id or settings.ZARINPAL_MERCHANT_ID
+        self.request_url = request_url or settings.ZARINPAL_PAYMENT_REQUEST_URL
+        self.verify_url = verify_url or settings.ZARINPAL_PAYMENT_VERIFICATION_URL
+        self.timeout = timeout or (
+            getattr(settings, 'ZARINPAL_CONNECT_TIMEOUT', 3.05),
+            getattr(settings, 'ZARINPAL_READ_TIMEOUT', 10),
+        )
+        self.retries = getattr(settings, 'ZARINPAL_VERIFY_RETRIES', 2) if retries is None else retries
+        self.backoff = getattr(settings, 'ZARINPAL_RETRY_BACKOFF', 0.2) if backoff is None else backoff
+        self.breaker = breaker or CircuitBreaker(
+            threshold=getattr(settings, 'ZARINPAL_BREAKER_THRESHOLD', 5),
+            reset_timeout=getattr(settings, 'ZARINPAL_BREAKER_RESET_TIMEOUT', 30),
+        )
+        self.session = self.create_session(pool_size or getattr(settings, 'ZARINPAL_POOL_SIZE', 10))
+
+    def create_session(self, pool_size):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    @property
+    def available(self):
+        """False while the breaker is open, checked before doing any work for a checkout."""
+        return self.breaker.state != CircuitBreaker.OPEN
+
+    def payment_payload(self, amount, callback_url, description, currency=None, metadata=None):
+        payload = {
+            'merchant_id': self.merchant_id,
+            'amount': int(amount),
+            'callback_url': callback_url,
+            'description': description,
+        }
+        if currency:
+            payload['currency'] = currency
+        if metadata:
+            payload['metadata'] = metadata
+        return payload
+
+    def verification_payload(self, amount, authority):
+        return {'merchant_id': self.merchant_id, 'amount': int(amount), 'authority': authority}
+
+    def request_payment(self, *args, **kwargs):
+        return self._call(self.request_url, self.payment_payload(*args, **kwargs),
+                          retry_on=(requests.ConnectTimeout,), retry_statuses=())
+
+    def verify_payment(self, amount, authority):
+        return self._call(self.verify_url, self.verification_payload(amount, authority),
+                          retry_on=(requests.ConnectionError, requests.Timeout),
+                          retry_statuses=self.transient_statuses)
+
+    def _call(self, url, payload, retry_on, retry_statuses):
+        if not self.breaker.allow():
+            raise GatewayUnavailable('Payment gateway is temporarily unavailable')
+
+        for attempt in range(self.retries + 1):
+            last = attempt == self.retries
+            try:
+                with timed('zarinpal'):
+                    response = self.session.post(url, json=payload, timeout=self.timeout)
+            except retry_on as e:
+                if last:
+                    return self._fail(e)
+                self._sleep(attempt)
+                continue
+            except requests.RequestException as e:
+                return self._fail(e)
+
+            if response.status_code in self.transient_statuses:
+                if response.status_code in retry_statuses and not last:
+                    self._sleep(attempt)
+                    continue
+                return self._fail(f'HTTP {response.status_code}')
+            try:
+                data = response.json()
+            except ValueError as e:
+                return self._fail(e)
+            # a 4xx with a JSON body is the gateway working as intended (bad
+            # merchant, wrong amount...), it must not trip the breaker
+            self.breaker.record_success()
+            return data
+
+    def _fail(self, error):
+        self.breaker.record_failure()
+        logger.warning('Payment gateway call failed: %s', error)
+        raise GatewayError(str(error))
+
+    def retry_delay(self, attempt):
+        # full jitter, so retries from many workers don't land in lockstep
+        return random.uniform(0, self.backoff * 2 ** attempt)
+
+    def _sleep(self, attempt):
+        time.sleep(self.retry_delay(attempt))
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_gateway():
+    """The process-wide client, created on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = ZarinpalClient()
+    return _client
+
+
+def reset_gateway():
+    global _client
+    with _client_lock:
+        _client = None
@@ -0,0 +1,102 @@
+import asyncio
+import json
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import AsyncClient, Client, override_settings
+from django.urls import reverse
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from Onlineshop.benchmarks import isolated_database
+from cart.models import Cart, CartItem
+from orders.fakegateway import FakeZarinpal
+from orders.gateway import reset_gateway
+from products.models import Product
+from users.models import UserInfo
+
+
+class Command(BaseCommand):
+    help = ("Compare the sync and async checkout views against a fake gateway with injected latency "
+            "(runs in a throwaway test database).")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help="Checkouts in flight at once.")
+        parser.add_argument('--latency', type=float, default=0.2, help="Seconds the fake gateway takes per call.")
+        parser.add_argument('--threads', type=int, default=8,
+                            help="Request threads of the sync (WSGI) worker being compared.")
+
+    def handle(self, *args, **options):
+        with isolated_database(on_disk=True), FakeZarinpal(latency=options['latency']) as gateway:
+            with override_settings(ALLOWED_HOSTS=['testserver'],
+                                   ZARINPAL_PAYMENT_REQUEST_URL=gateway.request_url,
+                                   ZARINPAL_PAYMENT_VERIFICATION_URL=gateway.verify_url,
+                                   ZARINPAL_ASYNC_POOL_SIZE=options['requests'],
+                                   ZARINPAL_POOL_SIZE=options['threads']):
+                reset_gateway()
+                results = [
+                    self.bench_sync(self.shoppers('sync', options['requests']), options['threads']),
+                    self.bench_async(self.shoppers('async', options['requests'])),
+                ]
+            reset_gateway()
+        for result in results:
+            result.update(requests=options['requests'], gateway_latency_s=options['latency'])
+        self.stdout.write(json.dumps(results, indent=2))
+
+    def shoppers(self, prefix, count):
+        product = Product.objects.create(name='Bench product', price=1000, stock=10 ** 9)
+        users = get_user_model().objects.bulk_create(
+            get_user_model()(username=f'{prefix}{n}', email=f'{prefix}{n}@example.com') for n in range(count)
+        )
+        UserInfo.objects.bulk_create(
+            UserInfo(user=user, full_name='Bench', phone='0912', address='Street 1', city='Tehran', postal_code='1')
+            for user in users
+        )
+        carts = Cart.objects.bulk_create(Cart(user=user) for user in users)
+        CartItem.objects.bulk_create(CartItem(cart=cart, product=product, quantity=1) for cart in carts)
+        return [f'Bearer {RefreshToken.for_user(user).access_token}' for user in users]
+
+    def bench_sync(self, tokens, threads):
+        url = reverse('checkout')
+
+        def checkout(token):
+            start = time.perf_counter()
+            status = Client().post(url, HTTP_AUTHORIZATION=token).status_code
+            connection.close()
+            return status, time.perf_counter() - start
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            results = list(pool.map(checkout, tokens))
+        return self.summary('sync', results, time.perf_counter() - start, threads=threads)
+
+    def bench_async(self, tokens):
+        url = reverse('checkout-async')
+
+        async def checkout(client, token):
+            start = time.perf_counter()
+            response = await client.post(url, headers={'Authorization': token})
+            return response.status_code, time.perf_counter() - start
+
+        async def run():
+            client = AsyncClient()
+            return await asyncio.gather(*(checkout(client, token) for token in tokens))
+
+        start = time.perf_counter()
+        results = asyncio.run(run())
+        return self.summary('async', results, time.perf_counter() - start, threads=1)
+
+    def summary(self, name, results, elapsed, threads):
+        latencies = sorted(latency * 1000 for _, latency in results)
+        return {
+            'view': name,
+            'threads': threads,
+            'ok': sum(status == 200 for status, _ in results),
+            'wall_s': round(elapsed, 3),
+            'throughput_rps': round(len(results) / elapsed, 1),
+            'p50_ms': round(statistics.median(latencies), 1),
+            'p95_ms': round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 1),
+        }
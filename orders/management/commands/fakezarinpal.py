@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from orders.fakegateway import FakeZarinpal
+
+
+class Command(BaseCommand):
+    help = "Serve a fake Zarinpal v4 API with configurable latency and error rate."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--latency', type=float, default=0.05, help="Seconds added to every call.")
+        parser.add_argument('--jitter', type=float, default=0.0, help="Up to this many extra random seconds.")
+        parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of calls answered with a 503.")
+        parser.add_argument('--verbose-log', action='store_true')
+
+    def handle(self, *args, **options):
+        gateway = FakeZarinpal(options['host'], options['port'], latency=options['latency'], jitter=options['jitter'],
+                               error_rate=options['error_rate'], verbose=options['verbose_log'])
+        self.stdout.write(self.style.SUCCESS(f"Fake Zarinpal listening on {gateway.base_url}"))
+        self.stdout.write(f"ZARINPAL_PAYMENT_REQUEST_URL={gateway.request_url}")
+        self.stdout.write(f"ZARINPAL_PAYMENT_VERIFICATION_URL={gateway.verify_url}")
+        self.stdout.write(f"ZARINPAL_STARTPAY_URL={gateway.startpay_url}")
+        try:
+            gateway.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            gateway.server.server_close()
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:17
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_line_totals(apps, schema_editor):
+    # orders placed so far were priced without discounts
+    OrderItem = apps.get_model('orders', 'OrderItem')
+    OrderItem.objects.using(schema_editor.connection.alias).update(line_total=F('price') * F('quantity'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0007_paymentsession_claim'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderitem',
+            name='discount',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=5),
+        ),
+        migrations.AddField(
+            model_name='orderitem',
+            name='line_total',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='total_price',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.RunPython(backfill_line_totals, migrations.RunPython.noop),
+    ]
@@ -12,8 +12,19 @@ class Order(models.Model):
     )
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
-    total_price = models.PositiveIntegerField(default=0)
+    # snapshot of the priced lines at checkout, never recomputed
+    total_price = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     created_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # order history pages: one user (optionally one status), newest first
+            models.Index(fields=['user', 'created_at', 'id']),
+            models.Index(fields=['user', 'status', 'created_at', 'id']),
+            # staff dashboards across all users
+            models.Index(fields=['status', 'created_at', 'id']),
+        ]
 
     def __str__(self):
         return f"Order #{self.id} - {self.user.username} - {self.status}"
@@ -23,17 +34,32 @@ class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity = models.IntegerField()
+    # the product's price and discount at checkout, and the line total they gave
     price = models.DecimalField(max_digits=10, decimal_places=2)
+    discount = models.DecimalField(max_digits=5, decimal_places=2, default=0)
+    line_total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
 
     def __str__(self):
         return f"{self.product.name} x {self.quantity}"
 
 
 class PaymentSession(models.Model):
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('processing', 'Processing'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    )
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
-    cart = models.ForeignKey(Cart, on_delete=models.CASCADE)
+    # kept after a completed payment deletes the cart, it holds the callback's outcome
+    cart = models.ForeignKey(Cart, on_delete=models.SET_NULL, null=True, blank=True)
     authority = models.CharField(max_length=50, unique=True)
     order = models.ForeignKey(Order, on_delete=models.CASCADE, null=True, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    ref_id = models.CharField(max_length=50, blank=True)
+    response_status = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.JSONField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
@@ -0,0 +1,8 @@
+from Onlineshop.pagination import KeysetPagination
+
+
+class OrderPagination(KeysetPagination):
+    ordering_fields = {
+        'created_at': 'created_at',
+    }
+    default_ordering = '-created_at'
@@ -0,0 +1,155 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from cart.tasks import clear_paid_cart
+from products.popularity import record_order
+from products.pricing import whole_amount
+from products.stock import InsufficientStock, reserve_stock
+from .gateway import GatewayError, GatewayUnavailable, get_gateway
+from .models import OrderItem, PaymentSession
+
+
+class ClaimLost(Exception):
+    """Our claim went stale and another request took the session over."""
+
+
+def claim_session(session):
+    """
+    Take the session for this request with a conditional UPDATE.
+
+    Only one request can move it out of `pending`; a claim left `processing`
+    by a worker that died is up for grabs again after PAYMENT_CLAIM_TIMEOUT.
+    The claim time doubles as a fencing token for every later write.
+    """
+    now = timezone.now()
+    stale = now - timedelta(seconds=getattr(settings, 'PAYMENT_CLAIM_TIMEOUT', 60))
+    claimed = (PaymentSession.objects.filter(pk=session.pk)
+               .filter(Q(status='pending') | Q(status='processing', claimed_at__lt=stale))
+               .update(status='processing', claimed_at=now))
+    session.claimed_at = now
+    return claimed == 1
+
+
+def _claimed(session):
+    return PaymentSession.objects.filter(pk=session.pk, status='processing', claimed_at=session.claimed_at)
+
+
+def release_session(session):
+    _claimed(session).update(status='pending', claimed_at=None)
+
+
+def settle_session(session, status, body, http_status):
+    """Store the final outcome, repeat callbacks are answered from it."""
+    if not _claimed(session).update(status=status, response_body=body, response_status=http_status):
+        raise ClaimLost
+    return body, http_status
+
+
+def claim_callback(authority):
+    """
+    Look up and claim the session behind a callback.
+
+    Returns `(session, None)` when this request now owns it, otherwise
+    `(None, (body, http_status))` with what to answer instead.
+    """
+    session = PaymentSession.objects.select_related('order').filter(authority=authority).first()
+    if session is None:
+        return None, ({'message': 'Payment session not found'}, 400)
+    if session.status in ('completed', 'failed'):
+        return None, (session.response_body, session.response_status)
+    if not claim_session(session):
+        return None, ({'message': 'Payment is being processed'}, 202)
+    return session, None
+
+
+def process_payment_callback(authority):
+    """
+    Verify and complete the payment behind `authority` exactly once.
+
+    Returns `(body, http_status)`. The callback that claims the session hands
+    verification to the job queue and answers 202 without waiting for the
+    gateway; callbacks for a settled session get the stored outcome. With
+    JOBS_EAGER the job runs inline and its outcome is returned directly.
+    """
+    from .tasks import verify_and_complete_payment
+
+    session, outcome = claim_callback(authority)
+    if outcome is not None:
+        return outcome
+
+    try:
+        verify_and_complete_payment.enqueue(session_id=session.pk, claimed_at=session.claimed_at.isoformat())
+    except GatewayUnavailable:
+        release_session(session)
+        return {'message': 'Payment service is temporarily unavailable, please try again shortly'}, 503
+    except GatewayError:
+        release_session(session)
+        return {'message': 'Could not verify payment'}, 502
+    except Exception:
+        release_session(session)
+        raise
+
+    session.refresh_from_db(fields=['status', 'response_body', 'response_status'])
+    if session.status in ('completed', 'failed'):
+        return session.response_body, session.response_status
+    return {'message': 'Payment received, verification in progress'}, 202
+
+
+def complete_payment(session):
+    """
+    Verify the claimed session with the gateway and complete its order.
+
+    Raises GatewayError for the caller to retry, ClaimLost if another request
+    took the session over in the meantime.
+    """
+    # a retry after a crash mid-way must not verify (and bill) twice
+    if not session.ref_id:
+        res_data = get_gateway().verify_payment(whole_amount(session.order.total_price), session.authority)
+        outcome = apply_verification(session, res_data)
+        if outcome is not None:
+            return outcome
+    return fulfil_order(session)
+
+
+def apply_verification(session, res_data):
+    """Record the gateway's verdict; returns the final outcome if the payment failed."""
+    if not res_data.get('data'):
+        return settle_session(session, 'failed', {'message': 'Invalid payment response'}, 400)
+    code = res_data['data'].get('code')
+    if code not in [100, 101]:
+        return settle_session(session, 'failed', {'message': f'Payment failed with code {code}'}, 400)
+
+    session.ref_id = str(res_data['data'].get('ref_id') or code)
+    if not _claimed(session).update(ref_id=session.ref_id):
+        raise ClaimLost
+    return None
+
+
+def fulfil_order(session):
+    """Take the stock and complete the order of a verified session."""
+    order = session.order
+    try:
+        with transaction.atomic():
+            # settled first: the fenced UPDATE also serializes against a late
+            # request that took a stale claim over
+            outcome = settle_session(session, 'completed', {'message': 'Payment successful and order completed'}, 200)
+            # the order's lines, not the cart's: the cart may have changed since checkout
+            lines = list(OrderItem.objects.filter(order=order).values_list('product_id', 'quantity'))
+            reserve_stock(lines)
+
+            order.status = 'completed'
+            order.save()
+
+            # queued in the same transaction, so it runs only if the order commits
+            clear_paid_cart.enqueue(cart_id=session.cart_id, user_id=order.user_id)
+            transaction.on_commit(lambda: record_order(lines))
+    except InsufficientStock as e:
+        return settle_session(session, 'failed', {
+            'message': f"Product '{e.shortfalls[0]['product']}' has insufficient stock",
+            'details': e.shortfalls
+        }, 400)
+    return outcome
@@ -4,11 +4,17 @@ from .models import Order, OrderItem
 class OrderItemSerializer(serializers.ModelSerializer):
     class Meta:
         model = OrderItem
-        fields = ['id', 'product', 'quantity', 'price']
+        fields = ['id', 'product', 'quantity', 'price', 'discount', 'line_total']
+        read_only_fields = ['discount', 'line_total']
+
+class OrderLineSerializer(serializers.Serializer):
+    """An `items` entry of a staff-created order, priced from the product."""
+    product = serializers.IntegerField(min_value=1)
+    quantity = serializers.IntegerField(min_value=1, default=1)
 
 class OrderSerializer(serializers.ModelSerializer):
     items = OrderItemSerializer(many=True, read_only=True)
     class Meta:
         model = Order
-        fields = ['id', 'user', 'status', 'created_at', 'items']
-        read_only_fields = ['user']
+        fields = ['id', 'user', 'status', 'total_price', 'created_at', 'items']
+        read_only_fields = ['user', 'total_price']
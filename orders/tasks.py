@@ -0,0 +1,19 @@
+from django.utils.dateparse import parse_datetime
+
+from jobs.queue import task
+from .models import PaymentSession
+from .payments import ClaimLost, complete_payment
+
+
+@task(max_attempts=8)
+def verify_and_complete_payment(session_id, claimed_at):
+    """Gateway errors propagate so the job is retried with backoff."""
+    session = (PaymentSession.objects.select_related('order')
+               .filter(pk=session_id, status='processing', claimed_at=parse_datetime(claimed_at)).first())
+    if session is None:
+        # settled already, or the claim went stale and a later callback took over
+        return
+    try:
+        complete_payment(session)
+    except ClaimLost:
+        pass
@@ -1,3 +1,446 @@
-from django.test import TestCase
+import asyncio
+import math
+import threading
+import time
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import AsyncClient, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient, APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from Onlineshop.benchmarks import wait_for_locks
+from Onlineshop.testing import QueryBudgetMixin
+from cart.models import Cart, CartItem
+from products.models import Product
+from users.models import UserInfo
+from jobs.worker import Worker
+from .async_gateway import AsyncZarinpalClient
+from .fakegateway import FakeZarinpal
+from .gateway import CircuitBreaker, GatewayError, GatewayUnavailable, ZarinpalClient
+from .models import Order, OrderItem, PaymentSession
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    def test_opens_after_threshold_and_half_opens_after_timeout(self):
+        now = [0.0]
+        breaker = CircuitBreaker(threshold=2, reset_timeout=10, clock=lambda: now[0])
+        breaker.record_failure()
+        self.assertTrue(breaker.allow())
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(breaker.allow())
+
+        now[0] = 10
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())  # one trial at a time
+        breaker.record_failure()
+        self.assertFalse(breaker.allow())
+
+        now[0] = 20
+        self.assertTrue(breaker.allow())
+        breaker.record_success()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+
+class ZarinpalClientTests(SimpleTestCase):
+    def client_for(self, gateway, **kwargs):
+        kwargs.setdefault('backoff', 0)
+        return ZarinpalClient(merchant_id='test', request_url=gateway.request_url,
+                              verify_url=gateway.verify_url, **kwargs)
+
+    def test_request_and_verify(self):
+        with FakeZarinpal() as gateway:
+            client = self.client_for(gateway)
+            authority = client.request_payment(1000, 'http://testserver/cb/', 'test')['data']['authority']
+            self.assertEqual(client.verify_payment(1000, authority)['data']['code'], 100)
+            self.assertEqual(client.verify_payment(1000, authority)['data']['code'], 101)
+
+    def test_verify_is_retried_and_breaker_trips(self):
+        with FakeZarinpal(error_rate=1) as gateway:
+            client = self.client_for(gateway, retries=2, breaker=CircuitBreaker(threshold=2))
+            for _ in range(2):
+                with self.assertRaises(GatewayError), self.assertLogs('orders.gateway', 'WARNING'):
+                    client.verify_payment(1000, 'A1')
+            self.assertEqual(len(gateway.calls), 6)
+            with self.assertRaises(GatewayUnavailable):
+                client.verify_payment(1000, 'A1')
+            self.assertEqual(len(gateway.calls), 6)
+            self.assertFalse(client.available)
+
+    def test_payment_request_is_not_retried_after_sending(self):
+        with FakeZarinpal(error_rate=1) as gateway:
+            with self.assertRaises(GatewayError), self.assertLogs('orders.gateway', 'WARNING'):
+                self.client_for(gateway, retries=2).request_payment(1000, 'http://testserver/cb/', 'test')
+            self.assertEqual(len(gateway.calls), 1)
+
+    def test_read_timeout_is_enforced(self):
+        with FakeZarinpal(latency=1) as gateway:
+            client = self.client_for(gateway, timeout=(1, 0.1), retries=0)
+            start = time.monotonic()
+            with self.assertRaises(GatewayError), self.assertLogs('orders.gateway', 'WARNING'):
+                client.verify_payment(1000, 'A1')
+            self.assertLess(time.monotonic() - start, 0.9)
+
+
+@override_settings(JOBS_EAGER=True)
+class CheckoutTests(QueryBudgetMixin, APITestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='buyer', email='buyer@example.com', password='pass')
+        UserInfo.objects.create(user=self.user, full_name='Buyer', phone='0912', address='Street 1',
+                                city='Tehran', postal_code='12345')
+        self.product = Product.objects.create(name='Lamp', price=1000, stock=5)
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, product=self.product, quantity=2)
+        self.client.force_authenticate(self.user)
+
+        self.gateway = FakeZarinpal().start()
+        self.addCleanup(self.gateway.stop)
+        client = ZarinpalClient(merchant_id='test', request_url=self.gateway.request_url,
+                                verify_url=self.gateway.verify_url, backoff=0)
+        patcher = mock.patch('orders.gateway._client', client)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.gateway_client = client
+
+    def test_checkout_and_callback_through_gateway(self):
+        response = self.client.post(reverse('checkout'))
+        self.assertEqual(response.status_code, 200)
+        self.assertWithinBudget(response)
+        self.assertIn('zarinpal;dur=', response['Server-Timing'])
+        authority = response.data['payment_url'].rsplit('/', 1)[-1]
+
+        response = self.client.get(reverse('payment-callback'), {'Status': 'OK', 'Authority': authority})
+        self.assertEqual(response.status_code, 200)
+        self.assertWithinBudget(response)
+        self.assertEqual(Order.objects.get().status, 'completed')
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 3)
+
+    def test_callback_queries_do_not_grow_with_the_cart(self):
+        counts = []
+        # the first completed order of the day also creates that day's rollup rows
+        for size in (1, 1, 20):
+            Order.objects.all().delete()
+            cart, _ = Cart.objects.get_or_create(user=self.user)
+            cart.items.all().delete()
+            CartItem.objects.bulk_create(
+                CartItem(cart=cart, product=Product.objects.create(name=f'P{size}-{n}', price=10, stock=5), quantity=1)
+                for n in range(size)
+            )
+            authority = self.client.post(reverse('checkout')).data['payment_url'].rsplit('/', 1)[-1]
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(reverse('payment-callback'), {'Status': 'OK', 'Authority': authority})
+            self.assertEqual(response.status_code, 200)
+            self.assertWithinBudget(response)
+            counts.append(len(queries))
+        self.assertEqual(counts[1], counts[2])
+
+    def test_checkout_snapshots_discounted_prices(self):
+        desk = Product.objects.create(name='Desk', price=Decimal('19.99'), discount=Decimal('12.5'), stock=10)
+        CartItem.objects.create(cart=Cart.objects.get(user=self.user), product=desk, quantity=3)
+        authority = self.client.post(reverse('checkout')).data['payment_url'].rsplit('/', 1)[-1]
+        self.assertEqual(self.gateway.payments[authority], 2052)
+
+        order = Order.objects.get()
+        self.assertEqual(order.total_price, Decimal('2052.47'))
+        Product.objects.filter(pk=desk.pk).update(price=50, discount=0)
+        response = self.client.get(reverse('order-detail', args=[order.pk]))
+        self.assertEqual(response.data['total_price'], '2052.47')
+        lines = {item['product']: item for item in response.data['items']}
+        self.assertEqual((lines[desk.pk]['price'], lines[desk.pk]['discount'], lines[desk.pk]['line_total']),
+                         ('19.99', '12.50', '52.47'))
+
+        response = self.client.get(reverse('payment-callback'), {'Status': 'OK', 'Authority': authority})
+        self.assertEqual(response.status_code, 200)
+
+    def test_repeat_callback_returns_stored_outcome(self):
+        authority = self.client.post(reverse('checkout')).data['payment_url'].rsplit('/', 1)[-1]
+        with mock.patch('orders.payments.record_order') as record_order, \
+                self.captureOnCommitCallbacks(execute=True):
+            first = self.client.get(reverse('payment-callback'), {'Status': 'OK', 'Authority': authority})
+            calls = len(self.gateway.calls)
+            second = self.client.get(reverse('payment-callback'), {'Status': 'OK', 'Authority': authority})
+        record_order.assert_called_once_with([(self.product.pk, 2)])
+        self.assertEqual((second.status_code, second.data), (first.status_code, first.data))
+        self.assertEqual(len(self.gateway.calls), calls)
+        self.assertEqual(PaymentSession.objects.get().status, 'completed')
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 3)
+
+    def test_gateway_outage_leaves_callback_retryable(self):
+        authority = self.client.post(reverse('checkout')).data['payment_url'].rsplit('/', 1)[-1]
+        self.gateway.error_rate = 1
+        with self.assertLogs('orders.gateway', 'WARNING'):
+            response = self.client.get(reverse('payment-callback'), {'Status': 'OK', 'Authority': authority})
+        self.assertEqual(response.status_code, 502)
+        self.assertEqual(PaymentSession.objects.get().status, 'pending')
+
+        self.gateway.error_rate = 0
+        response = self.client.get(reverse('payment-callback'), {'Status': 'OK', 'Authority': authority})
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(JOBS_EAGER=False)
+    def test_callback_hands_verification_to_worker(self):
+        authority = self.client.post(reverse('checkout')).data['payment_url'].rsplit('/', 1)[-1]
+        self.gateway.calls.clear()
+
+        response = self.client.get(reverse('payment-callback'), {'Status': 'OK', 'Authority': authority})
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(self.gateway.calls, [])
+
+        Worker(threads=1).loop('test/0', once=True)
+        self.assertEqual(len(self.gateway.calls), 1)
+        self.assertFalse(Cart.objects.exists())
+        response = self.client.get(reverse('payment-callback'), {'Status': 'OK', 'Authority': authority})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Order.objects.get().status, 'completed')
+
+    def test_open_breaker_fails_checkout_fast(self):
+        for _ in range(self.gateway_client.breaker.threshold):
+            self.gateway_client.breaker.record_failure()
+        response = self.client.post(reverse('checkout'))
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(self.gateway.calls, [])
+        self.assertFalse(Order.objects.exists())
+
+    def fill(self, count, quantity=1):
+        cart = Cart.objects.get(user=self.user)
+        products = Product.objects.bulk_create(Product(name=f'P{i}', price=10 + i, stock=100) for i in range(count))
+        CartItem.objects.bulk_create(CartItem(cart=cart, product=product, quantity=quantity) for product in products)
+        return products
+
+    def checkout_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('checkout'))
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_checkout_query_budget_is_constant(self):
+        # constant apart from one INSERT per batch of order lines the backend
+        # takes in a statement: 999 parameters / 6 columns = 166 rows on SQLite
+        fields = [field for field in OrderItem._meta.concrete_fields if not field.primary_key]
+        counts = set()
+        for size in (1, 20, 200):
+            CartItem.objects.all().delete()
+            Order.objects.all().delete()
+            self.fill(size)
+            batch = connection.ops.bulk_batch_size(fields, [None] * size) or size
+            counts.add(self.checkout_queries() - math.ceil(size / batch))
+        self.assertEqual(len(counts), 1)
+        self.assertLessEqual(counts.pop(), 9)
+
+    def test_recheckout_only_touches_changed_lines(self):
+        products = self.fill(30)
+        self.client.post(reverse('checkout'))
+        order = Order.objects.get()
+        before = {item.product_id: item.pk for item in order.items.all()}
+
+        CartItem.objects.filter(product=products[0]).update(quantity=5)
+        CartItem.objects.filter(product=products[1]).delete()
+        # cart lines, savepoint, pending order, its items, total, stale delete,
+        # changed lines, release, payment session
+        with self.assertNumQueries(9):
+            self.client.post(reverse('checkout'))
+
+        self.assertEqual(Order.objects.get().pk, order.pk)
+        after = {item.product_id: item for item in order.items.all()}
+        self.assertNotIn(products[1].pk, after)
+        self.assertEqual(after[products[0].pk].quantity, 5)
+        self.assertTrue(all(after[pk].pk == before[pk] for pk in after))
+        order.refresh_from_db()
+        self.assertEqual(order.total_price, sum(item.price * item.quantity for item in after.values()))
+
+
+class OrderHistoryTests(QueryBudgetMixin, APITestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_user(username='buyer', email='buyer@example.com', password='pass')
+        self.other = User.objects.create_user(username='other', email='other@example.com', password='pass')
+        self.staff = User.objects.create_user(username='staff', email='staff@example.com', password='pass', is_staff=True)
+        self.product = Product.objects.create(name='Lamp', price=10, stock=5)
+        for i in range(25):
+            order = Order.objects.create(user=self.user, status='completed' if i % 2 else 'pending')
+            OrderItem.objects.bulk_create(OrderItem(order=order, product=self.product, quantity=1, price=10) for _ in range(3))
+        Order.objects.create(user=self.other)
+
+    def walk(self, params=None):
+        ids, url = [], reverse('order-list')
+        while url:
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 200)
+            ids += [order['id'] for order in response.data['results']]
+            url, params = response.data['next'], None
+        return ids
+
+    def test_history_is_paginated_newest_first(self):
+        self.client.force_authenticate(self.user)
+        ids = self.walk({'page_size': 10})
+        self.assertEqual(ids, list(Order.objects.filter(user=self.user).order_by('-created_at', '-id').values_list('id', flat=True)))
+
+    def test_items_are_prefetched(self):
+        self.client.force_authenticate(self.user)
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('order-list'))
+        self.assertEqual(len(response.data['results'][0]['items']), 3)
+        self.assertWithinBudget(response)
+        self.assertWithinBudget(self.client.get(reverse('order-detail', args=[response.data['results'][0]['id']])))
+
+    def test_staff_creates_order_with_items_in_bulk(self):
+        self.client.force_authenticate(self.staff)
+        desk = Product.objects.create(name='Desk', price=50, stock=5)
+        items = [{'product': product.pk, 'quantity': 2} for product in (self.product, desk)] * 3
+        response = self.client.post(reverse('order-list'), {'status': 'pending', 'items': items}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(OrderItem.objects.filter(order_id=response.data['id']).count(), 6)
+        self.assertEqual(Order.objects.get(pk=response.data['id']).total_price, 3 * 2 * (self.product.price + 50))
+        self.assertEqual(response.query_stats.repeated(), [])
+        self.assertWithinBudget(response)
+
+    def test_staff_order_with_bad_items_is_rejected(self):
+        self.client.force_authenticate(self.staff)
+        for items in ([{'product': 999999, 'quantity': 1}], [{'quantity': 1}], [{'product': 'lamp'}],
+                      [{'product': self.product.pk, 'quantity': 0}]):
+            response = self.client.post(reverse('order-list'), {'status': 'pending', 'items': items}, format='json')
+            self.assertEqual(response.status_code, 400, items)
+            self.assertIn('items', response.data)
+        self.assertFalse(Order.objects.filter(user=self.staff).exists())
+
+    def test_filters(self):
+        self.client.force_authenticate(self.user)
+        self.assertEqual(len(self.walk({'status': 'completed'})), 12)
+        self.assertEqual(self.walk({'created_after': '2000-01-01', 'created_before': '2000-12-31'}), [])
+        self.assertEqual(self.client.get(reverse('order-list'), {'status': 'lost'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('order-list'), {'created_after': 'yesterday'}).status_code, 400)
+
+    def test_staff_sees_all_orders_without_counting(self):
+        self.client.force_authenticate(self.staff)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(len(self.walk({'page_size': 100})), 26)
+        self.assertFalse(any('COUNT(' in query['sql'] for query in queries))
+        self.assertEqual(len(self.walk({'user': self.other.pk})), 1)
+
+
+# no background popularity flushes into the test database
+@override_settings(JOBS_EAGER=True, POPULARITY_FLUSH_INTERVAL=None)
+class PaymentCallbackConcurrencyTests(TransactionTestCase):
+    def test_parallel_callbacks_verify_and_complete_once(self):
+        user = get_user_model().objects.create_user(username='buyer', email='buyer@example.com', password='pass')
+        product = Product.objects.create(name='Lamp', price=1000, stock=5)
+        cart = Cart.objects.create(user=user)
+        CartItem.objects.create(cart=cart, product=product, quantity=2)
+        order = Order.objects.create(user=user, total_price=2000)
+        OrderItem.objects.create(order=order, product=product, quantity=2, price=1000)
+
+        with FakeZarinpal(latency=0.05) as gateway:
+            client = ZarinpalClient(merchant_id='test', request_url=gateway.request_url,
+                                    verify_url=gateway.verify_url, backoff=0)
+            authority = client.request_payment(2000, 'http://testserver/cb/', 'test')['data']['authority']
+            PaymentSession.objects.create(user=user, cart=cart, order=order, authority=authority)
+            gateway.calls.clear()
+
+            outcomes = []
+            barrier = threading.Barrier(16)
+
+            def callback():
+                api = APIClient(raise_request_exception=False)
+                barrier.wait()
+                try:
+                    for _ in range(200):
+                        with connection.execute_wrapper(wait_for_locks):
+                            response = api.get(reverse('payment-callback'), {'Status': 'OK', 'Authority': authority})
+                        if response.status_code != 202:
+                            outcomes.append(response.status_code)
+                            return
+                        time.sleep(0.01)
+                finally:
+                    connection.close()
+
+            with mock.patch('orders.gateway._client', client):
+                threads = [threading.Thread(target=callback) for _ in range(16)]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+
+            self.assertEqual(outcomes, [200] * 16)
+            self.assertEqual([path for path, _ in gateway.calls], ['/pg/v4/payment/verify.json'])
+        product.refresh_from_db()
+        self.assertEqual(product.stock, 3)
+        self.assertEqual(Order.objects.get().status, 'completed')
+
+
+class AsyncCheckoutTests(TestCase):
+    def setUp(self):
+        self.gateway = FakeZarinpal(latency=0.2).start()
+        self.addCleanup(self.gateway.stop)
+        # a client per call: httpx pools belong to the event loop they were opened on
+        patcher = mock.patch('orders.async_views.get_async_gateway', lambda: AsyncZarinpalClient(
+            merchant_id='test', request_url=self.gateway.request_url, verify_url=self.gateway.verify_url))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.product = Product.objects.create(name='Lamp', price=1000, stock=1000)
+
+    def shopper(self, n):
+        user = get_user_model().objects.create_user(username=f'buyer{n}', email=f'buyer{n}@example.com')
+        UserInfo.objects.create(user=user, full_name='Buyer', phone='0912', address='Street 1',
+                                city='Tehran', postal_code='12345')
+        cart = Cart.objects.create(user=user)
+        CartItem.objects.create(cart=cart, product=self.product, quantity=2)
+        return f'Bearer {RefreshToken.for_user(user).access_token}'
+
+    @override_settings(JOBS_EAGER=True)
+    def test_checkout_and_callback(self):
+        token = self.shopper(0)
+        client = AsyncClient()
+        self.assertEqual(async_to_sync(client.post)(reverse('checkout-async')).status_code, 401)
+
+        response = async_to_sync(client.post)(reverse('checkout-async'), headers={'Authorization': token})
+        self.assertEqual(response.status_code, 200)
+        authority = response.json()['payment_url'].rsplit('/', 1)[-1]
+
+        for _ in range(2):
+            response = async_to_sync(client.get)(reverse('payment-callback-async'), {'Status': 'OK', 'Authority': authority})
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(len([path for path, _ in self.gateway.calls if path.endswith('verify.json')]), 1)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 998)
+
+    def test_callback_hands_verification_to_worker(self):
+        client = AsyncClient()
+        response = async_to_sync(client.post)(reverse('checkout-async'), headers={'Authorization': self.shopper(0)})
+        authority = response.json()['payment_url'].rsplit('/', 1)[-1]
+        self.gateway.calls.clear()
+
+        response = async_to_sync(client.get)(reverse('payment-callback-async'), {'Status': 'OK', 'Authority': authority})
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(self.gateway.calls, [])
+
+        with mock.patch('orders.gateway._client', ZarinpalClient(
+                merchant_id='test', request_url=self.gateway.request_url, verify_url=self.gateway.verify_url)):
+            Worker(threads=1).loop('test/0', once=True)
+        response = async_to_sync(client.get)(reverse('payment-callback-async'), {'Status': 'OK', 'Authority': authority})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Order.objects.get().status, 'completed')
+
+    def test_checkouts_wait_on_gateway_concurrently(self):
+        tokens = [self.shopper(n) for n in range(20)]
+
+        async def run():
+            client = AsyncClient()
+            return await asyncio.gather(*(
+                client.post(reverse('checkout-async'), headers={'Authorization': token}) for token in tokens
+            ))
+
+        start = time.monotonic()
+        responses = async_to_sync(run)()
+        elapsed = time.monotonic() - start
+        self.assertEqual({response.status_code for response in responses}, {200})
+        # 20 sequential gateway calls would take 4s
+        self.assertLess(elapsed, 2)
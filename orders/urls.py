@@ -2,6 +2,7 @@ from django.urls import path
 from rest_framework.routers import DefaultRouter
 from .views import OrderViewSet
 from .views import checkout, payment_callback
+from . import async_views
 
 
 router = DefaultRouter()
@@ -10,4 +11,7 @@ router.register(r'orders', OrderViewSet, basename='order')
 urlpatterns = router.urls+[
     path('checkout/', checkout, name='checkout'),
     path('payment/callback/', payment_callback, name='payment-callback'),
+    # for ASGI deployments; point ZARINPAL_CALLBACK_URL at the async callback there
+    path('async/checkout/', async_views.checkout, name='checkout-async'),
+    path('async/payment/callback/', async_views.payment_callback, name='payment-callback-async'),
 ]
\ No newline at end of file
@@ -1,138 +1,87 @@
-import requests
+from decimal import Decimal
+
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
-from cart.models import Cart, CartItem
 from rest_framework import viewsets, permissions
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
-from .models import Order, OrderItem, PaymentSession
-from .serializers import OrderSerializer
-from django.conf import settings
-from users.models import UserInfo
-from django.db import transaction
+from Onlineshop.routers import ReplicaReadMixin
+from products.models import Product
+from products.pricing import line_total
+from .models import Order, OrderItem
+from .serializers import OrderLineSerializer, OrderSerializer
 from .permissions import OrderPermission
+from .checkout import CheckoutError, payment_request, prepare_checkout, start_payment
+from .payments import process_payment_callback
+from .filters import OrderFilterBackend
+from .pagination import OrderPagination
+from .gateway import GatewayError, GatewayUnavailable, get_gateway
 
 
-class OrderViewSet(viewsets.ModelViewSet):
+class OrderViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     queryset = Order.objects.all()
     serializer_class = OrderSerializer
     permission_classes = [IsAuthenticated, OrderPermission]
+    filter_backends = [OrderFilterBackend]
+    pagination_class = OrderPagination
 
     def get_queryset(self):
         user = self.request.user
+        queryset = Order.objects.prefetch_related('items')
         if user.is_staff:
-            return Order.objects.all()
-        return Order.objects.filter(user=user)
+            return queryset
+        return queryset.filter(user=user)
 
     def perform_create(self, serializer):
-        order = serializer.save(user=self.request.user)
-
-        items = self.request.data.get('items', [])
-        for item in items:
-            from products.models import Product
-            product = Product.objects.get(id=item['product'])
-            OrderItem.objects.create(
-                order=order,
+        # lines are priced before the order is saved, so it is inserted with its total
+        lines = OrderLineSerializer(data=self.request.data.get('items', []), many=True)
+        if not lines.is_valid():
+            raise ValidationError({'items': lines.errors})
+        products = Product.objects.in_bulk({line['product'] for line in lines.validated_data})
+        missing = sorted({line['product'] for line in lines.validated_data} - products.keys())
+        if missing:
+            raise ValidationError({'items': [f'Product {pk} does not exist.' for pk in missing]})
+        order_items = []
+        for line in lines.validated_data:
+            product, quantity = products[line['product']], line['quantity']
+            order_items.append(OrderItem(
                 product=product,
-                quantity=item.get('quantity', 1),
-                price=product.price
-            )
+                quantity=quantity,
+                price=product.price,
+                discount=product.discount,
+                line_total=line_total(product.price, product.discount, quantity)
+            ))
+        total_price = sum((item.line_total for item in order_items), Decimal('0.00'))
+        order = serializer.save(user=self.request.user, total_price=total_price)
+        for item in order_items:
+            item.order = order
+        OrderItem.objects.bulk_create(order_items)
 
 
-MERCHANT_ID = settings.ZARINPAL_MERCHANT_ID
-PAYMENT_REQUEST_URL = settings.ZARINPAL_PAYMENT_REQUEST_URL
-PAYMENT_VERIFICATION_URL = settings.ZARINPAL_PAYMENT_VERIFICATION_URL
-CALLBACK_URL = settings.ZARINPAL_CALLBACK_URL
-CURRENCY = settings.ZARINPAL_CURRENCY
-STARTPAY_URL = settings.ZARINPAL_STARTPAY_URL
+GATEWAY_UNAVAILABLE = {'message': 'Payment service is temporarily unavailable, please try again shortly'}
 
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def checkout(request):
     user = request.user
-    try:
-        user_info = user.user_info
-    except UserInfo.DoesNotExist:
-        return Response(
-            {'message': 'User information is required before checkout.'},
-            status=400
-        )
-
-    required_fields = [user_info.full_name, user_info.phone, user_info.address,
-                       user_info.city, user_info.postal_code]
-    if not all(required_fields):
-        return Response(
-            {'message': 'Please complete your profile (name, phone, address, city, postal code).'},
-            status=400
-        )
+    if not get_gateway().available:
+        return Response(GATEWAY_UNAVAILABLE, status=503)
 
     try:
-        cart = Cart.objects.get(user=user)
-    except Cart.DoesNotExist:
-        return Response({'message': 'Cart is empty'}, status=400)
-
-    cart_items = CartItem.objects.filter(cart=cart)
-    if not cart_items.exists():
-        return Response({'message': 'Cart is empty'}, status=400)
-
-    insufficient_stock = []
-    for item in cart_items:
-        if item.quantity > item.product.stock:
-            insufficient_stock.append({
-                'product': item.product.name,
-                'available_stock': item.product.stock,
-                'requested': item.quantity
-            })
-
-    if insufficient_stock:
-        return Response({
-            'message': 'Some products have insufficient stock',
-            'details': insufficient_stock
-        }, status=400)
-
-    total_price = sum(item.product.price * item.quantity for item in cart_items)
-
-    order, created = Order.objects.get_or_create(
-        user=user,
-        status='pending',
-        defaults={'total_price': total_price}
-    )
-    if not created:
-        order.total_price = total_price
-        order.items.all().delete()
-        order.save()
-
-    for item in cart_items:
-        OrderItem.objects.create(
-            order=order,
-            product=item.product,
-            quantity=item.quantity,
-            price=item.product.price
-        )
-
-    payment_data = {
-        "merchant_id": MERCHANT_ID,
-        "amount": int(total_price),
-        "callback_url": CALLBACK_URL,
-        "currency": CURRENCY,
-        "description": f"Payment for user {user.username}",
-        "metadata": {"email": user.email, "order_id": str(order.id)}
-    }
-
-    response = requests.post(PAYMENT_REQUEST_URL, json=payment_data)
-    print(response.json())
-    if response.status_code == 200:
-        res_data = response.json()
-        if res_data.get('data') and res_data['data'].get('code') == 100:
-            authority = res_data['data']['authority']
-
-            PaymentSession.objects.create(user=user, cart=cart, authority=authority, order=order)
+        order, cart_id = prepare_checkout(user)
+    except CheckoutError as e:
+        return Response(e.body, status=e.status)
 
-            payment_url = f"{STARTPAY_URL}{authority}"
-
-            return Response({'payment_url': payment_url})
+    try:
+        res_data = get_gateway().request_payment(**payment_request(user, order))
+    except GatewayUnavailable:
+        return Response(GATEWAY_UNAVAILABLE, status=503)
+    except GatewayError:
+        res_data = {}
 
-    return Response({'message': 'Payment request failed'}, status=500)
+    body, status = start_payment(user, order, cart_id, res_data)
+    return Response(body, status=status)
 
 
 @api_view(['GET'])
@@ -142,51 +91,8 @@ def payment_callback(request):
 
     if status == 'OK' and authority:
         try:
-            payment_session = PaymentSession.objects.get(authority=authority)
-        except PaymentSession.DoesNotExist:
-            return Response({'message': 'Payment session not found'}, status=400)
-
-        order = payment_session.order
-        cart = payment_session.cart
-        cart_items = CartItem.objects.filter(cart=cart)
-        total_price = int(payment_session.order.total_price)
-
-        verification_data = {
-            "merchant_id": MERCHANT_ID,
-            "amount": int(total_price),
-            "authority": authority
-        }
-        res = requests.post(PAYMENT_VERIFICATION_URL, json=verification_data)
-        res_data = res.json()
-
-        if not res_data.get("data"):
-            return Response({"message": "Invalid payment response"}, status=400)
-
-        code = res_data["data"].get("code")
-        if code not in [100, 101]:
-            return Response({"message": f"Payment failed with code {code}"}, status=400)
-
-        try:
-            with transaction.atomic():
-                for item in cart_items:
-                    if item.quantity > item.product.stock:
-                        return Response({
-                            'message': f"Product '{item.product.name}' has insufficient stock"
-                        }, status=400)
-
-                for item in cart_items:
-                    item.product.stock -= item.quantity
-                    item.product.save()
-
-                order.status = 'completed'
-                order.save()
-
-                cart_items.delete()
-                cart.delete()
-                payment_session.delete()
-
+            body, http_status = process_payment_callback(authority)
         except Exception as e:
             return Response({'message': f'Error processing order: {str(e)}'}, status=500)
-
-        return Response({'message': 'Payment successful and order completed'})
-    return Response({'message': 'Payment failed'}, status=400)
\ No newline at end of file
+        return Response(body, status=http_status)
+    return Response({'message': 'Payment failed'}, status=400)
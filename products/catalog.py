@@ -0,0 +1,59 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import CatalogVersion
+
+CACHE_KEY = 'products:catalog-version'
+POPULARITY_CACHE_KEY = 'products:popularity-flushed'
+
+
+def get_catalog_version():
+    """
+    Return `(version, updated_at)` of the catalog.
+
+    Served from the cache when possible, otherwise one primary key lookup.
+    """
+    state = cache.get(CACHE_KEY)
+    if state is None:
+        state = CatalogVersion.objects.filter(pk=1).values_list('version', 'updated_at').first()
+        if state is None:
+            state = (0, None)
+        cache.set(CACHE_KEY, state, getattr(settings, 'CATALOG_VERSION_CACHE_TIMEOUT', 5))
+    return state
+
+
+def bump_catalog_version(using='default'):
+    """Call after any write that changes what the product endpoints return."""
+    updated = CatalogVersion.objects.using(using).filter(pk=1).update(
+        version=F('version') + 1, updated_at=timezone.now()
+    )
+    if not updated:
+        CatalogVersion.objects.using(using).get_or_create(pk=1, defaults={'version': 1})
+    cache.delete(CACHE_KEY)
+    # a reader may have re-cached the old version before we committed
+    transaction.on_commit(lambda: cache.delete(CACHE_KEY), using=using)
+
+
+def get_popularity_version():
+    """
+    When any process last flushed popularity counters, or None.
+
+    Kept in the database; the cache only saves the lookup for
+    CATALOG_VERSION_CACHE_TIMEOUT seconds, as for the catalog version.
+    """
+    flushed = cache.get(POPULARITY_CACHE_KEY)
+    if flushed is None:
+        flushed = CatalogVersion.objects.filter(pk=1).values_list('popularity_flushed_at', flat=True).first() or ''
+        cache.set(POPULARITY_CACHE_KEY, flushed, getattr(settings, 'CATALOG_VERSION_CACHE_TIMEOUT', 5))
+    return flushed or None
+
+
+def mark_popularity_flushed(using='default'):
+    now = timezone.now()
+    if not CatalogVersion.objects.using(using).filter(pk=1).update(popularity_flushed_at=now):
+        CatalogVersion.objects.using(using).get_or_create(pk=1, defaults={'popularity_flushed_at': now})
+    cache.delete(POPULARITY_CACHE_KEY)
+    transaction.on_commit(lambda: cache.delete(POPULARITY_CACHE_KEY), using=using)
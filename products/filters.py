@@ -0,0 +1,98 @@
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db.models import CharField, Value
+from django.db.models.functions import Cast, Concat, StrIndex
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+from .search import TOKEN_RE, get_search_backend
+
+
+class ProductFilterBackend(BaseFilterBackend):
+    """
+    ?min_price= / ?max_price=   range on the price index
+    ?in_stock=true|false        stock > 0 / stock = 0
+    ?name=<prefix>              name LIKE 'prefix%' on the name index
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        params = request.query_params
+
+        min_price = self.parse_decimal(params, 'min_price')
+        if min_price is not None:
+            queryset = queryset.filter(price__gte=min_price)
+
+        max_price = self.parse_decimal(params, 'max_price')
+        if max_price is not None:
+            queryset = queryset.filter(price__lte=max_price)
+
+        in_stock = params.get('in_stock')
+        if in_stock is not None:
+            if in_stock.lower() in ('1', 'true', 'yes'):
+                queryset = queryset.filter(stock__gt=0)
+            elif in_stock.lower() in ('0', 'false', 'no'):
+                queryset = queryset.filter(stock=0)
+            else:
+                raise ValidationError({'in_stock': 'Must be true or false.'})
+
+        name = params.get('name')
+        if name:
+            # the lower bound lets SQLite walk the name index; LIKE keeps it exact
+            queryset = queryset.filter(name__gte=name, name__startswith=name)
+
+        return queryset
+
+    def parse_decimal(self, params, name):
+        value = params.get(name)
+        if value in (None, ''):
+            return None
+        try:
+            return Decimal(value)
+        except InvalidOperation:
+            raise ValidationError({name: 'A valid number is required.'})
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {'name': 'min_price', 'required': False, 'in': 'query', 'schema': {'type': 'number'}},
+            {'name': 'max_price', 'required': False, 'in': 'query', 'schema': {'type': 'number'}},
+            {'name': 'in_stock', 'required': False, 'in': 'query', 'schema': {'type': 'boolean'}},
+            {'name': 'name', 'required': False, 'in': 'query', 'schema': {'type': 'string'},
+             'description': 'Name prefix'},
+        ]
+
+
+class ProductSearchFilter(BaseFilterBackend):
+    """
+    ?search=<words> restricts the list to full-text matches. Ordered by
+    relevance (the default when searching), the best PRODUCT_SEARCH_MAX_RESULTS
+    matches among the rows left by the other filters are annotated with
+    `search_rank` (lower = better match); under any other ordering every
+    match is listed.
+    """
+    search_param = 'search'
+    ordering_param = 'ordering'
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '')
+        if not TOKEN_RE.search(query):
+            return queryset
+        backend = get_search_backend(queryset.db)
+        if request.query_params.get(self.ordering_param, 'relevance').lstrip('-') != 'relevance':
+            return backend.filter(queryset, query)
+        limit = getattr(settings, 'PRODUCT_SEARCH_MAX_RESULTS', 1000)
+        # the filters run inside the full-text query, so the cap only applies to real candidates
+        ids = backend.search(query, limit, within=queryset)
+        if not ids:
+            return queryset.none()
+        # rank = offset of ",<id>," in the ranked id list; a single string search
+        # per row is far cheaper than a CASE with one branch per match
+        ranked = Value(',%s,' % ','.join(map(str, ids)))
+        needle = Concat(Value(','), Cast('pk', CharField()), Value(','), output_field=CharField())
+        return queryset.filter(pk__in=ids).annotate(search_rank=StrIndex(ranked, needle))
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {'name': self.search_param, 'required': False, 'in': 'query', 'schema': {'type': 'string'},
+             'description': 'Full-text search on name and description, ranked by relevance'},
+        ]
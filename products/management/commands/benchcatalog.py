@@ -0,0 +1,130 @@
+import json
+import random
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from rest_framework.test import APIRequestFactory
+
+from Onlineshop.benchmarks import isolated_database, measure
+from products.models import Product
+from products.pagination import ProductPagination
+from products.search import get_search_backend
+from products.serializers import PRODUCT_FIELDS, ProductSerializer, serialize_product_rows
+from rest_framework.renderers import JSONRenderer
+from products.views import ProductViewSet
+
+
+WORDS = (
+    'cotton', 'leather', 'steel', 'wireless', 'organic', 'classic', 'compact', 'premium',
+    'shirt', 'lamp', 'kettle', 'backpack', 'speaker', 'jacket', 'blender', 'notebook',
+)
+
+
+class Command(BaseCommand):
+    help = "Benchmark the product list endpoint on growing catalogs (runs in a throwaway test database)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1000,10000,100000',
+                            help='Comma separated catalog sizes, e.g. 1000,10000,100000,1000000')
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--page-size', type=int, default=20)
+        parser.add_argument('--scenarios', default='pagination,search,serialization',
+                            help='Comma separated subset of pagination,search,serialization')
+
+    def handle(self, *args, **options):
+        sizes = sorted(int(size) for size in options['sizes'].split(','))
+        with isolated_database():
+            results = [self.run_size(size, options) for size in sizes]
+        self.stdout.write(json.dumps(results, indent=2))
+
+    def run_size(self, size, options):
+        self.populate(size)
+        scenarios = options['scenarios'].split(',')
+        result = {'products': size}
+        if 'pagination' in scenarios:
+            result.update(self.bench_pagination(size, options))
+        if 'search' in scenarios:
+            result.update(self.bench_search(options))
+        if 'serialization' in scenarios:
+            result.update(self.bench_serialization(options))
+        self.stderr.write(f"{size} products done")
+        return result
+
+    def bench_pagination(self, size, options):
+        factory = APIRequestFactory()
+        view = ProductViewSet.as_view({'get': 'list'})
+        result = {}
+        for ordering, field in (('-created_at', 'created_at'), ('price', 'price')):
+            # cursor pointing 90% of the way into the catalog
+            depth = int(size * 0.9)
+            order = (ordering, '-id' if ordering.startswith('-') else 'id')
+            value, pk = Product.objects.order_by(*order).values_list(field, 'id')[depth]
+            cursor = ProductPagination().encode_cursor(value, pk)
+
+            for label, params in (('first_page', {}), ('deep_page', {'cursor': cursor})):
+                params = dict(params, ordering=ordering, page_size=options['page_size'])
+
+                def call():
+                    response = view(factory.get('/api/products/', params, HTTP_HOST='localhost'))
+                    response.render()
+
+                result[f'{ordering}:{label}'] = measure(call, repeat=options['repeat'])
+        return result
+
+    def bench_search(self, options):
+        factory = APIRequestFactory()
+        view = ProductViewSet.as_view({'get': 'list'})
+        result = {}
+        for query in ('leather', 'premium speaker', 'organic cotton shirt'):
+            def call():
+                response = view(factory.get('/api/products/', {'search': query}, HTTP_HOST='localhost'))
+                response.render()
+
+            result[f'search:{query}'] = measure(call, repeat=options['repeat'])
+        return result
+
+    def bench_serialization(self, options):
+        """
+        ProductSerializer over model instances vs .values() rows, rendered to
+        JSON. `vs_full_serializer` compares against the previous default: every
+        field through ProductSerializer.
+        """
+        renderer = JSONRenderer()
+        result = {}
+        for rows in (100, 1000):
+            queryset = Product.objects.order_by('-created_at', '-id')[:rows]
+            baseline = None
+            for label, fields in (('all_fields', PRODUCT_FIELDS), ('id,name,price', ['id', 'name', 'price'])):
+                def serializer_path():
+                    renderer.render(ProductSerializer(queryset, many=True, fields=fields).data)
+
+                def values_path():
+                    renderer.render(serialize_product_rows(queryset.values(*fields), fields))
+
+                slow = measure(serializer_path, repeat=options['repeat'])
+                fast = measure(values_path, repeat=options['repeat'])
+                baseline = baseline or slow
+                result[f'serialize:{rows}:{label}'] = {
+                    'serializer': slow,
+                    'values': fast,
+                    'speedup': round(slow['p50_ms'] / fast['p50_ms'], 1),
+                    'vs_full_serializer': round(baseline['p50_ms'] / fast['p50_ms'], 1),
+                }
+        return result
+
+    def populate(self, size, batch_size=5000):
+        existing = Product.objects.count()
+        rng = random.Random(existing)
+        while existing < size:
+            count = min(batch_size, size - existing)
+            Product.objects.bulk_create(
+                Product(
+                    name=f'Product {existing + i:07d}',
+                    description=' '.join(rng.sample(WORDS, 4)),
+                    price=Decimal(rng.randint(100, 10_000_000)) / 100,
+                    stock=rng.randint(0, 100),
+                )
+                for i in range(count)
+            )
+            existing += count
+        get_search_backend().rebuild()
@@ -0,0 +1,77 @@
+import json
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from Onlineshop.benchmarks import isolated_database
+from products.bulk import UPDATE_FIELDS, ImportReport, _write_batch
+from products.models import Product
+
+
+def bulk_create_upsert(batch, report, using):
+    products = [Product(**row) for row in {row['sku']: row for row in batch}.values()]
+    with transaction.atomic(using=using):
+        Product.objects.using(using).bulk_create(products, update_conflicts=True, unique_fields=['sku'],
+                                                 update_fields=UPDATE_FIELDS)
+
+
+def bulk_create_and_update(batch, report, using):
+    rows = {row['sku']: row for row in batch}
+    existing = Product.objects.using(using).in_bulk(list(rows), field_name='sku')
+    now = timezone.now()
+    created, updated = [], []
+    for sku, row in rows.items():
+        product = existing.get(sku)
+        if product is None:
+            created.append(Product(**row))
+            continue
+        for name, value in row.items():
+            setattr(product, name, value)
+        product.updated_at = now
+        updated.append(product)
+    with transaction.atomic(using=using):
+        Product.objects.using(using).bulk_create(created)
+        Product.objects.using(using).bulk_update(updated, UPDATE_FIELDS)
+
+
+STRATEGIES = {
+    'executemany_upsert': _write_batch,
+    'bulk_create_update_conflicts': bulk_create_upsert,
+    'bulk_create_plus_bulk_update': bulk_create_and_update,
+}
+
+
+class Command(BaseCommand):
+    help = ("Compare ways of writing product import batches: inserting a fresh catalog, then updating "
+            "every row (runs in a throwaway test database). Only executemany_upsert, the one "
+            "importproducts uses, also keeps the search index up to date.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=20000)
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        report = {}
+        with isolated_database():
+            for name, write_batch in STRATEGIES.items():
+                Product.objects.all().delete()
+                report[name] = {
+                    'insert_rows_per_s': self.run(write_batch, 'new', options),
+                    'update_rows_per_s': self.run(write_batch, 'changed', options),
+                }
+                self.stderr.write(f"{name} done")
+        self.stdout.write(json.dumps(report, indent=2))
+
+    def run(self, write_batch, label, options):
+        rows = [
+            {'sku': f'SKU-{n}', 'name': f'Product {n} {label}', 'description': '', 'price': Decimal('9.99'),
+             'discount': Decimal('0'), 'stock': n % 10, 'image_url': ''}
+            for n in range(options['rows'])
+        ]
+        start = time.perf_counter()
+        for offset in range(0, len(rows), options['batch_size']):
+            write_batch(rows[offset:offset + options['batch_size']], ImportReport(), 'default')
+        return round(len(rows) / (time.perf_counter() - start))
@@ -0,0 +1,85 @@
+import json
+import random
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db.models import F, Sum
+from django.test import override_settings
+from rest_framework.test import APIRequestFactory
+
+from Onlineshop.benchmarks import isolated_database, measure
+from orders.models import Order, OrderItem
+from products import popularity
+from products.models import Product
+from products.views import ProductViewSet
+
+
+class Command(BaseCommand):
+    help = ("Compare a best-seller page aggregated over OrderItem with the indexed popularity "
+            "ordering, and per-event counter UPDATEs with the buffered flush "
+            "(runs in a throwaway test database).")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=2000)
+        parser.add_argument('--order-items', type=int, default=50000)
+        parser.add_argument('--events', type=int, default=2000, help="Cart adds per counting run.")
+        parser.add_argument('--hot', type=int, default=20, help="Products the events are spread over.")
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        rng = random.Random(0)
+        with isolated_database(), override_settings(POPULARITY_FLUSH_INTERVAL=None):
+            user = get_user_model().objects.create_user(username='bench', email='bench@example.com')
+            products = Product.objects.bulk_create(
+                Product(name=f'P{n}', price=Decimal(n % 500 + 1), stock=10 ** 6) for n in range(options['products'])
+            )
+            orders = Order.objects.bulk_create(Order(user=user, status='completed')
+                                               for _ in range(options['order_items'] // 5))
+            OrderItem.objects.bulk_create(
+                OrderItem(order=orders[n % len(orders)], product=rng.choice(products), quantity=rng.randint(1, 3),
+                          price=1, line_total=1)
+                for n in range(options['order_items'])
+            )
+            sales = OrderItem.objects.values('product_id').annotate(sold=Sum('quantity'))
+            for row in sales:
+                Product.objects.filter(pk=row['product_id']).update(units_sold=row['sold'], popularity=row['sold'])
+
+            report = {'page': self.bench_page(options), 'counting': self.bench_counting(products, rng, options)}
+        self.stdout.write(json.dumps(report, indent=2))
+
+    def bench_page(self, options):
+        factory = APIRequestFactory()
+        view = ProductViewSet.as_view({'get': 'list'})
+
+        def aggregated():
+            # what ?ordering=-popularity would cost without the counters
+            list(Product.objects.annotate(sold=Sum('orderitem__quantity')).order_by(F('sold').desc(nulls_last=True),
+                                                                                    '-id')[:20])
+
+        def indexed():
+            view(factory.get('/api/products/', {'ordering': '-popularity'}, HTTP_HOST='localhost')).render()
+
+        return {
+            'aggregate_per_request': measure(aggregated, repeat=options['repeat']),
+            'popularity_list_view': measure(indexed, repeat=options['repeat']),
+        }
+
+    def bench_counting(self, products, rng, options):
+        hot = [product.pk for product in products[:options['hot']]]
+        events = [rng.choice(hot) for _ in range(options['events'])]
+
+        def per_event():
+            for product_id in events:
+                Product.objects.filter(pk=product_id).update(cart_adds=F('cart_adds') + 1)
+
+        def buffered():
+            for product_id in events:
+                popularity.record_cart_adds([product_id])
+            popularity.flush_popularity()
+
+        return {
+            'events': len(events),
+            'update_per_event': measure(per_event, repeat=3, warmup=0),
+            'buffered_flush': measure(buffered, repeat=3, warmup=0),
+        }
@@ -0,0 +1,76 @@
+import json
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Sum
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from Onlineshop.benchmarks import isolated_database, measure
+from cart.models import Cart, CartItem
+from cart.views import CartViewSet
+from orders.checkout import materialize_order
+from products.models import Product
+from products.pricing import line_total_expression, price_cart
+
+
+class Command(BaseCommand):
+    help = ("Benchmark cart pricing and checkout snapshots on carts of growing size "
+            "(runs in a throwaway test database).")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1,10,100,1000', help='Comma separated cart sizes in lines.')
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        sizes = sorted(int(size) for size in options['sizes'].split(','))
+        with isolated_database():
+            user = get_user_model().objects.create_user(username='bench', email='bench@example.com')
+            cart = Cart.objects.create(user=user)
+            products = Product.objects.bulk_create(
+                Product(name=f'P{n}', price=Decimal(f'{n % 500 + 1}.99'), discount=Decimal(n % 4 * 5), stock=10 ** 6)
+                for n in range(max(sizes))
+            )
+            results = []
+            for size in sizes:
+                CartItem.objects.filter(cart=cart).delete()
+                CartItem.objects.bulk_create(CartItem(cart=cart, product=product, quantity=n % 3 + 1)
+                                             for n, product in enumerate(products[:size]))
+                results.append(self.run_size(size, user, cart, options))
+                self.stderr.write(f"{size} lines done")
+        self.stdout.write(json.dumps(results, indent=2))
+
+    def run_size(self, size, user, cart, options):
+        lines = CartItem.objects.filter(cart=cart)
+        factory = APIRequestFactory()
+        view = CartViewSet.as_view({'get': 'list'})
+
+        def sql_totals():
+            # annotated line totals plus a SUM aggregate, arithmetic in the database
+            # (float on SQLite, which is why the cart prices lines with products.pricing)
+            annotated = lines.select_related('product').annotate(line_total=line_total_expression())
+            list(annotated)
+            annotated.aggregate(total=Sum('line_total'))
+
+        def cart_view():
+            request = factory.get('/api/cart/')
+            force_authenticate(request, user)
+            view(request).render()
+
+        def first_checkout():
+            with transaction.atomic():
+                materialize_order(user, list(lines.select_related('product')))
+                transaction.set_rollback(True)
+
+        materialize_order(user, list(lines.select_related('product')))
+
+        def recheckout():
+            materialize_order(user, list(lines.select_related('product')))
+
+        result = {'lines': size}
+        for label, func in (('price_cart', lambda: price_cart(lines)), ('sql_totals', sql_totals),
+                            ('cart_view', cart_view), ('first_checkout', first_checkout),
+                            ('recheckout', recheckout)):
+            result[label] = measure(func, repeat=options['repeat'])
+        return result
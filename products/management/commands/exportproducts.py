@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from products.bulk import FORMATS, export_products, guess_format
+
+
+class Command(BaseCommand):
+    help = "Stream the product catalog as CSV or JSONL."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', '-o', help='File to write, defaults to stdout.')
+        parser.add_argument('--format', choices=FORMATS, help='Defaults to the output extension, then csv.')
+
+    def handle(self, *args, **options):
+        fmt = options['format'] or guess_format(options['output'])
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8', newline='') as output:
+                output.writelines(export_products(fmt))
+        else:
+            for chunk in export_products(fmt):
+                self.stdout.write(chunk, ending='')
@@ -0,0 +1,33 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from products.bulk import FORMATS, guess_format, import_products
+
+
+class Command(BaseCommand):
+    help = "Upsert products by sku from a CSV or JSONL file."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=FORMATS, help='Defaults to the file extension, then csv.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        fmt = options['format'] or guess_format(options['path'])
+        start = time.perf_counter()
+        try:
+            with open(options['path'], 'rb') as stream:
+                report = import_products(stream, fmt, batch_size=options['batch_size'])
+        except OSError as e:
+            raise CommandError(e)
+        elapsed = time.perf_counter() - start
+
+        for error in report.errors:
+            self.stderr.write(f"line {error['line']}: {json.dumps(error['errors'])}")
+        self.stdout.write(self.style.SUCCESS(
+            f"{report.rows} rows in {elapsed:.2f}s ({report.rows / elapsed if elapsed else 0:,.0f} rows/s): "
+            f"{report.created} created, {report.updated} updated, {report.failed} failed, "
+            f"{report.duplicates} duplicates"
+        ))
@@ -0,0 +1,69 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:24
+
+from collections import defaultdict
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F
+
+EPOCH = datetime(2026, 1, 1, tzinfo=timezone.utc)  # products.popularity.EPOCH at the time of writing
+
+
+def backfill_sales(apps, schema_editor):
+    # sales so far, each decayed from the time its order was placed
+    OrderItem = apps.get_model('orders', 'OrderItem')
+    Product = apps.get_model('products', 'Product')
+    using = schema_editor.connection.alias
+    half_life = getattr(settings, 'POPULARITY_HALF_LIFE', 7 * 24 * 3600)
+    points = getattr(settings, 'POPULARITY_WEIGHTS', {}).get('unit_sold', 5)
+
+    totals = defaultdict(lambda: [0, 0, 0.0])
+    lines = OrderItem.objects.using(using).filter(order__status='completed')
+    for product_id, quantity, placed in lines.values_list('product_id', 'quantity', 'order__created_at').iterator():
+        total = totals[product_id]
+        total[0] += quantity
+        total[1] += 1
+        total[2] += quantity * points * 2 ** ((placed - EPOCH).total_seconds() / half_life)
+    for product_id, (units_sold, order_count, popularity) in totals.items():
+        Product.objects.using(using).filter(pk=product_id).update(
+            units_sold=F('units_sold') + units_sold,
+            order_count=F('order_count') + order_count,
+            popularity=F('popularity') + popularity,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0006_product_sku'),
+        ('orders', '0008_order_price_snapshots'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='cart_adds',
+            field=models.PositiveBigIntegerField(db_default=0, default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='order_count',
+            field=models.PositiveBigIntegerField(db_default=0, default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='popularity',
+            field=models.FloatField(db_default=0, default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='units_sold',
+            field=models.PositiveBigIntegerField(db_default=0, default=0),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['popularity', 'id'], name='products_pr_popular_246904_idx'),
+        ),
+        migrations.RunPython(backfill_sales, migrations.RunPython.noop),
+    ]
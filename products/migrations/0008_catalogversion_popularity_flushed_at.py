@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0007_product_popularity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='catalogversion',
+            name='popularity_flushed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
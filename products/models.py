@@ -1,6 +1,7 @@
 from django.db import models
 
 class Product(models.Model):
+    sku = models.CharField(max_length=64, unique=True, null=True, blank=True)
     name = models.CharField(max_length=255, db_index=True)
     description = models.TextField(blank=True)
     price = models.DecimalField(max_digits=10, decimal_places=2)
@@ -8,12 +9,45 @@ class Product(models.Model):
     stock = models.PositiveIntegerField(default=0)
     image_url = models.CharField(max_length=255, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    # popularity counters, only ever changed by products.popularity's F() updates;
+    # db_default because the bulk import inserts rows with raw SQL
+    units_sold = models.PositiveBigIntegerField(default=0, db_default=0)
+    order_count = models.PositiveBigIntegerField(default=0, db_default=0)
+    cart_adds = models.PositiveBigIntegerField(default=0, db_default=0)
+    popularity = models.FloatField(default=0, db_default=0)
+
+    COUNTER_FIELDS = ('units_sold', 'order_count', 'cart_adds', 'popularity')
 
     class Meta:
         indexes = [
             models.Index(fields=['name']),
             models.Index(fields=['price']),
+            models.Index(fields=['created_at', 'id']),
+            models.Index(fields=['price', 'id']),
+            models.Index(fields=['popularity', 'id']),
         ]
 
     def __str__(self):
         return self.name
+
+    def save(self, *args, **kwargs):
+        # an edit must not write back counters it loaded before a flush
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.COUNTER_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
+
+class CatalogVersion(models.Model):
+    """Single row counter bumped on every catalog write; drives product ETags."""
+    version = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    # last popularity flush of any process; reorders ?ordering=popularity only
+    popularity_flushed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Catalog v{self.version}"
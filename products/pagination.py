@@ -0,0 +1,18 @@
+from Onlineshop.pagination import KeysetPagination
+
+
+class ProductPagination(KeysetPagination):
+    ordering_fields = {
+        'created_at': 'created_at',
+        'price': 'price',
+        'popularity': 'popularity',
+    }
+    default_ordering = '-created_at'
+
+    def get_ordering(self, request, queryset, view):
+        # search results are ordered by relevance unless ?ordering= says otherwise
+        if 'search_rank' in queryset.query.annotations:
+            self.ordering_fields = dict(self.ordering_fields, relevance='search_rank')
+            if self.ordering_query_param not in request.query_params:
+                return 'relevance'
+        return super().get_ordering(request, queryset, view)
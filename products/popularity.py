@@ -0,0 +1,127 @@
+import atexit
+import logging
+import threading
+from collections import defaultdict
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .catalog import mark_popularity_flushed
+from .models import Product
+
+logger = logging.getLogger(__name__)
+
+# Scores are forward decayed: an event at time t adds weight * 2 ** ((t - EPOCH) / half-life),
+# so ranking by the stored sum is ranking by the decayed score at any moment
+# and no row ever needs rewriting as time passes. Scores double every
+# half-life, which a float holds for ~1000 half-lives past EPOCH.
+EPOCH = datetime(2026, 1, 1, tzinfo=dt_timezone.utc)
+
+DEFAULT_WEIGHTS = {'cart_add': 1, 'unit_sold': 5}
+
+
+def decay_factor(when=None):
+    half_life = getattr(settings, 'POPULARITY_HALF_LIFE', 7 * 24 * 3600)
+    when = when or timezone.now()
+    return 2 ** ((when - EPOCH).total_seconds() / half_life)
+
+
+def weight(event):
+    return getattr(settings, 'POPULARITY_WEIGHTS', DEFAULT_WEIGHTS)[event]
+
+
+# product_id -> [cart_adds, units_sold, order_count, points], points not yet decayed
+_pending = defaultdict(lambda: [0, 0, 0, 0])
+_pending_lock = threading.Lock()
+_flusher = None
+
+
+def record_cart_adds(product_ids):
+    """Count an add to cart for each of `product_ids`, repeats included."""
+    points = weight('cart_add')
+    with _pending_lock:
+        for product_id in product_ids:
+            deltas = _pending[product_id]
+            deltas[0] += 1
+            deltas[3] += points
+    _ensure_flusher()
+
+
+def record_order(lines):
+    """Count one completed order of `(product_id, quantity)` lines."""
+    points = weight('unit_sold')
+    with _pending_lock:
+        for product_id, quantity in lines:
+            deltas = _pending[product_id]
+            deltas[1] += quantity
+            deltas[2] += 1
+            deltas[3] += quantity * points
+    _ensure_flusher()
+
+
+def apply_deltas(pending, using='default'):
+    """
+    Add `{product_id: (cart_adds, units_sold, order_count, points)}` to the
+    counters with F() updates in one transaction.
+
+    Products with the same deltas share an UPDATE, so a flush costs one
+    statement per distinct delta rather than one per product.
+    """
+    factor = decay_factor()
+    groups = defaultdict(list)
+    for product_id, deltas in pending.items():
+        groups[tuple(deltas)].append(product_id)
+    with transaction.atomic(using=using):
+        for (cart_adds, units_sold, order_count, points), product_ids in groups.items():
+            Product.objects.using(using).filter(pk__in=product_ids).update(
+                cart_adds=F('cart_adds') + cart_adds,
+                units_sold=F('units_sold') + units_sold,
+                order_count=F('order_count') + order_count,
+                popularity=F('popularity') + points * factor,
+            )
+        mark_popularity_flushed(using)
+
+
+def flush_popularity():
+    global _pending
+    with _pending_lock:
+        pending, _pending = _pending, defaultdict(lambda: [0, 0, 0, 0])
+    if not pending:
+        return
+    try:
+        apply_deltas(pending)
+    except Exception:
+        logger.exception("Flushing popularity of %d products failed, will retry", len(pending))
+        with _pending_lock:
+            for product_id, deltas in pending.items():
+                merged = _pending[product_id]
+                for n, delta in enumerate(deltas):
+                    merged[n] += delta
+
+
+class _Flusher(threading.Thread):
+    def __init__(self, interval):
+        super().__init__(name='popularity-flusher', daemon=True)
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        from django.db import connection
+        while not self.stopped.wait(self.interval):
+            flush_popularity()
+            connection.close()
+
+
+def _ensure_flusher():
+    global _flusher
+    interval = getattr(settings, 'POPULARITY_FLUSH_INTERVAL', 5)
+    if interval is None or _flusher is not None:
+        return
+    with _pending_lock:
+        if _flusher is None:
+            _flusher = _Flusher(interval)
+            _flusher.start()
+            atexit.register(flush_popularity)
@@ -0,0 +1,74 @@
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db.models import DecimalField, F, Value
+from django.db.models.functions import Round
+
+CENT = Decimal('0.01')
+HUNDRED = Decimal('100')
+
+
+def _decimal(value):
+    # unsaved products can still hold the field's float default
+    return value if isinstance(value, Decimal) else Decimal(str(value))
+
+
+def line_total(price, discount, quantity):
+    """`quantity` units at `price` less `discount` percent, rounded half up to the cent."""
+    total = _decimal(price) * quantity * (HUNDRED - _decimal(discount)) / HUNDRED
+    return total.quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def whole_amount(amount):
+    """An amount rounded half up to whole currency units, as payment gateways take it."""
+    return int(_decimal(amount).quantize(Decimal('1'), rounding=ROUND_HALF_UP))
+
+
+class Quote:
+    """Totals of a set of priced lines."""
+
+    def __init__(self, subtotal=Decimal('0.00'), total=Decimal('0.00')):
+        self.subtotal = subtotal
+        self.total = total
+
+    @property
+    def discount(self):
+        return self.subtotal - self.total
+
+    def as_dict(self):
+        return {'subtotal': self.subtotal, 'discount_total': self.discount, 'total_price': self.total}
+
+
+def price_lines(items):
+    """
+    Price loaded cart lines (with their products) in exact Decimal arithmetic.
+
+    Sets `line_subtotal` and `line_total` on each item and returns their Quote.
+    Lines are rounded one by one, so the total is the sum of what is shown.
+    """
+    quote = Quote()
+    for item in items:
+        product = item.product
+        item.line_subtotal = (_decimal(product.price) * item.quantity).quantize(CENT)
+        item.line_total = line_total(product.price, product.discount, item.quantity)
+        quote.subtotal += item.line_subtotal
+        quote.total += item.line_total
+    return quote
+
+
+def price_cart(queryset):
+    """
+    Fetch and price the cart lines in `queryset` with one joined query.
+
+    Returns `(items, quote)`. The arithmetic happens in Python rather than in
+    SQL, where SQLite would do it in floating point.
+    """
+    items = list(queryset.select_related('product'))
+    return items, price_lines(items)
+
+
+def line_total_expression(price='product__price', discount='product__discount', quantity='quantity'):
+    """SQL twin of line_total() for annotations and aggregates, exact on PostgreSQL only."""
+    # multiply by 0.01 instead of dividing by 100: SQLite would do integer
+    # division on whole-number prices
+    discounted = F(price) * F(quantity) * (Value(HUNDRED) - F(discount)) * Value(CENT)
+    return Round(discounted, 2, output_field=DecimalField(max_digits=12, decimal_places=2))
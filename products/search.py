@@ -0,0 +1,217 @@
+import re
+
+from django.conf import settings
+from django.db import connections
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+class BaseSearchBackend:
+    def __init__(self, alias='default'):
+        self.alias = alias
+
+    @property
+    def connection(self):
+        return connections[self.alias]
+
+    def create_index(self):
+        pass
+
+    def drop_index(self):
+        pass
+
+    def rebuild(self):
+        pass
+
+    def index_products(self, ids):
+        pass
+
+    def remove_products(self, ids):
+        pass
+
+    def search(self, query, limit, within=None):
+        """
+        Return up to `limit` ids of products matching `query`, best match
+        first, taken only from the `within` queryset when given.
+        """
+        raise NotImplementedError
+
+    def match_sql(self, query):
+        """`(sql, params)` selecting the ids of every product matching `query`, unranked."""
+        raise NotImplementedError
+
+    def filter(self, queryset, query):
+        """Restrict `queryset` to products matching `query`, without ranking or a cap."""
+        return queryset.filter(pk__in=RawSQL(*self.match_sql(query)))
+
+    def within_sql(self, within):
+        # the caller's filters, run as a subquery of the full-text query
+        return within.order_by().values('pk').query.sql_with_params()
+
+
+class FallbackSearchBackend(BaseSearchBackend):
+    """Plain `icontains` scan, used on databases without a full-text engine."""
+
+    def search(self, query, limit, within=None):
+        from .models import Product
+        queryset = self.filter(Product.objects.using(self.alias) if within is None else within, query)
+        return list(queryset.order_by('id').values_list('id', flat=True)[:limit])
+
+    def filter(self, queryset, query):
+        for token in TOKEN_RE.findall(query):
+            queryset = queryset.filter(name__icontains=token)
+        return queryset
+
+
+class SQLiteSearchBackend(BaseSearchBackend):
+    table = 'products_product_fts'
+
+    def create_index(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {self.table} "
+                f"USING fts5(name, description, tokenize='unicode61 remove_diacritics 2')"
+            )
+            # name matches weigh ten times description matches; setting it as the
+            # default rank keeps `ORDER BY rank LIMIT n` on FTS5's fast path
+            cursor.execute(f"INSERT INTO {self.table}({self.table}, rank) VALUES ('rank', 'bm25(10.0, 1.0)')")
+
+    def drop_index(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {self.table}")
+
+    def rebuild(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table}")
+            cursor.execute(
+                f"INSERT INTO {self.table}(rowid, name, description) "
+                f"SELECT id, name, description FROM products_product"
+            )
+
+    def index_products(self, ids):
+        ids = list(ids)
+        if not ids:
+            return
+        placeholders = ','.join(['%s'] * len(ids))
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table} WHERE rowid IN ({placeholders})", ids)
+            cursor.execute(
+                f"INSERT INTO {self.table}(rowid, name, description) "
+                f"SELECT id, name, description FROM products_product WHERE id IN ({placeholders})",
+                ids,
+            )
+
+    def remove_products(self, ids):
+        ids = list(ids)
+        if not ids:
+            return
+        placeholders = ','.join(['%s'] * len(ids))
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table} WHERE rowid IN ({placeholders})", ids)
+
+    def fts_match(self, query):
+        # every word is quoted (no FTS5 syntax injection) and prefix-matched
+        return ' '.join('"%s"*' % token for token in TOKEN_RE.findall(query))
+
+    def search(self, query, limit, within=None):
+        match = self.fts_match(query)
+        if not match:
+            return []
+        sql, params = f"SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s", [match]
+        if within is not None:
+            within_sql, within_params = self.within_sql(within)
+            sql, params = f"{sql} AND rowid IN ({within_sql})", params + list(within_params)
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"{sql} ORDER BY rank LIMIT %s", params + [limit])
+            return [row[0] for row in cursor.fetchall()]
+
+    def match_sql(self, query):
+        return f"SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s", [self.fts_match(query)]
+
+
+class PostgreSQLSearchBackend(BaseSearchBackend):
+    table = 'products_product_search'
+    document = (
+        "setweight(to_tsvector('simple', coalesce(p.name, '')), 'A') || "
+        "setweight(to_tsvector('simple', coalesce(p.description, '')), 'B')"
+    )
+
+    def create_index(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.table} ("
+                f"product_id bigint PRIMARY KEY REFERENCES products_product(id) ON DELETE CASCADE, "
+                f"document tsvector NOT NULL)"
+            )
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {self.table}_document_idx ON {self.table} USING gin(document)"
+            )
+
+    def drop_index(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {self.table}")
+
+    def rebuild(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"TRUNCATE {self.table}")
+            cursor.execute(
+                f"INSERT INTO {self.table}(product_id, document) "
+                f"SELECT p.id, {self.document} FROM products_product p"
+            )
+
+    def index_products(self, ids):
+        ids = list(ids)
+        if not ids:
+            return
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {self.table}(product_id, document) "
+                f"SELECT p.id, {self.document} FROM products_product p WHERE p.id = ANY(%s) "
+                f"ON CONFLICT (product_id) DO UPDATE SET document = EXCLUDED.document",
+                [ids],
+            )
+
+    def remove_products(self, ids):
+        ids = list(ids)
+        if not ids:
+            return
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table} WHERE product_id = ANY(%s)", [ids])
+
+    def search(self, query, limit, within=None):
+        if not TOKEN_RE.search(query):
+            return []
+        sql = (f"SELECT s.product_id FROM {self.table} s, websearch_to_tsquery('simple', %s) q "
+               f"WHERE s.document @@ q")
+        params = [query]
+        if within is not None:
+            within_sql, within_params = self.within_sql(within)
+            sql, params = f"{sql} AND s.product_id IN ({within_sql})", params + list(within_params)
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"{sql} ORDER BY ts_rank_cd(s.document, q) DESC, s.product_id LIMIT %s", params + [limit])
+            return [row[0] for row in cursor.fetchall()]
+
+    def match_sql(self, query):
+        return (f"SELECT product_id FROM {self.table} WHERE document @@ websearch_to_tsquery('simple', %s)",
+                [query])
+
+
+VENDOR_BACKENDS = {
+    'sqlite': SQLiteSearchBackend,
+    'postgresql': PostgreSQLSearchBackend,
+}
+
+_backends = {}
+
+
+def get_search_backend(alias='default'):
+    if alias not in _backends:
+        path = getattr(settings, 'PRODUCT_SEARCH_BACKEND', None)
+        if path:
+            backend_class = import_string(path)
+        else:
+            backend_class = VENDOR_BACKENDS.get(connections[alias].vendor, FallbackSearchBackend)
+        _backends[alias] = backend_class(alias)
+    return _backends[alias]
@@ -1,8 +1,78 @@
+from django.conf import settings
+from django.db import models
+from django.utils import timezone
 from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
 from .models import Product
 
+# same fields, same order as ProductSerializer's; the counters stay internal
+PRODUCT_FIELDS = [field.name for field in Product._meta.concrete_fields if field.name not in Product.COUNTER_FIELDS]
+
+
+def parse_fields_param(value, allowed=PRODUCT_FIELDS, param='fields'):
+    """Turn `?fields=id,name` into a list of field names, or None when absent."""
+    if not value:
+        return None
+    names = list(dict.fromkeys(name.strip() for name in value.split(',') if name.strip()))
+    unknown = [name for name in names if name not in allowed]
+    if unknown:
+        raise ValidationError({param: f"Unknown field(s): {', '.join(unknown)}."})
+    return names
+
+
 class ProductSerializer(serializers.ModelSerializer):
     class Meta:
         model = Product
-        fields = '__all__'
-        read_only_fields = ['created_at']
+        exclude = Product.COUNTER_FIELDS
+        read_only_fields = ['created_at', 'updated_at']
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+def _decimal(value):
+    # values come back from the database already quantized to the field's
+    # decimal_places, so str() gives the same text as DRF's '{:f}' formatting
+    return None if value is None else str(value)
+
+
+def _datetime_converter():
+    # resolve the timezone once per page, timezone.localtime() per value is
+    # slower than the rest of the row put together
+    tz = timezone.get_current_timezone() if settings.USE_TZ else None
+
+    def convert(value):
+        if value is None:
+            return None
+        if tz is not None and value.tzinfo is not tz:
+            value = value.astimezone(tz)
+        value = value.isoformat()
+        if value.endswith('+00:00'):
+            value = value[:-6] + 'Z'
+        return value
+    return convert
+
+
+def serialize_product_rows(rows, fields):
+    """
+    Render `.values()` rows exactly as ProductSerializer would, without model
+    instances or per-field serializer calls.
+    """
+    datetime_converter = _datetime_converter()
+    converters = []
+    for name in fields:
+        field = Product._meta.get_field(name)
+        if isinstance(field, models.DecimalField):
+            converters.append((name, _decimal))
+        elif isinstance(field, models.DateTimeField):
+            converters.append((name, datetime_converter))
+        else:
+            converters.append((name, None))
+    return [
+        {name: convert(row[name]) if convert else row[name] for name, convert in converters}
+        for row in rows
+    ]
@@ -0,0 +1,20 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .catalog import bump_catalog_version
+from .models import Product
+from .search import get_search_backend
+
+
+# both index backends are plain tables, so updating them inside the caller's
+# transaction keeps the index consistent with the rows on rollback too
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, using, **kwargs):
+    get_search_backend(using).index_products([instance.pk])
+    bump_catalog_version(using)
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, using, **kwargs):
+    get_search_backend(using).remove_products([instance.pk])
+    bump_catalog_version(using)
@@ -0,0 +1,91 @@
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+
+from .catalog import bump_catalog_version
+from .models import Product
+
+
+class InsufficientStock(Exception):
+    def __init__(self, shortfalls):
+        super().__init__('Some products have insufficient stock')
+        self.shortfalls = shortfalls
+
+
+def shortfall(product, requested):
+    return {
+        'product_id': product.pk,
+        'product': product.name,
+        'available_stock': product.stock,
+        'requested': requested,
+    }
+
+
+def find_shortfalls(lines):
+    """Shortfalls for already loaded `(product, quantity)` pairs, no queries."""
+    return [shortfall(product, quantity) for product, quantity in lines if quantity > product.stock]
+
+
+def _merge(lines):
+    quantities = Counter()
+    for product_id, quantity in lines:
+        quantities[product_id] += quantity
+    return quantities
+
+
+def check_stock(lines, using='default'):
+    """Shortfalls for `(product_id, quantity)` pairs, read with a single query."""
+    quantities = _merge(lines)
+    products = Product.objects.using(using).in_bulk(list(quantities))
+    report = []
+    for product_id, quantity in quantities.items():
+        product = products.get(product_id)
+        if product is None:
+            report.append({'product_id': product_id, 'product': None, 'available_stock': 0, 'requested': quantity})
+        elif quantity > product.stock:
+            report.append(shortfall(product, quantity))
+    return report
+
+
+class _Rollback(Exception):
+    pass
+
+
+def reserve_stock(lines, using='default'):
+    """
+    Take `(product_id, quantity)` pairs out of stock, all or nothing, in two
+    queries whatever the number of lines.
+
+    The rows are locked in primary key order first (SELECT ... FOR UPDATE),
+    so two checkouts sharing products always lock them in the same order and
+    cannot deadlock. One guarded UPDATE then takes every line,
+    `SET stock = stock - CASE pk ... END WHERE stock >= CASE pk ... END`, so
+    concurrent reservations can never oversell or lose an update even where
+    the lock is a no-op (SQLite). Raises InsufficientStock with a per-line
+    report (and rolls everything back) if any line can't be served.
+    """
+    quantities = _merge(lines)
+    products = Product.objects.using(using)
+    now = timezone.now()
+    try:
+        with transaction.atomic(using=using):
+            stock = dict(products.select_for_update().filter(pk__in=list(quantities)).order_by('pk')
+                         .values_list('pk', 'stock'))
+            failed = [(product_id, quantity) for product_id, quantity in quantities.items()
+                      if stock.get(product_id, 0) < quantity]
+            if failed:
+                raise _Rollback(failed)
+            taken = Case(*(When(pk=product_id, then=Value(quantity)) for product_id, quantity in quantities.items()))
+            updated = products.filter(pk__in=list(quantities), stock__gte=taken).update(
+                stock=F('stock') - taken, updated_at=now
+            )
+            if updated != len(quantities):
+                # stock changed between the read and the UPDATE: report on every line
+                raise _Rollback(list(quantities.items()))
+            # queryset.update() skips the post_save signal
+            bump_catalog_version(using)
+    except _Rollback as rollback:
+        # reported after the rollback, so a partial UPDATE can't skew the numbers
+        raise InsufficientStock(check_stock(rollback.args[0], using=using)) from None
@@ -1,3 +1,382 @@
-from django.test import TestCase
+import base64
+import json
+import threading
+from datetime import timedelta
+from decimal import Decimal
+from urllib.parse import parse_qs, urlparse
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, OperationalError
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from Onlineshop.testing import QueryBudgetMixin
+from cart.models import CartItem
+from . import popularity
+from .models import CatalogVersion, Product
+from .pricing import line_total, price_lines, whole_amount
+from .serializers import ProductSerializer
+from .stock import InsufficientStock, check_stock, reserve_stock
+
+
+class ProductListTests(QueryBudgetMixin, APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Product.objects.bulk_create(
+            Product(name=f'Item {i:02d}', price=Decimal(i % 7) + Decimal('0.50'), stock=i % 3)
+            for i in range(45)
+        )
+
+    def collect(self, params):
+        url = reverse('product-list')
+        pages, ids = 0, []
+        while url:
+            response = self.client.get(url, params if pages == 0 else None)
+            self.assertEqual(response.status_code, 200)
+            self.assertWithinBudget(response)
+            ids += [row['id'] for row in response.data['results']]
+            url = response.data['next']
+            pages += 1
+        return pages, ids
+
+    def test_cursor_walks_whole_catalog_once(self):
+        pages, ids = self.collect({'page_size': 10})
+        self.assertEqual(pages, 5)
+        expected = list(Product.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+
+    def test_price_ordering_breaks_ties_on_id(self):
+        _, ids = self.collect({'page_size': 4, 'ordering': 'price'})
+        expected = list(Product.objects.order_by('price', 'id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+
+    def test_filters(self):
+        _, ids = self.collect({'min_price': '2', 'max_price': '4.5', 'in_stock': 'true', 'name': 'Item 1'})
+        expected = Product.objects.filter(
+            price__gte=2, price__lte=Decimal('4.5'), stock__gt=0, name__startswith='Item 1'
+        )
+        self.assertCountEqual(ids, expected.values_list('id', flat=True))
+
+    def test_invalid_parameters(self):
+        url = reverse('product-list')
+        self.assertEqual(self.client.get(url, {'ordering': 'stock'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'min_price': 'abc'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'cursor': 'not-a-cursor'}).status_code, 404)
+
+    def test_tampered_or_foreign_cursor_is_not_found(self):
+        url = reverse('product-list')
+        price_cursor = parse_qs(urlparse(self.client.get(url, {'ordering': 'price'}).data['next']).query)['cursor'][0]
+        self.assertEqual(self.client.get(url, {'cursor': price_cursor}).status_code, 404)
+        self.assertEqual(self.client.get(url, {'ordering': 'price', 'cursor': price_cursor}).status_code, 200)
+
+        def cursor(*payload):
+            return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+        for ordering, params in (('-created_at', {}), ('price', {'ordering': 'price'})):
+            for value in ('nope', None, {'dt': 'nope'}, [1], 1e400):
+                response = self.client.get(url, dict(params, cursor=cursor(ordering, value, 1)))
+                self.assertEqual(response.status_code, 404, (ordering, value))
+
+
+class ProductSearchTests(APITestCase):
+    def setUp(self):
+        self.lamp = Product.objects.create(name='Desk lamp', description='Warm light', price=10)
+        self.kettle = Product.objects.create(name='Steel kettle', description='Boils water fast', price=20)
+        self.mug = Product.objects.create(name='Mug', description='Pairs with a steel kettle', price=5)
+
+    def search(self, query, **params):
+        response = self.client.get(reverse('product-list'), {'search': query, **params})
+        self.assertEqual(response.status_code, 200)
+        return [row['id'] for row in response.data['results']]
+
+    def test_ranks_name_matches_first(self):
+        self.assertEqual(self.search('kettle'), [self.kettle.id, self.mug.id])
+
+    def test_prefix_and_all_words_must_match(self):
+        self.assertEqual(self.search('lam'), [self.lamp.id])
+        self.assertEqual(self.search('steel water'), [self.kettle.id])
+        self.assertEqual(self.search('"*)'), [row.id for row in Product.objects.order_by('-created_at', '-id')])
+
+    def test_cap_applies_after_filters(self):
+        with override_settings(PRODUCT_SEARCH_MAX_RESULTS=1):
+            # the kettle outranks the mug, but only the mug is in the price range
+            self.assertEqual(self.search('kettle', max_price='10'), [self.mug.id])
+            self.assertEqual(self.search('kettle'), [self.kettle.id])
+            # other orderings list every match
+            self.assertEqual(self.search('kettle', ordering='price'), [self.mug.id, self.kettle.id])
+            self.assertEqual(self.search('kettle', ordering='-relevance'), [self.kettle.id])
+
+    def test_index_follows_saves_and_deletes(self):
+        self.lamp.name = 'Floor lantern'
+        self.lamp.save()
+        self.assertEqual(self.search('lamp'), [])
+        self.assertEqual(self.search('lantern'), [self.lamp.id])
+
+        self.kettle.delete()
+        self.assertEqual(self.search('kettle'), [self.mug.id])
+
+
+class ProductConditionalGetTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.product = Product.objects.create(name='Lamp', price=10)
+
+    def test_list_and_detail_answer_304_until_catalog_changes(self):
+        for url in (reverse('product-list'), reverse('product-detail', args=[self.product.pk])):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            etag = response['ETag']
+            self.assertTrue(response.has_header('Last-Modified'))
+
+            with self.assertNumQueries(0):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+
+            self.product.save()
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotEqual(response['ETag'], etag)
+
+    def test_etag_depends_on_query(self):
+        url = reverse('product-list')
+        self.assertNotEqual(self.client.get(url)['ETag'], self.client.get(url, {'ordering': 'price'})['ETag'])
+
+    def test_version_lookup_costs_one_query_when_not_cached(self):
+        url = reverse('product-list')
+        etag = self.client.get(url)['ETag']
+        cache.clear()
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+
+class ProductBulkTests(APITestCase):
+    def setUp(self):
+        self.staff = get_user_model().objects.create_user(
+            username='staff', email='staff@example.com', password='pass', is_staff=True
+        )
+        Product.objects.create(sku='A-1', name='Old name', price=1)
+
+    def upload(self, name, content):
+        return self.client.post(reverse('product-bulk-import'), {'file': SimpleUploadedFile(name, content)})
+
+    def test_import_requires_staff(self):
+        self.assertEqual(self.upload('p.csv', b'sku,name,price\n').status_code, 401)
+
+    def test_csv_upsert_reports_row_errors(self):
+        self.client.force_authenticate(self.staff)
+        response = self.upload('p.csv', (
+            b'sku,name,description,price,discount,stock,image_url\n'
+            b'A-1,New name,,2.50,,3,\n'
+            b'B-2,Kettle,Steel,10,5,1,\n'
+            b'C-3,,,abc,,-1,\n'
+        ))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual(response.data['updated'], 1)
+        self.assertEqual(response.data['failed'], 1)
+        self.assertEqual(response.data['duplicates'], 0)
+        self.assertEqual(response.data['errors'][0]['line'], 4)
+        self.assertEqual(set(response.data['errors'][0]['errors']), {'name', 'price', 'stock'})
+
+        updated = Product.objects.get(sku='A-1')
+        self.assertEqual((updated.name, updated.price, updated.stock), ('New name', Decimal('2.50'), 3))
+        self.assertEqual(self.client.get(reverse('product-list'), {'search': 'kettle'}).data['results'][0]['sku'], 'B-2')
+
+    def test_repeated_sku_counts_as_duplicate(self):
+        self.client.force_authenticate(self.staff)
+        response = self.upload('p.csv', (
+            b'sku,name,price\n'
+            b'D-4,First,1\n'
+            b'D-4,Second,2\n'
+            b'E-5,Other,3\n'
+        ))
+        data = response.data
+        self.assertEqual((data['rows'], data['created'], data['updated'], data['failed'], data['duplicates']),
+                         (3, 2, 0, 0, 1))
+        self.assertEqual(Product.objects.get(sku='D-4').name, 'Second')
+
+    def test_jsonl_round_trip(self):
+        self.client.force_authenticate(self.staff)
+        response = self.upload('p.jsonl', b'{"sku": "B-2", "name": "Mug", "price": "4.00"}\nnot json\n')
+        self.assertEqual((response.data['created'], response.data['failed']), (1, 1))
+
+        response = self.client.get(reverse('product-bulk-export'), {'file_format': 'jsonl'})
+        self.assertEqual(response.status_code, 200)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertIn('"sku": "B-2"', lines[1])
+
+
+class ProductSparseFieldsTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        Product.objects.create(sku='A-1', name='Lamp', description='x' * 500, price='10.5', discount=5)
+        Product.objects.create(name='Mug', price=3)
+
+    def test_fast_list_matches_serializer_output(self):
+        response = self.client.get(reverse('product-list'))
+        expected = ProductSerializer(Product.objects.order_by('-created_at', '-id'), many=True).data
+        self.assertEqual(response.json()['results'], [dict(row) for row in expected])
+
+    def test_sparse_list_and_detail(self):
+        response = self.client.get(reverse('product-list'), {'fields': 'id,name,price', 'ordering': 'price'})
+        self.assertEqual(response.json()['results'][0], {
+            'id': Product.objects.get(name='Mug').id, 'name': 'Mug', 'price': '3.00'
+        })
+        self.assertIsNotNone(response.json()['results'])
+
+        product = Product.objects.get(name='Lamp')
+        response = self.client.get(reverse('product-detail', args=[product.pk]), {'fields': 'name'})
+        self.assertEqual(response.json(), {'name': 'Lamp'})
+
+    def test_unknown_field_is_rejected(self):
+        response = self.client.get(reverse('product-list'), {'fields': 'id,password'})
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(POPULARITY_FLUSH_INTERVAL=None)
+class PopularityTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        popularity._pending.clear()
+        self.lamp, self.mug, self.desk = Product.objects.bulk_create(
+            Product(name=name, price=10, stock=100) for name in ('Lamp', 'Mug', 'Desk')
+        )
+
+    def test_counters_are_buffered_until_flushed(self):
+        user = get_user_model().objects.create_user(username='shopper', password='pass')
+        self.client.force_authenticate(user)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('cart'), {'product_id': self.mug.pk, 'quantity': 2})
+        self.assertEqual(response.status_code, 201)
+        popularity.record_order([(self.lamp.pk, 3), (self.mug.pk, 1)])
+        self.assertEqual(Product.objects.get(pk=self.lamp.pk).units_sold, 0)
+
+        popularity.flush_popularity()
+        counters = {row[0]: row[1:] for row in Product.objects.values_list('name', 'cart_adds', 'units_sold', 'order_count')}
+        self.assertEqual(counters, {'Lamp': (0, 3, 1), 'Mug': (1, 1, 1), 'Desk': (0, 0, 0)})
+
+        response = self.client.get(reverse('product-list'), {'ordering': '-popularity', 'page_size': 2})
+        self.assertEqual([row['id'] for row in response.data['results']], [self.lamp.pk, self.mug.pk])
+        self.assertNotIn('popularity', response.data['results'][0])
+        response = self.client.get(response.data['next'])
+        self.assertEqual([row['id'] for row in response.data['results']], [self.desk.pk])
+
+    def test_products_with_equal_deltas_share_an_update(self):
+        popularity.record_cart_adds([self.lamp.pk, self.mug.pk, self.desk.pk, self.desk.pk])
+        with self.assertNumQueries(5):  # savepoint, two UPDATEs, flush marker, release
+            popularity.flush_popularity()
+        self.assertEqual(dict(Product.objects.values_list('name', 'cart_adds')), {'Lamp': 1, 'Mug': 1, 'Desk': 2})
+
+    def test_saving_a_product_keeps_counters_flushed_since_it_was_loaded(self):
+        lamp = Product.objects.get(pk=self.lamp.pk)
+        popularity.record_order([(self.lamp.pk, 2)])
+        popularity.flush_popularity()
+        lamp.name = 'Floor lamp'
+        lamp.save()
+        self.assertEqual(Product.objects.get(pk=self.lamp.pk).units_sold, 2)
+
+    def test_recent_events_outweigh_older_ones(self):
+        now = popularity.EPOCH + timedelta(days=100)
+        with override_settings(POPULARITY_HALF_LIFE=7 * 24 * 3600):
+            self.assertAlmostEqual(popularity.decay_factor(now) / popularity.decay_factor(now - timedelta(days=7)), 2)
+
+    def test_flush_changes_popularity_etag_only(self):
+        url = reverse('product-list')
+        by_popularity = self.client.get(url, {'ordering': '-popularity'})['ETag']
+        by_price = self.client.get(url, {'ordering': 'price'})['ETag']
+        popularity.record_cart_adds([self.desk.pk])
+        popularity.flush_popularity()
+        self.assertEqual(self.client.get(url, {'ordering': 'price'}, HTTP_IF_NONE_MATCH=by_price).status_code, 304)
+        response = self.client.get(url, {'ordering': '-popularity'}, HTTP_IF_NONE_MATCH=by_popularity)
+        self.assertEqual(response.status_code, 200)
+
+        # a flush in another process reaches this one once its cached marker expires
+        CatalogVersion.objects.filter(pk=1).update(popularity_flushed_at=timezone.now() + timedelta(seconds=1))
+        cache.clear()
+        self.assertEqual(self.client.get(url, {'ordering': '-popularity'},
+                                         HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+
+
+class PricingTests(SimpleTestCase):
+    def test_line_total_rounds_half_up_per_line(self):
+        self.assertEqual(line_total(Decimal('19.99'), Decimal('12.5'), 3), Decimal('52.47'))
+        self.assertEqual(line_total(Decimal('0.10'), Decimal('5'), 1), Decimal('0.10'))
+        self.assertEqual(line_total(Decimal('0.30'), Decimal('0'), 3), Decimal('0.90'))
+        self.assertEqual(whole_amount(Decimal('2052.50')), 2053)
+
+    def test_price_lines_sums_rounded_lines(self):
+        lamp = Product(name='Lamp', price=Decimal('10.00'))  # discount still the float default
+        desk = Product(name='Desk', price=Decimal('0.05'), discount=Decimal('50'))
+        items = [CartItem(product=lamp, quantity=2), CartItem(product=desk, quantity=1), CartItem(product=desk, quantity=1)]
+        quote = price_lines(items)
+        self.assertEqual([item.line_total for item in items], [Decimal('20.00'), Decimal('0.03'), Decimal('0.03')])
+        self.assertEqual((quote.subtotal, quote.discount, quote.total),
+                         (Decimal('20.10'), Decimal('0.04'), Decimal('20.06')))
+
+
+class StockReservationTests(TestCase):
+    def setUp(self):
+        self.lamp = Product.objects.create(name='Lamp', price=10, stock=5)
+        self.mug = Product.objects.create(name='Mug', price=3, stock=1)
+
+    def test_reserve_is_all_or_nothing(self):
+        with self.assertRaises(InsufficientStock) as raised:
+            reserve_stock([(self.lamp.pk, 2), (self.mug.pk, 1), (self.mug.pk, 1)])
+        self.assertEqual(raised.exception.shortfalls, [
+            {'product_id': self.mug.pk, 'product': 'Mug', 'available_stock': 1, 'requested': 2},
+        ])
+        self.lamp.refresh_from_db()
+        self.assertEqual(self.lamp.stock, 5)
+
+        reserve_stock([(self.lamp.pk, 2), (self.mug.pk, 1)])
+        self.assertEqual(
+            dict(Product.objects.values_list('name', 'stock')), {'Lamp': 3, 'Mug': 0}
+        )
+
+    def test_check_stock_reports_missing_products(self):
+        self.assertEqual(check_stock([(self.lamp.pk, 5)]), [])
+        self.assertEqual(check_stock([(999, 1)])[0]['available_stock'], 0)
+
+
+class StockReservationStressTests(TransactionTestCase):
+    def test_concurrent_reservations_never_oversell(self):
+        products = [Product.objects.create(name=f'P{i}', price=1, stock=50) for i in range(3)]
+        ids = [product.pk for product in products]
+        succeeded = []
+
+        def buyer(n):
+            # half the buyers list the products in reverse order to provoke lock-order deadlocks
+            lines = [(pk, 1 + n % 3) for pk in (ids if n % 2 else ids[::-1])]
+            try:
+                for _ in range(20):
+                    try:
+                        reserve_stock(lines)
+                        succeeded.append(lines)
+                        return
+                    except InsufficientStock:
+                        return
+                    except OperationalError:
+                        # SQLite reports lock contention instead of waiting on it
+                        continue
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=buyer, args=(n,)) for n in range(40)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        sold = {pk: 0 for pk in ids}
+        for lines in succeeded:
+            for pk, quantity in lines:
+                sold[pk] += quantity
+        for product in Product.objects.filter(pk__in=ids):
+            self.assertGreaterEqual(product.stock, 0)
+            self.assertEqual(product.stock, 50 - sold[product.pk])
+        self.assertTrue(succeeded)
@@ -1,10 +1,103 @@
-from rest_framework import viewsets
+import hashlib
+
+from django.http import StreamingHttpResponse
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
+from rest_framework import status, viewsets
+from rest_framework.decorators import action
+from rest_framework.parsers import MultiPartParser
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from Onlineshop.routers import ReplicaReadMixin
 from .models import Product
-from .serializers import ProductSerializer
+from .serializers import PRODUCT_FIELDS, ProductSerializer, parse_fields_param, serialize_product_rows
 from .permissions import IsAdminOrReadOnly
+from .filters import ProductFilterBackend, ProductSearchFilter
+from .pagination import ProductPagination
+from .catalog import get_catalog_version, get_popularity_version
+from .bulk import FORMATS, export_products, guess_format, import_products
+
+
+def popularity_ordered(request):
+    return request.GET.get('ordering', '').lstrip('-') == 'popularity'
+
+
+def catalog_etag(request, *args, **kwargs):
+    version, _ = get_catalog_version()
+    representation = f"{request.get_full_path()}|{request.META.get('HTTP_ACCEPT', '')}"
+    if popularity_ordered(request):
+        # counter flushes reorder the list without bumping the catalog version
+        flushed = get_popularity_version()
+        representation += f"|{flushed.timestamp() if flushed else ''}"
+    return f"{version}-{hashlib.md5(representation.encode()).hexdigest()}"
+
+
+def catalog_last_modified(request, *args, **kwargs):
+    _, updated_at = get_catalog_version()
+    if popularity_ordered(request):
+        flushed = get_popularity_version()
+        if flushed and (updated_at is None or flushed > updated_at):
+            return flushed
+    return updated_at
+
+
+# answered with 304 before the queryset is touched or anything is serialized
+catalog_condition = method_decorator(condition(etag_func=catalog_etag, last_modified_func=catalog_last_modified))
 
 
-class ProductViewSet(viewsets.ModelViewSet):
+class ProductViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
-    permission_classes = [IsAdminOrReadOnly]
\ No newline at end of file
+    permission_classes = [IsAdminOrReadOnly]
+    filter_backends = [ProductFilterBackend, ProductSearchFilter]
+    pagination_class = ProductPagination
+
+    def get_requested_fields(self):
+        return parse_fields_param(self.request.query_params.get('fields'))
+
+    def get_serializer(self, *args, **kwargs):
+        # sparse fieldsets only shape read responses, writes always see every field
+        if self.request is not None and self.request.method == 'GET':
+            kwargs.setdefault('fields', self.get_requested_fields())
+        return super().get_serializer(*args, **kwargs)
+
+    @catalog_condition
+    def list(self, request, *args, **kwargs):
+        # fast path: fetch only the requested columns as dicts and render them
+        # directly, skipping model instantiation and DRF's per-field overhead
+        fields = self.get_requested_fields() or PRODUCT_FIELDS
+        queryset = self.filter_queryset(self.get_queryset())
+        queryset = queryset.values(*fields, *queryset.query.annotations)
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(serialize_product_rows(page, fields))
+        return Response(serialize_product_rows(queryset, fields))
+
+    @catalog_condition
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+    @action(detail=False, methods=['post'], url_path='import',
+            permission_classes=[IsAdminUser], parser_classes=[MultiPartParser])
+    def bulk_import(self, request):
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'message': 'Upload a CSV or JSONL file as "file".'}, status=status.HTTP_400_BAD_REQUEST)
+        fmt = request.query_params.get('file_format') or guess_format(upload.name)
+        if fmt not in FORMATS:
+            return Response({'message': f"Unknown format {fmt!r}."}, status=status.HTTP_400_BAD_REQUEST)
+
+        report = import_products(upload, fmt)
+        return Response(report.as_dict())
+
+    @action(detail=False, methods=['get'], url_path='export', permission_classes=[IsAdminUser])
+    def bulk_export(self, request):
+        fmt = request.query_params.get('file_format', 'csv')
+        if fmt not in FORMATS:
+            return Response({'message': f"Unknown format {fmt!r}."}, status=status.HTTP_400_BAD_REQUEST)
+
+        content_type = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+        response = StreamingHttpResponse(export_products(fmt), content_type=f'{content_type}; charset=utf-8')
+        response['Content-Disposition'] = f'attachment; filename="products.{fmt}"'
+        return response
@@ -0,0 +1,15 @@
+from django.contrib import admin
+from .models import DailyProductSales, DailyRevenue, OrderStatusCount
+
+@admin.register(DailyRevenue)
+class DailyRevenueAdmin(admin.ModelAdmin):
+    list_display = ("day", "orders", "units", "revenue")
+
+@admin.register(DailyProductSales)
+class DailyProductSalesAdmin(admin.ModelAdmin):
+    list_display = ("day", "product", "units", "revenue")
+    list_select_related = ("product",)
+
+@admin.register(OrderStatusCount)
+class OrderStatusCountAdmin(admin.ModelAdmin):
+    list_display = ("status", "count")
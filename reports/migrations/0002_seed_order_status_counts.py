@@ -0,0 +1,26 @@
+from django.db import migrations
+from django.db.models import Count
+
+
+def seed_status_counts(apps, schema_editor):
+    # one row per status up front, so counting an order is always a plain UPDATE
+    Order = apps.get_model('orders', 'Order')
+    OrderStatusCount = apps.get_model('reports', 'OrderStatusCount')
+    db = schema_editor.connection.alias
+    counts = {status: 0 for status in ('pending', 'completed', 'shipped')}
+    counts.update(Order.objects.using(db).values_list('status').annotate(count=Count('id')).order_by())
+    OrderStatusCount.objects.using(db).bulk_create(
+        OrderStatusCount(status=status, count=count) for status, count in counts.items()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reports', '0001_initial'),
+        ('orders', '0006_order_completed_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(seed_status_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+from django.db import models
+from products.models import Product
+
+
+class DailyRevenue(models.Model):
+    day = models.DateField(unique=True)
+    orders = models.PositiveIntegerField(default=0)
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    def __str__(self):
+        return f"{self.day}: {self.revenue}"
+
+
+class DailyProductSales(models.Model):
+    day = models.DateField()
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'product'], name='reports_daily_product_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.day}: {self.product_id} x {self.units}"
+
+
+class OrderStatusCount(models.Model):
+    status = models.CharField(max_length=20, unique=True)
+    count = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.status}: {self.count}"
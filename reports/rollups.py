@@ -0,0 +1,110 @@
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Count, DecimalField, F, Sum, Value, When
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from orders.models import Order, OrderItem
+from .models import DailyProductSales, DailyRevenue, OrderStatusCount
+
+
+def _increment(model, lookup, using='default', **amounts):
+    """`UPDATE ... SET x = x + n`, creating the row the first time it's needed."""
+    changes = {name: F(name) + amount for name, amount in amounts.items()}
+    if model.objects.using(using).filter(**lookup).update(**changes):
+        return
+    try:
+        with transaction.atomic(using=using):
+            model.objects.using(using).create(**lookup, **amounts)
+    except IntegrityError:
+        # someone else created it in the meantime
+        model.objects.using(using).filter(**lookup).update(**changes)
+
+
+def _increment_products(day, lines, using='default'):
+    """
+    Add `{product_id: (units, revenue)}` to one day's product rollups in two
+    queries, however many products: the missing rows are inserted empty,
+    then a single UPDATE adds every line with CASE.
+    """
+    rows = DailyProductSales.objects.using(using)
+    rows.bulk_create([DailyProductSales(day=day, product_id=product_id) for product_id in lines],
+                     ignore_conflicts=True)
+
+    def per_product(n, output_field):
+        return Case(*(When(product_id=product_id, then=Value(amounts[n])) for product_id, amounts in lines.items()),
+                    output_field=output_field)
+
+    rows.filter(day=day, product_id__in=list(lines)).update(
+        units=F('units') + per_product(0, DailyProductSales._meta.get_field('units')),
+        revenue=F('revenue') + per_product(1, DailyProductSales._meta.get_field('revenue')),
+    )
+
+
+def record_status_change(old_status, new_status, using='default'):
+    if old_status == new_status:
+        return
+    if old_status:
+        _increment(OrderStatusCount, {'status': old_status}, using, count=-1)
+    if new_status:
+        _increment(OrderStatusCount, {'status': new_status}, using, count=1)
+
+
+def _line_totals():
+    # the discounted totals snapshotted at checkout
+    return Sum('line_total', output_field=DecimalField(max_digits=14, decimal_places=2))
+
+
+def record_completed_order(order, using='default'):
+    """Add a freshly completed order to the daily revenue and product rollups."""
+    day = timezone.localdate(order.completed_at or timezone.now())
+    lines = (OrderItem.objects.using(using).filter(order_id=order.pk)
+             .values('product_id').annotate(units=Sum('quantity'), revenue=_line_totals()))
+    products = {line['product_id']: (line['units'], Decimal(line['revenue'] or 0).quantize(Decimal('0.01')))
+                for line in lines}
+    if products:
+        _increment_products(day, products, using)
+    units = sum(line_units for line_units, _ in products.values())
+    revenue = sum((line_revenue for _, line_revenue in products.values()), Decimal('0'))
+    _increment(DailyRevenue, {'day': day}, using, orders=1, units=units, revenue=revenue)
+
+
+def rebuild_rollups(using='default'):
+    """Recompute every rollup from the order tables. Slow, for backfills and repairs only."""
+    completed_day = TruncDate(Coalesce('order__completed_at', 'order__created_at'),
+                              tzinfo=timezone.get_current_timezone())
+    with transaction.atomic(using=using):
+        DailyProductSales.objects.using(using).all().delete()
+        DailyRevenue.objects.using(using).all().delete()
+        OrderStatusCount.objects.using(using).all().delete()
+
+        product_rows = (OrderItem.objects.using(using).filter(order__status='completed')
+                        .annotate(day=completed_day).values('day', 'product_id')
+                        .annotate(units=Sum('quantity'), revenue=_line_totals()).order_by())
+        products = [
+            DailyProductSales(day=row['day'], product_id=row['product_id'], units=row['units'],
+                              revenue=Decimal(row['revenue'] or 0).quantize(Decimal('0.01')))
+            for row in product_rows.iterator()
+        ]
+        DailyProductSales.objects.using(using).bulk_create(products, batch_size=1000)
+
+        days = {}
+        for sales in products:
+            day = days.setdefault(sales.day, DailyRevenue(day=sales.day))
+            day.units += sales.units
+            day.revenue += sales.revenue
+        order_days = (Order.objects.using(using).filter(status='completed')
+                      .annotate(day=TruncDate(Coalesce('completed_at', 'created_at'),
+                                              tzinfo=timezone.get_current_timezone()))
+                      .values('day').annotate(orders=Count('id')).order_by())
+        for row in order_days:
+            days.setdefault(row['day'], DailyRevenue(day=row['day'])).orders = row['orders']
+        DailyRevenue.objects.using(using).bulk_create(days.values(), batch_size=1000)
+
+        counts = {status: 0 for status, _ in Order.STATUS_CHOICES}
+        counts.update(Order.objects.using(using).values_list('status').annotate(count=Count('id')).order_by())
+        OrderStatusCount.objects.using(using).bulk_create(
+            OrderStatusCount(status=status, count=count) for status, count in counts.items()
+        )
+    return len(days), len(products)
@@ -0,0 +1,35 @@
+from django.db.models.signals import post_delete, post_init, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from orders.models import Order
+from .rollups import record_completed_order, record_status_change
+
+# Rollups follow Order saves and deletes. queryset.update()/delete() skip
+# these signals; run `rebuildreports` after changing orders in bulk.
+
+
+@receiver(post_init, sender=Order)
+def remember_status(sender, instance, **kwargs):
+    # __dict__ so a deferred status field isn't fetched for every loaded order
+    instance._saved_status = instance.__dict__.get('status') if instance.pk else None
+
+
+@receiver(pre_save, sender=Order)
+def stamp_completion(sender, instance, **kwargs):
+    if instance.status == 'completed' and instance._saved_status != 'completed' and instance.completed_at is None:
+        instance.completed_at = timezone.now()
+
+
+@receiver(post_save, sender=Order)
+def update_order_rollups(sender, instance, created, using, **kwargs):
+    old_status = None if created else instance._saved_status
+    record_status_change(old_status, instance.status, using)
+    if instance.status == 'completed' and old_status != 'completed':
+        record_completed_order(instance, using)
+    instance._saved_status = instance.status
+
+
+@receiver(post_delete, sender=Order)
+def forget_order(sender, instance, using, **kwargs):
+    record_status_change(instance._saved_status, None, using)
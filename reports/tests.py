@@ -0,0 +1,88 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from orders.models import Order, OrderItem
+from products.models import Product
+from .models import DailyProductSales, DailyRevenue, OrderStatusCount
+
+
+class RollupTests(APITestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.user = User.objects.create_user(username='buyer', email='buyer@example.com', password='pass')
+        self.staff = User.objects.create_user(username='staff', email='staff@example.com', password='pass', is_staff=True)
+        self.lamp = Product.objects.create(name='Lamp', price=Decimal('10.50'), stock=100)
+        self.desk = Product.objects.create(name='Desk', price=Decimal('99.99'), stock=100)
+
+    def place(self, *lines):
+        order = Order.objects.create(user=self.user)
+        OrderItem.objects.bulk_create(
+            OrderItem(order=order, product=product, quantity=quantity, price=product.price,
+                      line_total=product.price * quantity)
+            for product, quantity in lines
+        )
+        return order
+
+    def complete(self, order):
+        order.status = 'completed'
+        order.save()
+
+    def snapshot(self):
+        return (
+            list(DailyRevenue.objects.order_by('day').values_list('day', 'orders', 'units', 'revenue')),
+            list(DailyProductSales.objects.order_by('day', 'product_id').values_list('day', 'product_id', 'units', 'revenue')),
+            dict(OrderStatusCount.objects.values_list('status', 'count')),
+        )
+
+    def test_completion_updates_rollups_incrementally(self):
+        self.complete(self.place((self.lamp, 2), (self.desk, 1)))
+        self.complete(self.place((self.lamp, 1)))
+        pending = self.place((self.desk, 5))
+
+        today = timezone.localdate()
+        self.assertEqual(DailyRevenue.objects.get(day=today).revenue, Decimal('131.49'))
+        self.assertEqual(DailyRevenue.objects.get(day=today).orders, 2)
+        self.assertEqual(DailyProductSales.objects.get(day=today, product=self.lamp).units, 3)
+        self.assertEqual(dict(OrderStatusCount.objects.values_list('status', 'count')),
+                         {'pending': 1, 'completed': 2, 'shipped': 0})
+
+        # saving a completed order again must not count it twice
+        completed = Order.objects.filter(status='completed').first()
+        completed.save()
+        pending.delete()
+        incremental = self.snapshot()
+        self.assertEqual(incremental[2], {'pending': 0, 'completed': 2, 'shipped': 0})
+
+        call_command('rebuildreports', stdout=open('/dev/null', 'w'))
+        rebuilt = self.snapshot()
+        self.assertEqual(rebuilt, incremental)
+
+    def test_reports_are_staff_only_and_read_rollups(self):
+        self.complete(self.place((self.lamp, 2), (self.desk, 1)))
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.client.get(reverse('report-revenue')).status_code, 403)
+
+        self.client.force_authenticate(self.staff)
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('report-revenue'))
+        self.assertEqual(response.data['days'][0]['revenue'], Decimal('120.99'))
+
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('report-top-products'), {'limit': 1})
+        self.assertEqual([row['product'] for row in response.data['products']], ['Lamp'])
+
+        response = self.client.get(reverse('report-order-status'))
+        self.assertEqual(response.data, {'completed': 1, 'pending': 0, 'shipped': 0})
+
+    def test_range_validation(self):
+        self.client.force_authenticate(self.staff)
+        today = timezone.localdate()
+        self.assertEqual(self.client.get(reverse('report-revenue'), {'start': 'last week'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('report-revenue'), {
+            'start': today - timedelta(days=400), 'end': today}).status_code, 400)
@@ -0,0 +1,8 @@
+from django.urls import path
+from .views import order_status_report, revenue_report, top_products_report
+
+urlpatterns = [
+    path('revenue/', revenue_report, name='report-revenue'),
+    path('top-products/', top_products_report, name='report-top-products'),
+    path('order-status/', order_status_report, name='report-order-status'),
+]
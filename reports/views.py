@@ -0,0 +1,85 @@
+from datetime import timedelta
+
+from django.db.models import Sum
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+
+from Onlineshop.routers import replica_reads
+from .models import DailyProductSales, DailyRevenue, OrderStatusCount
+
+DEFAULT_DAYS = 30
+MAX_DAYS = 366
+
+
+def parse_range(params):
+    """`?start=` / `?end=` as dates, defaulting to the last 30 days, at most a year apart."""
+    def parse(name, default):
+        value = params.get(name)
+        if not value:
+            return default
+        try:
+            day = parse_date(value)
+        except ValueError:
+            day = None
+        if day is None:
+            raise ValidationError({name: 'Use an ISO 8601 date (YYYY-MM-DD).'})
+        return day
+
+    end = parse('end', timezone.localdate())
+    start = parse('start', end - timedelta(days=DEFAULT_DAYS - 1))
+    if start > end:
+        raise ValidationError({'start': 'Must not be after end.'})
+    if (end - start).days >= MAX_DAYS:
+        raise ValidationError({'start': f'The range can span at most {MAX_DAYS} days.'})
+    return start, end
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+@replica_reads
+def revenue_report(request):
+    start, end = parse_range(request.query_params)
+    days = DailyRevenue.objects.filter(day__range=(start, end)).order_by('day')
+    return Response({
+        'start': start,
+        'end': end,
+        'days': [
+            {'day': day.day, 'orders': day.orders, 'units': day.units, 'revenue': day.revenue}
+            for day in days
+        ],
+    })
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+@replica_reads
+def top_products_report(request):
+    start, end = parse_range(request.query_params)
+    try:
+        limit = max(1, min(int(request.query_params.get('limit', 10)), 100))
+    except ValueError:
+        raise ValidationError({'limit': 'Must be an integer.'})
+    rows = (DailyProductSales.objects.filter(day__range=(start, end))
+            .values('product_id', 'product__name')
+            .annotate(units=Sum('units'), revenue=Sum('revenue'))
+            .order_by('-units', 'product_id')[:limit])
+    return Response({
+        'start': start,
+        'end': end,
+        'products': [
+            {'product_id': row['product_id'], 'product': row['product__name'],
+             'units': row['units'], 'revenue': row['revenue']}
+            for row in rows
+        ],
+    })
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+@replica_reads
+def order_status_report(request):
+    return Response({row.status: row.count for row in OrderStatusCount.objects.order_by('status')})
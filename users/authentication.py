@@ -0,0 +1,132 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+# What permissions and views read off request.user. Anything else (the
+# password hash included) is deferred and loaded on first access, and
+# save() on a cached user only writes these fields.
+CACHED_FIELDS = ('id', 'username', 'email', 'first_name', 'last_name', 'is_active', 'is_staff', 'is_superuser')
+
+
+class UserCache:
+    """
+    Thread-safe LRU of user id -> field values, entries expiring after `timeout` seconds.
+
+    With `alias` set, misses fall through to that Django cache, so processes
+    share what any of them loaded.
+    """
+
+    def __init__(self, size, timeout, alias=None):
+        self.size = size
+        self.timeout = timeout
+        self.alias = alias
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def key(self, user_id):
+        return f'auth:user:{user_id}'
+
+    def get(self, user_id):
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    self.entries.move_to_end(user_id)
+                    return entry[1]
+                del self.entries[user_id]
+        if self.alias:
+            values = caches[self.alias].get(self.key(user_id))
+            if values is not None:
+                self.remember(user_id, values)
+                return values
+        return None
+
+    def set(self, user_id, values):
+        self.remember(user_id, values)
+        if self.alias:
+            caches[self.alias].set(self.key(user_id), values, self.timeout)
+
+    def remember(self, user_id, values):
+        with self.lock:
+            self.entries[user_id] = (time.monotonic() + self.timeout, values)
+            self.entries.move_to_end(user_id)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def delete(self, user_id):
+        with self.lock:
+            self.entries.pop(user_id, None)
+        if self.alias:
+            caches[self.alias].delete(self.key(user_id))
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_user_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = UserCache(
+                    size=getattr(settings, 'USER_CACHE_SIZE', 10000),
+                    timeout=getattr(settings, 'USER_CACHE_TIMEOUT', 60),
+                    alias=getattr(settings, 'USER_CACHE_ALIAS', None),
+                )
+    return _cache
+
+
+def forget_user(user_id):
+    get_user_cache().delete(user_id)
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that skips the user lookup for recently seen users.
+
+    Entries are dropped when the user is saved or deleted (users.signals);
+    changes made with QuerySet.update() or in another process without a
+    shared USER_CACHE_ALIAS show up after USER_CACHE_TIMEOUT, which is kept
+    well under the access token lifetime.
+    """
+
+    def get_user(self, validated_token):
+        if api_settings.USER_ID_FIELD != 'id':
+            return super().get_user(validated_token)
+        try:
+            user_id = int(validated_token[api_settings.USER_ID_CLAIM])
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+        except (TypeError, ValueError):
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+
+        # from_db() wants the values in model field order
+        fields = [f.attname for f in self.user_model._meta.concrete_fields if f.attname in CACHED_FIELDS]
+        user_cache = get_user_cache()
+        values = user_cache.get(user_id)
+        if values is None:
+            values = self.user_model.objects.filter(pk=user_id).values_list(*fields).first()
+            if values is None:
+                raise AuthenticationFailed(_("User not found"), code="user_not_found")
+            user_cache.set(user_id, values)
+        # a fresh instance per request, so nothing set on it leaks to the next one
+        user = self.user_model.from_db('default', fields, values)
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        if api_settings.CHECK_REVOKE_TOKEN:
+            return super().get_user(validated_token)
+        return user
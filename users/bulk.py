@@ -0,0 +1,101 @@
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import transaction
+
+from products.bulk import ImportReport, iter_rows
+from .hashing import make_passwords
+from .models import UserInfo
+
+PROFILE_FIELDS = ('full_name', 'phone', 'address', 'city', 'postal_code', 'country')
+MAX_LENGTHS = {'full_name': 150, 'phone': 20, 'city': 100, 'postal_code': 20, 'country': 100}
+
+
+def _text(row, name):
+    value = row.get(name)
+    return '' if value is None else str(value).strip()
+
+
+def validate_row(row):
+    """Check a raw row: username, email, an optional password and optional profile fields."""
+    if '__error__' in row:
+        return None, {'non_field_errors': row['__error__']}
+    errors = {}
+    cleaned = {name: _text(row, name) for name in ('username', 'email', 'password') + PROFILE_FIELDS}
+    # raw passwords are kept as given, spaces included
+    cleaned['password'] = '' if row.get('password') is None else str(row['password'])
+
+    username_field = get_user_model()._meta.get_field('username')
+    if not cleaned['username']:
+        errors['username'] = 'This field is required.'
+    else:
+        try:
+            username_field.run_validators(cleaned['username'])
+        except ValidationError as e:
+            errors['username'] = ' '.join(e.messages)
+    try:
+        validate_email(cleaned['email'])
+    except ValidationError:
+        errors['email'] = 'Enter a valid email address.'
+    for name, max_length in MAX_LENGTHS.items():
+        if len(cleaned[name]) > max_length:
+            errors[name] = f'Ensure this field has no more than {max_length} characters.'
+    return (None, errors) if errors else (cleaned, None)
+
+
+def _write_batch(batch, report, using):
+    User = get_user_model()
+    taken = User.objects.using(using).filter(username__in=[row['username'] for row, _ in batch])
+    usernames = set(taken.values_list('username', flat=True))
+    taken = User.objects.using(using).filter(email__in=[row['email'] for row, _ in batch])
+    emails = set(taken.values_list('email', flat=True))
+
+    rows = []
+    for row, line in batch:
+        if row['username'] in usernames:
+            report.add_error(line, {'username': 'A user with that username already exists.'})
+        elif row['email'] in emails:
+            report.add_error(line, {'email': 'A user with that email already exists.'})
+        else:
+            usernames.add(row['username'])
+            emails.add(row['email'])
+            rows.append(row)
+
+    # the expensive part, spread over the hasher pool's threads
+    passwords = make_passwords([row['password'] or None for row in rows])
+    with transaction.atomic(using=using):
+        users = User.objects.using(using).bulk_create(
+            User(username=row['username'], email=row['email'], password=password)
+            for row, password in zip(rows, passwords)
+        )
+        UserInfo.objects.using(using).bulk_create(
+            UserInfo(user=user, **{name: row[name] for name in PROFILE_FIELDS if row[name]})
+            for user, row in zip(users, rows)
+            if row['full_name']
+        )
+    report.created += len(users)
+
+
+def import_users(stream, fmt='csv', batch_size=500, max_errors=1000, using='default'):
+    """
+    Create users from a CSV/JSONL stream, with a profile for rows that have
+    a `full_name`.
+
+    Rows without a password get an unusable one. Existing usernames and
+    emails are reported and skipped, never overwritten.
+    """
+    report = ImportReport(max_errors=max_errors)
+    batch = []
+    for line, row in iter_rows(stream, fmt):
+        report.rows += 1
+        cleaned, errors = validate_row(row)
+        if errors:
+            report.add_error(line, errors)
+            continue
+        batch.append((cleaned, line))
+        if len(batch) >= batch_size:
+            _write_batch(batch, report, using)
+            batch = []
+    if batch:
+        _write_batch(batch, report, using)
+    return report
@@ -0,0 +1,159 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.contrib.auth import hashers
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+
+class HashingBusy(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Too many sign-ins and sign-ups in progress, please try again shortly.'
+    default_code = 'hashing_busy'
+    wait = 1  # sent as Retry-After
+
+
+_shedding = ContextVar('password_hash_shedding', default=False)
+
+
+@contextmanager
+def shedding():
+    """
+    Make hashing in this block raise HashingBusy on a full pool instead of
+    waiting for a slot. For API entry points only: everywhere else (admin
+    login, changepassword, createsuperuser) a busy pool just means a wait.
+    """
+    token = _shedding.set(True)
+    try:
+        yield
+    finally:
+        _shedding.reset(token)
+
+
+def _blocks(block):
+    return not _shedding.get() if block is None else block
+
+
+class HasherPool:
+    """
+    Runs password hashing on `workers` threads, with at most `max_pending`
+    calls running or queued; past that callers wait for a slot, or get
+    HashingBusy at once with `block=False` or inside shedding().
+
+    Threads are enough: PBKDF2 (hashlib), bcrypt and argon2 all release the
+    GIL while hashing, so the pool uses every core without pickling
+    anything to worker processes.
+    """
+
+    def __init__(self, workers, max_pending):
+        self.workers = workers
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hasher')
+        self.slots = threading.BoundedSemaphore(max_pending)
+
+    def submit(self, func, *args, block=None):
+        if not self.slots.acquire(blocking=_blocks(block)):
+            raise HashingBusy()
+        return self._start(func, args)
+
+    def _start(self, func, args):
+        try:
+            future = self.executor.submit(func, *args)
+        except BaseException:
+            self.slots.release()
+            raise
+        future.add_done_callback(lambda _: self.slots.release())
+        return future
+
+    def run(self, func, *args, block=None):
+        return self.submit(func, *args, block=block).result()
+
+    async def arun(self, func, *args, block=None):
+        if not self.slots.acquire(blocking=False):
+            if not _blocks(block):
+                raise HashingBusy()
+            # wait for a slot off the event loop
+            waiter = asyncio.ensure_future(asyncio.to_thread(self.slots.acquire))
+            try:
+                await asyncio.shield(waiter)
+            except asyncio.CancelledError:
+                # the thread still gets the slot; give it back once it has
+                waiter.add_done_callback(lambda _: self.slots.release())
+                raise
+        return await asyncio.wrap_future(self._start(func, args))
+
+    def map(self, func, items):
+        """Blocking bulk variant: waits for slots instead of failing, `workers` calls at a time."""
+        window, results = [], []
+        for item in items:
+            if len(window) == self.workers:
+                results.append(window.pop(0).result())
+            window.append(self.submit(func, item, block=True))
+        return results + [future.result() for future in window]
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """The process-wide pool, or None with PASSWORD_HASH_WORKERS = 0 (hash inline)."""
+    global _pool
+    workers = getattr(settings, 'PASSWORD_HASH_WORKERS', None)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if not workers:
+        return None
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                max_pending = getattr(settings, 'PASSWORD_HASH_MAX_PENDING', None) or workers * 4
+                _pool = HasherPool(workers, max_pending)
+    return _pool
+
+
+def reset_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+        _pool = None
+
+
+def make_password(password, block=None):
+    """django.contrib.auth.hashers.make_password() through the pool."""
+    pool = get_pool()
+    if password is None or pool is None:
+        # an unusable password costs nothing to make
+        return hashers.make_password(password)
+    return pool.run(hashers.make_password, password, block=block)
+
+
+def make_passwords(passwords):
+    """Hash many passwords in parallel, for bulk imports."""
+    pool = get_pool()
+    if pool is None:
+        return [hashers.make_password(password) for password in passwords]
+    return pool.map(hashers.make_password, passwords)
+
+
+def verify_password(password, encoded, block=None):
+    """`(is_correct, must_update)` as django.contrib.auth.hashers.verify_password(), through the pool."""
+    pool = get_pool()
+    if pool is None:
+        return hashers.verify_password(password, encoded)
+    return pool.run(hashers.verify_password, password, encoded, block=block)
+
+
+async def averify_password(password, encoded, block=None):
+    pool = get_pool()
+    if pool is None:
+        return await asyncio.to_thread(hashers.verify_password, password, encoded)
+    return await pool.arun(hashers.verify_password, password, encoded, block=block)
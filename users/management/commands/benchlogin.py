@@ -0,0 +1,94 @@
+import json
+import os
+import random
+import threading
+import time
+from urllib.parse import urljoin
+
+import requests
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from Onlineshop.benchmarks import isolated_database
+from loadtest.runner import Recorder, serve
+from loadtest.seed import seed_products
+from users.hashing import make_passwords
+
+PASSWORD = 'correct horse battery staple'
+
+
+class Command(BaseCommand):
+    help = ("Measure login throughput (POST /api/token/) while other clients browse the catalog, "
+            "hashing inline and through the bounded hasher pool, and report throughput and p50/p95 "
+            "per request kind as JSON. Runs against a throwaway database.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--logins', type=int, default=8, help="Concurrent clients signing in.")
+        parser.add_argument('--browsers', type=int, default=4, help="Concurrent clients browsing the catalog.")
+        parser.add_argument('--duration', type=float, default=10, help="Seconds per mode.")
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Hasher pool threads.")
+        parser.add_argument('--max-pending', type=int, help="Hasher pool queue bound, default 4 per worker.")
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        with isolated_database(on_disk=True):
+            with override_settings(DEBUG=False, ALLOWED_HOSTS=['127.0.0.1'], QUERY_BUDGET_ENABLED=False):
+                usernames, token = self.seed(options)
+                report = {'config': {key: options[key] for key in (
+                    'logins', 'browsers', 'duration', 'workers', 'max_pending', 'users', 'seed')}}
+                modes = {'inline': 0, 'pool': options['workers']}
+                for mode, workers in modes.items():
+                    with override_settings(PASSWORD_HASH_WORKERS=workers,
+                                           PASSWORD_HASH_MAX_PENDING=options['max_pending']):
+                        with serve() as base_url:
+                            report[mode] = self.run(base_url, usernames, token, options)
+        self.stdout.write(json.dumps(report, indent=2))
+
+    def seed(self, options):
+        User = get_user_model()
+        names = [f'login{n:05d}' for n in range(options['users'])]
+        users = User.objects.bulk_create(
+            User(username=name, email=f'{name}@example.com', password=password)
+            for name, password in zip(names, make_passwords([PASSWORD] * len(names)))
+        )
+        seed_products(200, random.Random(options['seed']))
+        return names, f'Bearer {RefreshToken.for_user(users[0]).access_token}'
+
+    def run(self, base_url, usernames, token, options):
+        recorder = Recorder(scenarios=('login', 'browse'))
+        deadline = time.monotonic() + options['duration']
+
+        def client(scenario, n):
+            rng = random.Random(options['seed'] * 1000 + n)
+            session = requests.Session()
+            while time.monotonic() < deadline:
+                start = time.perf_counter()
+                try:
+                    if scenario == 'login':
+                        response = session.post(urljoin(base_url, reverse('token_obtain_pair')), timeout=60,
+                                                json={'username': rng.choice(usernames), 'password': PASSWORD})
+                    else:
+                        response = session.get(urljoin(base_url, reverse('product-list')), timeout=60,
+                                               params={'page_size': 20}, headers={'Authorization': token})
+                except requests.RequestException:
+                    recorder.record(scenario, 'error', time.perf_counter() - start)
+                    continue
+                recorder.record(scenario, response.status_code, time.perf_counter() - start)
+                if response.status_code in (429, 503):
+                    # back off like a well-behaved client
+                    time.sleep(max(0, min(float(response.headers.get('Retry-After', 1)),
+                                          deadline - time.monotonic())))
+            session.close()
+
+        threads = [threading.Thread(target=client, args=('login', n)) for n in range(options['logins'])]
+        threads += [threading.Thread(target=client, args=('browse', n)) for n in range(options['browsers'])]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return recorder.report(time.perf_counter() - start)
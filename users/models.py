@@ -2,6 +2,8 @@ from django.contrib.auth.models import AbstractUser
 from django.db import models
 from django.conf import settings
 
+from . import hashing
+
 class User(AbstractUser):
     email = models.EmailField(unique=True)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -9,6 +11,33 @@ class User(AbstractUser):
     def __str__(self):
         return self.username
 
+    # Hashing goes through users.hashing's bounded pool, so logins (through
+    # ModelBackend), sign-ups and password changes can't take every thread.
+    # A full pool makes these wait; only API views opt into HashingBusy.
+
+    def set_password(self, raw_password):
+        self.password = hashing.make_password(raw_password)
+        self._password = raw_password
+
+    def check_password(self, raw_password):
+        is_correct, must_update = hashing.verify_password(raw_password, self.password)
+        if is_correct and must_update:
+            self.upgrade_password(raw_password)
+            self.save(update_fields=['password'])
+        return is_correct
+
+    async def acheck_password(self, raw_password):
+        is_correct, must_update = await hashing.averify_password(raw_password, self.password)
+        if is_correct and must_update:
+            self.upgrade_password(raw_password)
+            await self.asave(update_fields=['password'])
+        return is_correct
+
+    def upgrade_password(self, raw_password):
+        self.set_password(raw_password)
+        # a hash upgrade isn't a password change
+        self._password = None
+
 
 class UserInfo(models.Model):
     user = models.OneToOneField(
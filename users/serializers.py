@@ -1,6 +1,6 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
-from django.contrib.auth.hashers import make_password
+from .hashing import make_password
 from .models import UserInfo
 
 User = get_user_model()
@@ -14,7 +14,7 @@ class RegisterSerializer(serializers.ModelSerializer):
         }
 
     def create(self, validated_data):
-        validated_data['password'] = make_password(validated_data['password'])
+        validated_data['password'] = make_password(validated_data['password'], block=False)
         return super().create(validated_data)
 
 
@@ -28,7 +28,7 @@ class UserUpdateSerializer(serializers.ModelSerializer):
 
     def update(self, instance, validated_data):
         if 'password' in validated_data and validated_data['password']:
-            validated_data['password'] = make_password(validated_data['password'])
+            validated_data['password'] = make_password(validated_data['password'], block=False)
         return super().update(instance, validated_data)
 
 
@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .authentication import forget_user
+from .hashing import reset_pool
+
+# Any save (profile edits, set_password() + save(), is_staff changes) or
+# delete drops the cached copy CachedJWTAuthentication serves.
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def drop_cached_user(sender, instance, **kwargs):
+    forget_user(instance.pk)
+
+
+@receiver(setting_changed)
+def resize_hasher_pool(setting, **kwargs):
+    if setting.startswith('PASSWORD_HASH_'):
+        reset_pool()
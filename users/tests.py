@@ -1,3 +1,202 @@
-from django.test import TestCase
+import asyncio
+import threading
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from Onlineshop.testing import QueryBudgetMixin
+from .authentication import CachedJWTAuthentication, UserCache, get_user_cache
+from .hashing import HasherPool, HashingBusy, get_pool, shedding
+from .models import UserInfo
+
+
+class UserCacheTests(TestCase):
+    def test_lru_and_expiry(self):
+        user_cache = UserCache(size=2, timeout=60)
+        user_cache.set(1, ('a',))
+        user_cache.set(2, ('b',))
+        user_cache.get(1)
+        user_cache.set(3, ('c',))
+        self.assertIsNone(user_cache.get(2))
+        self.assertEqual(user_cache.get(1), ('a',))
+
+        user_cache.timeout = -1
+        user_cache.set(4, ('d',))
+        self.assertIsNone(user_cache.get(4))
+
+
+class CachedJWTAuthenticationTests(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        get_user_cache().clear()
+        self.user = get_user_model().objects.create_user(username='ali', email='ali@example.com', password='pass1234')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}')
+
+    def test_user_lookup_is_cached(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(reverse('protected')).status_code, 200)
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('protected'))
+        self.assertEqual(response.data['message'], f'Hello, ali (id: {self.user.id})')
+        self.assertWithinBudget(response)
+
+    def test_cached_user_loads_other_fields_on_access(self):
+        self.client.get(reverse('protected'))
+        token = RefreshToken.for_user(self.user).access_token
+        request = RequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {token}')
+        with self.assertNumQueries(0):
+            user, _ = CachedJWTAuthentication().authenticate(request)
+        self.assertTrue(user.is_active)
+        with self.assertNumQueries(1):
+            self.assertTrue(user.check_password('pass1234'))
+
+    def test_save_drops_cached_user(self):
+        self.client.get(reverse('protected'))
+        self.user.username = 'reza'
+        self.user.save()
+        response = self.client.get(reverse('protected'))
+        self.assertEqual(response.data['message'], f'Hello, reza (id: {self.user.id})')
+
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get(reverse('protected')).status_code, 401)
+
+    def test_deleted_user_is_rejected(self):
+        self.client.get(reverse('protected'))
+        self.user.delete()
+        self.assertEqual(self.client.get(reverse('protected')).status_code, 401)
+
+
+class HasherPoolTests(TestCase):
+    def test_full_pool_refuses_work(self):
+        pool = HasherPool(workers=1, max_pending=1)
+        self.addCleanup(pool.shutdown)
+        release = threading.Event()
+        busy = pool.submit(release.wait)
+        with self.assertRaises(HashingBusy):
+            pool.run(len, 'x', block=False)
+        with shedding(), self.assertRaises(HashingBusy):
+            pool.run(len, 'x')
+        threading.Timer(0.05, release.set).start()
+        self.assertEqual(pool.run(len, 'x'), 1)
+        busy.result()
+        self.assertEqual(pool.map(len, ['a', 'bb', 'ccc']), [1, 2, 3])
+
+    def test_cancelled_wait_gives_its_slot_back(self):
+        pool = HasherPool(workers=1, max_pending=1)
+        self.addCleanup(pool.shutdown)
+        release = threading.Event()
+        busy = pool.submit(release.wait)
+
+        async def cancel_waiting_call():
+            waiting = asyncio.ensure_future(pool.arun(len, 'x'))
+            await asyncio.sleep(0.05)
+            waiting.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await waiting
+            release.set()
+            # the abandoned wait takes the freed slot in its thread, then hands it back
+            for _ in range(100):
+                await asyncio.sleep(0.01)
+                if pool.slots.acquire(blocking=False):
+                    return True
+            return False
+
+        self.assertTrue(asyncio.run(cancel_waiting_call()), 'the cancelled call kept its slot')
+        busy.result()
+        pool.slots.release()
+
+
+@override_settings(PASSWORD_HASH_WORKERS=1, PASSWORD_HASH_MAX_PENDING=1)
+class PasswordHashingTests(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username='ali', email='ali@example.com', password='pass1234')
+        self.client = APIClient()
+
+    def test_login_hashes_in_pool(self):
+        response = self.client.post(reverse('token_obtain_pair'), {'username': 'ali', 'password': 'pass1234'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('access', response.data)
+        self.assertWithinBudget(response)
+        response = self.client.post(reverse('token_obtain_pair'), {'username': 'ali', 'password': 'wrong'})
+        self.assertEqual(response.status_code, 401)
+
+    def test_busy_pool_sheds_logins_and_signups(self):
+        release = threading.Event()
+        busy = get_pool().submit(release.wait)
+        try:
+            response = self.client.post(reverse('token_obtain_pair'), {'username': 'ali', 'password': 'pass1234'})
+            self.assertEqual(response.status_code, 503)
+            self.assertEqual(response['Retry-After'], '1')
+            response = self.client.post(reverse('register'),
+                                        {'username': 'reza', 'email': 'reza@example.com', 'password': 'pass1234'})
+            self.assertEqual(response.status_code, 503)
+        finally:
+            release.set()
+            busy.result()
+        self.assertFalse(get_user_model().objects.filter(username='reza').exists())
+        response = self.client.post(reverse('register'),
+                                    {'username': 'reza', 'email': 'reza@example.com', 'password': 'pass1234'})
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(get_user_model().objects.get(username='reza').check_password('pass1234'))
+
+    def test_busy_pool_makes_non_api_callers_wait(self):
+        release = threading.Event()
+        busy = get_pool().submit(release.wait)
+        threading.Timer(0.05, release.set).start()
+        # what admin login and changepassword call: waits for the slot, never HashingBusy
+        self.assertTrue(self.user.check_password('pass1234'))
+        busy.result()
+
+    def test_outdated_hash_is_upgraded_on_login(self):
+        outdated = PBKDF2PasswordHasher().encode('pass1234', 'somesalt', iterations=1000)
+        get_user_model().objects.filter(pk=self.user.pk).update(password=outdated)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password('pass1234'))
+        self.user.refresh_from_db()
+        self.assertNotEqual(self.user.password, outdated)
+        self.assertTrue(self.user.check_password('pass1234'))
+
+
+class UserImportTests(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        User = get_user_model()
+        self.admin = User.objects.create_user(username='admin', email='admin@example.com', password='x', is_staff=True)
+        User.objects.create_user(username='taken', email='taken@example.com', password='x')
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def upload(self, content, name='users.csv'):
+        return self.client.post(reverse('user-bulk-import'), {'file': SimpleUploadedFile(name, content)})
+
+    def test_import_creates_users_with_hashed_passwords(self):
+        response = self.upload(
+            b'username,email,password,full_name,city\n'
+            b'sara,sara@example.com,secret123,Sara Ahmadi,Shiraz\n'
+            b'nima,nima@example.com,,,\n'
+            b'taken,other@example.com,secret123,,\n'
+            b'dup,taken@example.com,secret123,,\n'
+            b'bad name!,bad@example.com,secret123,,\n'
+            b'mina,not-an-email,secret123,,\n'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertWithinBudget(response)
+        self.assertEqual((response.data['rows'], response.data['created'], response.data['failed']), (6, 2, 4))
+        self.assertEqual([error['line'] for error in response.data['errors']], [6, 7, 4, 5])
+
+        User = get_user_model()
+        sara = User.objects.get(username='sara')
+        self.assertTrue(sara.check_password('secret123'))
+        self.assertEqual(UserInfo.objects.get(user=sara).city, 'Shiraz')
+        nima = User.objects.get(username='nima')
+        self.assertFalse(nima.has_usable_password())
+        self.assertFalse(UserInfo.objects.filter(user=nima).exists())
+
+    def test_staff_only(self):
+        self.client.force_authenticate(get_user_model().objects.get(username='taken'))
+        self.assertEqual(self.upload(b'username,email\n').status_code, 403)
@@ -1,5 +1,5 @@
 from django.urls import path, include
-from .views import RegisterView, UserUpdateView, protected_view, UserInfoViewSet
+from .views import RegisterView, UserUpdateView, UserImportView, protected_view, UserInfoViewSet
 from rest_framework.routers import DefaultRouter
 
 router = DefaultRouter()
@@ -9,5 +9,6 @@ urlpatterns = [
     path('register/', RegisterView.as_view(), name='register'),
     path('profile/<int:pk>/', UserUpdateView.as_view(), name='update-profile'),
     path('protected/', protected_view, name='protected'),
+    path('import/', UserImportView.as_view(), name='user-bulk-import'),
     path('', include(router.urls)),
 ]